@@ -1,22 +1,40 @@
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_session, run_db
 from app.config import settings
-from app import models, schemas
+from app import models, schemas, cache, hashing
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+def user_cache_ttl() -> float:
+    # Invalidations (below) only reach this process's own cache: with several
+    # workers and no shared Redis cache, the others may serve a changed or
+    # deactivated user until the entry expires, so keep entries briefly
+    if settings.USER_CACHE_REDIS_URL or settings.WEB_CONCURRENCY <= 1:
+        return settings.USER_CACHE_TTL
+    return min(settings.USER_CACHE_TTL, settings.USER_CACHE_LOCAL_TTL)
+
+# Users resolved from a token subject, so authenticated calls skip the lookup
+user_cache = cache.build_cache(
+    "users",
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=user_cache_ttl(),
+    redis_url=settings.USER_CACHE_REDIS_URL
+)
+# Only what the endpoints read from current_user; the password hash is never cached
+CACHED_USER_FIELDS = ("id", "email", "full_name", "is_active", "created_at")
+
+# Blocking helpers for scripts; request handlers use the app.hashing pool
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password_sync(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return hashing.hash_password_sync(password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -28,7 +46,10 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def get_user_by_email(db: Session, email: str) -> Optional[models.User]:
+    return db.query(models.User).filter(models.User.email == email).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,7 +63,37 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         token_data = schemas.TokenData(email=email)
     except JWTError:
         raise credentials_exception
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
+    cached = await user_cache.aget(token_data.email)
+    if cached is not None:
+        return check_active(user_from_cache(cached))
+    user = await run_db(db, get_user_by_email, token_data.email)
     if user is None:
         raise credentials_exception
+    await user_cache.aset(token_data.email, {field: getattr(user, field) for field in CACHED_USER_FIELDS})
+    return check_active(user)
+
+def check_active(user: models.User) -> models.User:
+    # Deactivated accounts keep valid tokens until they expire; refuse them
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
     return user
+
+def user_from_cache(data: dict) -> models.User:
+    # Transient (session-less) copy carrying the cached columns
+    data = dict(data)
+    if isinstance(data.get("created_at"), str):
+        data["created_at"] = datetime.fromisoformat(data["created_at"])
+    return models.User(**data)
+
+def invalidate_user(email: str):
+    # Runs inside flushes, which happen on the event loop under AsyncSession
+    user_cache.delete_nowait(email)
+
+# Drop cached entries whenever a user row is changed or removed through the ORM
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.email)
+    # A changed email must also evict the entry stored under the old subject
+    for old_email in inspect(target).attrs.email.history.deleted or ():
+        invalidate_user(old_email)
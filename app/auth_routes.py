@@ -2,22 +2,28 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from app.database import get_db
-from app import models, schemas, auth
+from app.database import get_session, run_db, run_write
+from app import models, schemas, auth, hashing, ratelimit
 from app.config import settings
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
-@router.post("/signup", response_model=schemas.UserResponse)
-def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user_in.email).first()
+# Password guessing and account creation are limited per client IP
+limit_auth = Depends(ratelimit.limit_ip("auth"))
+
+@router.post("/signup", response_model=schemas.UserResponse, dependencies=[limit_auth])
+async def signup(user_in: schemas.UserCreate, db: Session = Depends(get_session)):
+    db_user = await run_db(db, auth.get_user_by_email, user_in.email)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="A user with this email already exists."
         )
     
-    hashed_password = auth.get_password_hash(user_in.password)
+    hashed_password = await hashing.hash_password(user_in.password)
+    return await run_write(db, _create_user, user_in, hashed_password)
+
+def _create_user(db: Session, user_in: schemas.UserCreate, hashed_password: str):
     new_user = models.User(
         email=user_in.email,
         hashed_password=hashed_password,
@@ -28,15 +34,21 @@ def signup(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
     db.refresh(new_user)
     return new_user
 
-@router.post("/login", response_model=schemas.Token)
-def login(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+@router.post("/login", response_model=schemas.Token, dependencies=[limit_auth])
+async def login(db: Session = Depends(get_session), form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await run_db(db, auth.get_user_by_email, form_data.username)
+    if not user or not await hashing.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    auth.check_active(user)
+    
+    # Transparently upgrade hashes made with an older BCRYPT_ROUNDS
+    if hashing.needs_rehash(user.hashed_password):
+        new_hash = await hashing.hash_password(form_data.password)
+        await run_write(db, _update_password_hash, user.id, new_hash)
     
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
@@ -44,6 +56,12 @@ def login(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm =
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
+def _update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {models.User.hashed_password: hashed_password}, synchronize_session=False
+    )
+    db.commit()
+
 @router.get("/me", response_model=schemas.UserResponse)
-def get_me(current_user: models.User = Depends(auth.get_current_user)):
+async def get_me(current_user: models.User = Depends(auth.get_current_user)):
     return current_user
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from app import metrics
+
+logger = logging.getLogger("anctext.cache")
+
+# Every cache built here registers itself so its counters can be reported
+caches: Dict[str, "TTLCache"] = {}
+
+class TTLCache:
+    """Thread-safe in-process LRU cache whose entries also expire after `ttl` seconds.
+
+    Async code uses aget/aset/adelete, which hand the calls of caches marked
+    `blocking` (those doing network I/O) to the threadpool.
+    """
+
+    # A dict lookup: cheap enough to run on the event loop
+    blocking = False
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        caches[name] = self
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: Any):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    async def aget(self, key: str) -> Optional[Any]:
+        return await self._off_loop(self.get, key)
+
+    async def aset(self, key: str, value: Any):
+        await self._off_loop(self.set, key, value)
+
+    async def adelete(self, key: str):
+        await self._off_loop(self.delete, key)
+
+    async def _off_loop(self, fn, *args):
+        if self.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    def delete_nowait(self, key: str):
+        """delete() for sync code that may be running on the event loop
+        (e.g. ORM events under AsyncSession): there it runs in the background"""
+        if self.blocking:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                loop.run_in_executor(None, self.delete, key)
+                return
+        self.delete(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "memory",
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class RedisCache(TTLCache):
+    """Cache shared by every worker through Redis; values must be JSON serializable.
+
+    Redis errors are logged and treated as misses so an outage only costs
+    the lookups the cache was saving.
+    """
+
+    # A network round trip (up to the socket timeout): off the event loop
+    blocking = True
+
+    def __init__(self, name: str, maxsize: int, ttl: float, url: str):
+        super().__init__(name, maxsize, ttl)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(f"Cache '{name}' is configured for Redis but the redis package is not installed")
+        # Short timeouts: a slow cache must never be slower than the database
+        self._client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._prefix = f"anctext:{name}:"
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._client.get(self._prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' get failed: {e}")
+            raw = None
+        with self._lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any):
+        if self.ttl <= 0:
+            return
+        try:
+            # Size is bounded by the TTL; eviction beyond that is left to Redis maxmemory
+            self._client.set(self._prefix + key, json.dumps(value, default=str), ex=max(int(self.ttl), 1))
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' set failed: {e}")
+
+    def delete(self, key: str):
+        try:
+            self._client.delete(self._prefix + key)
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' delete failed: {e}")
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(self._prefix + "*"):
+                self._client.delete(key)
+        except Exception as e:
+            logger.warning(f"Redis cache '{self.name}' clear failed: {e}")
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(backend="redis", size=None)
+        return stats
+
+def build_cache(name: str, maxsize: int, ttl: float, redis_url: str = "") -> TTLCache:
+    if redis_url:
+        return RedisCache(name, maxsize, ttl, redis_url)
+    return TTLCache(name, maxsize, ttl)
+
+def cache_stats() -> dict:
+    return {name: cache.stats() for name, cache in caches.items()}
+
+@metrics.collector
+def _cache_metrics():
+    stats = cache_stats()
+    for kind in ("hits", "misses", "evictions"):
+        yield f"# TYPE cache_{kind}_total counter"
+        for name, values in stats.items():
+            yield f'cache_{kind}_total{{cache="{name}"}} {values[kind]}'
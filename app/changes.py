@@ -0,0 +1,275 @@
+import argparse
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from app import contents, database, models, schemas, tree
+from app.config import settings
+
+logger = logging.getLogger("anctext.changes")
+
+# Per-user change feed for incremental sync. Every write records the notes it
+# touched in note_changes, in the same transaction; each note keeps only its
+# latest entry, so a client catching up reads one row per changed note, and
+# deleted notes leave a tombstone. The auto-increment id is the cursor.
+
+MAX_PAGE_SIZE = 500
+RECORD_CHUNK_SIZE = 500
+# Poller look-back, in change ids, for transactions that commit out of id order
+POLL_OVERLAP = 1000
+
+def _lock_owner(db: Session, owner_id: int):
+    # Serialize an owner's writers so their change ids commit in order and a
+    # cursor never skips a row that commits late. SQLite already has a
+    # single writer.
+    if db.get_bind().dialect.name != "sqlite":
+        db.execute(select(models.User.id).where(models.User.id == owner_id).with_for_update())
+
+def record_changes(db: Session, owner_id: int, note_ids: Iterable[int], deleted: bool = False, new: bool = False):
+    """Log writes to `note_ids` in the caller's transaction (caller commits).
+
+    `new` skips replacing earlier entries, for notes that were just created.
+    """
+    note_ids = list(note_ids)
+    if not note_ids:
+        return
+    _lock_owner(db, owner_id)
+    for start in range(0, len(note_ids), RECORD_CHUNK_SIZE):
+        chunk = note_ids[start:start + RECORD_CHUNK_SIZE]
+        if not new:
+            db.execute(
+                delete(models.NoteChange).where(models.NoteChange.note_id.in_(chunk)),
+                execution_options={"synchronize_session": False}
+            )
+        db.execute(insert(models.NoteChange), [
+            {"owner_id": owner_id, "note_id": note_id, "deleted": deleted} for note_id in chunk
+        ])
+
+def head_cursor(db: Session, owner_id: int) -> int:
+    latest = db.execute(
+        select(func.max(models.NoteChange.id)).where(models.NoteChange.owner_id == owner_id)
+    ).scalar() or 0
+    # Never behind the horizon, even when every entry was pruned
+    pruned_through = db.execute(
+        select(models.NoteChangeHorizon.pruned_through).where(models.NoteChangeHorizon.owner_id == owner_id)
+    ).scalar() or 0
+    return max(latest, pruned_through)
+
+def check_cursor(db: Session, owner_id: int, since: int):
+    """410 when tombstones after `since` may have been pruned; the client must resync"""
+    pruned_through = db.execute(
+        select(models.NoteChangeHorizon.pruned_through).where(models.NoteChangeHorizon.owner_id == owner_id)
+    ).scalar()
+    if pruned_through is not None and since < pruned_through:
+        raise HTTPException(
+            status_code=410,
+            detail="Cursor is older than the change log; reload the tree and start from a new cursor"
+        )
+
+def changes_since(db: Session, owner_id: int, since: Optional[int], limit: int = MAX_PAGE_SIZE,
+                  include_content: bool = True) -> dict:
+    """One page of changes after `since`, shaped like schemas.ChangeFeed.
+
+    Without `since` only the current cursor is returned, to start syncing
+    from after loading the tree.
+    """
+    if since is None:
+        return {"cursor": head_cursor(db, owner_id), "has_more": False, "changes": []}
+    check_cursor(db, owner_id, since)
+    change = models.NoteChange
+    rows = db.execute(
+        select(change.id, change.note_id, change.deleted)
+        .where(change.owner_id == owner_id, change.id > since)
+        .order_by(change.id)
+        .limit(limit + 1)
+    ).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    upserted = [row.note_id for row in rows if not row.deleted]
+    notes = {}
+    if upserted:
+        if include_content:
+            statement = contents.select_with_content(*tree.TREE_COLUMNS, content_hash=models.Note.content_hash)
+        else:
+            statement = select(*tree.LISTING_COLUMNS)
+        for note in db.execute(
+            statement.where(models.Note.owner_id == owner_id, models.Note.id.in_(upserted))
+        ).mappings():
+            notes[note["id"]] = contents.decode_row(note) if include_content else dict(note)
+
+    changes = []
+    for row in rows:
+        note = None if row.deleted else notes.get(row.note_id)
+        # A note removed without a logged delete reads as one
+        changes.append({"cursor": row.id, "note_id": row.note_id, "deleted": note is None, "note": note})
+    return {"cursor": rows[-1].id if rows else since, "has_more": has_more, "changes": changes}
+
+def prune_tombstones(db: Session, older_than_days: int) -> int:
+    """Drop old tombstones and move each owner's horizon past them (caller commits)"""
+    change = models.NoteChange
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    stale = change.deleted.is_(True) & (change.created_at < cutoff)
+    horizons = db.execute(
+        select(change.owner_id, func.max(change.id)).where(stale).group_by(change.owner_id)
+    ).all()
+    for owner_id, pruned_through in horizons:
+        horizon = db.get(models.NoteChangeHorizon, owner_id)
+        if horizon is None:
+            db.add(models.NoteChangeHorizon(owner_id=owner_id, pruned_through=pruned_through))
+        else:
+            horizon.pruned_through = max(horizon.pruned_through, pruned_through)
+    result = db.execute(delete(change).where(stale), execution_options={"synchronize_session": False})
+    return result.rowcount
+
+# Push
+
+def _session():
+    # Streams outlive the request session; each read borrows a short-lived one
+    return (database.ReadSessionLocal or database.SessionLocal)()
+
+def _read(fn, *args, **kwargs):
+    db = _session()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+class Subscriber:
+    def __init__(self, owner_id: int, cursor: int):
+        self.owner_id = owner_id
+        self.cursor = cursor
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+class ChangeBroker:
+    """Wakes this worker's SSE subscribers when their owner has new changes.
+
+    One poller per worker asks the database which owners changed since the
+    last look, so idle streams cost an Event each and no connection.
+    Writes made by this worker wake their subscribers right away.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[int, Set[Subscriber]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._last_id: Optional[int] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, owner_id: int, cursor: int) -> Subscriber:
+        subscriber = Subscriber(owner_id, cursor)
+        self._subscribers.setdefault(owner_id, set()).add(subscriber)
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll_loop())
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self._subscribers.get(subscriber.owner_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._subscribers[subscriber.owner_id]
+
+    def notify(self, owner_id: int, cursor: Optional[int] = None):
+        for subscriber in self._subscribers.get(owner_id, ()):
+            if cursor is None or cursor > subscriber.cursor:
+                subscriber.event.set()
+
+    def _changed_owners(self, db: Session) -> List[tuple]:
+        change = models.NoteChange
+        if self._last_id is None:
+            self._last_id = db.execute(select(func.max(change.id))).scalar() or 0
+            return []
+        rows = db.execute(
+            select(change.owner_id, func.max(change.id))
+            .where(change.id > self._last_id - POLL_OVERLAP)
+            .group_by(change.owner_id)
+        ).all()
+        if rows:
+            self._last_id = max(self._last_id, max(row[1] for row in rows))
+        return rows
+
+    async def _poll_loop(self):
+        try:
+            while self._subscribers:
+                try:
+                    for owner_id, cursor in await run_in_threadpool(_read, self._changed_owners):
+                        self.notify(owner_id, cursor)
+                except Exception:
+                    logger.exception("Change poller failed")
+                await asyncio.sleep(settings.CHANGE_POLL_INTERVAL)
+        finally:
+            self._task = None
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+broker = ChangeBroker()
+
+def _event(feed: dict) -> bytes:
+    data = schemas.ChangeFeed.model_validate(feed).model_dump_json()
+    return f"id: {feed['cursor']}\nevent: changes\ndata: {data}\n\n".encode()
+
+async def stream_changes(owner_id: int, since: int, include_content: bool = True) -> AsyncIterator[bytes]:
+    """Server-sent events: a `changes` event per page, comments as keepalives"""
+    subscriber = broker.subscribe(owner_id, since)
+    loop = asyncio.get_running_loop()
+    try:
+        yield f"retry: {settings.CHANGE_STREAM_RETRY_MS}\n\n".encode()
+        read = True
+        while True:
+            if read:
+                feed = await run_in_threadpool(
+                    _read, changes_since, owner_id, subscriber.cursor, include_content=include_content
+                )
+                if feed["changes"]:
+                    subscriber.cursor = feed["cursor"]
+                    yield _event(feed)
+                    if feed["has_more"]:
+                        continue
+                backstop_at = loop.time() + settings.CHANGE_STREAM_BACKSTOP_SECONDS
+            # Only a wakeup from the broker reads again; keepalives are free.
+            # A rare backstop read covers a missed wakeup.
+            timeout = min(settings.CHANGE_KEEPALIVE_SECONDS, max(backstop_at - loop.time(), 0))
+            read = await subscriber.wait(timeout)
+            if not read:
+                yield b": keepalive\n\n"
+                read = loop.time() >= backstop_at
+    finally:
+        broker.unsubscribe(subscriber)
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the note change log")
+    parser.add_argument("--prune-days", type=int, default=settings.CHANGE_TOMBSTONE_DAYS,
+                        help="drop tombstones older than this many days")
+    args = parser.parse_args()
+    db = database.SessionLocal()
+    try:
+        pruned = prune_tombstones(db, args.prune_days)
+        db.commit()
+    finally:
+        db.close()
+    print(json.dumps({"pruned_tombstones": pruned}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+from fastapi import FastAPI
+from starlette.datastructures import MutableHeaders
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+
+# Response compression above COMPRESSION_MIN_SIZE. Brotli needs the optional
+# brotli-asgi package and falls back to gzip for clients that do not accept br.
+
+class WeakenCompressedETags:
+    """Mark ETags weak on compressed responses.
+
+    A strong validator promises byte-identical bodies, which no longer holds
+    once the body is re-encoded; If-None-Match already uses weak comparison.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                etag = headers.get("etag")
+                if etag and "content-encoding" in headers and not etag.startswith("W/"):
+                    headers["etag"] = "W/" + etag
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+def add_compression(app: FastAPI):
+    mode = settings.COMPRESSION.strip().lower()
+    if mode in ("", "off", "none"):
+        return
+    if mode == "gzip":
+        app.add_middleware(
+            GZipMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            compresslevel=settings.GZIP_LEVEL
+        )
+    elif mode in ("br", "brotli"):
+        try:
+            from brotli_asgi import BrotliMiddleware
+        except ImportError:
+            raise RuntimeError("COMPRESSION=br requires the brotli-asgi package")
+        app.add_middleware(
+            BrotliMiddleware,
+            quality=settings.BROTLI_QUALITY,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            gzip_fallback=True
+        )
+    else:
+        raise ValueError(f"Unknown COMPRESSION setting: {settings.COMPRESSION!r}")
+    # Added last so it wraps the compressor and sees its Content-Encoding
+    app.add_middleware(WeakenCompressedETags)
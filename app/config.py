@@ -5,6 +5,54 @@ import os
 class Settings(BaseSettings):
     # Database Configuration
     DATABASE_URL: str = "sqlite:///./notes.db"
+    # Serve requests through an AsyncSession (aiosqlite/asyncpg/aiomysql)
+    # instead of the blocking SessionLocal running in the threadpool. The
+    # Postgres and MySQL drivers are in requirements-async.txt
+    ASYNC_DB: bool = False
+    # Optional explicit async URL; derived from DATABASE_URL when empty
+    ASYNC_DATABASE_URL: str = ""
+    # Run pending migrations when the app starts
+    AUTO_MIGRATE: bool = True
+
+    # Read replicas (comma-separated URLs) for GET endpoints; empty = primary only
+    DATABASE_REPLICA_URLS: str = ""
+    REPLICA_HEALTH_INTERVAL: float = 5.0  # seconds between replica pings
+    # After a write, the same client reads from the primary for this long
+    REPLICA_STICKY_SECONDS: float = 5.0
+
+    # SQLite production mode (ignored for other databases):
+    # WAL journaling and tuned pragmas on every connection
+    SQLITE_TUNED: bool = True
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_SYNCHRONOUS: str = "NORMAL"  # durable across app crashes, may lose the last commits on power loss
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    SQLITE_CACHE_SIZE_KB: int = 64 * 1024
+    # Route writes through one writer thread per worker that group-commits them
+    SQLITE_WRITE_QUEUE: bool = True
+    SQLITE_WRITE_BATCH_MAX: int = 64
+    SQLITE_WRITE_BATCH_WINDOW_MS: float = 2.0
+    # Serve GET endpoints from a separate read-only connection pool
+    SQLITE_READ_POOL: bool = True
+    # Connections per engine under DB_POOL_SIZING=auto. SQLite has no server
+    # limit to share out, and past a few readers more connections only add
+    # file handles and page caches contending for the same file
+    SQLITE_POOL_CONNECTIONS: int = 8
+
+    # Connection pools. "auto" splits DB_MAX_CONNECTIONS (minus a reserve for
+    # migrations and admin sessions) across WEB_CONCURRENCY worker processes;
+    # "fixed" uses DB_POOL_SIZE / DB_MAX_OVERFLOW for every engine as given
+    DB_POOL_SIZING: str = "auto"
+    DB_MAX_CONNECTIONS: int = 100  # connections this app may hold on the server
+    DB_RESERVED_CONNECTIONS: int = 5
+    WEB_CONCURRENCY: int = 1  # worker processes; gunicorn reads the same variable
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # seconds to wait for a connection before erroring
+    DB_POOL_RECYCLE: int = 3600
+    # Liveness check on checkout: "always" (a round trip per checkout),
+    # "idle" (only for connections unused for DB_PRE_PING_IDLE_SECONDS) or "never"
+    DB_PRE_PING: str = "idle"
+    DB_PRE_PING_IDLE_SECONDS: float = 30.0
     
     # App Configuration
     APP_NAME: str = "ANCText API"
@@ -14,17 +62,126 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "your-very-secret-key-change-this-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7  # 1 week
+    # bcrypt cost; existing hashes are upgraded on the next successful login
+    BCRYPT_ROUNDS: int = 12
+    # Processes per worker dedicated to bcrypt (0 = use the threadpool)
+    PASSWORD_HASH_WORKERS: int = 2
+    # Hash/verify jobs allowed in flight before sign-ins get a 503
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Authenticated-user cache (per process unless a Redis URL is given)
+    USER_CACHE_TTL: int = 60  # seconds, 0 disables the cache
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_REDIS_URL: str = ""
+    # Per-process entries only hear of changes made by their own worker, so
+    # with WEB_CONCURRENCY > 1 and no Redis URL the TTL is capped at this
+    USER_CACHE_LOCAL_TTL: int = 5
     
+    # Code execution proxy (Piston API)
+    # Comma-separated; several upstreams are used round-robin
+    PISTON_URL: str = "https://emkc.org/api/v2/piston/execute"
+    PISTON_TIMEOUT: float = 15.0  # seconds
+    PISTON_CONNECT_TIMEOUT: float = 5.0
+    PISTON_MAX_CONNECTIONS: int = 20  # keep-alive pool size per worker
+    PISTON_MAX_CONCURRENCY: int = 10  # executions in flight per worker
+    PISTON_MAX_PER_USER: int = 2
+    PISTON_MAX_QUEUE: int = 50  # callers waiting for a slot before fast 429s
+    PISTON_QUEUE_TIMEOUT: float = 5.0
+    # Batch executions (/notes/execute/batch)
+    EXECUTE_BATCH_MAX_ITEMS: int = 50
+    EXECUTE_BATCH_PARALLELISM: int = 4
+    # Result cache for repeated identical executions
+    EXECUTE_CACHE_TTL: int = 3600  # seconds, 0 disables the cache
+    EXECUTE_CACHE_SIZE: int = 5000
+    EXECUTE_CACHE_REDIS_URL: str = ""
+    # Comma-separated languages that are never cached (e.g. non-deterministic runtimes)
+    EXECUTE_CACHE_EXCLUDED_LANGUAGES: str = ""
+
+    # Rate limits as "<requests>/<second|minute|hour|day>"; a bucket holds one
+    # period's worth of requests and refills at that rate. Empty turns a rule
+    # off. RATE_LIMIT_IP covers every request per client IP, AUTH login and
+    # signup per IP, NOTES every /notes route per user and EXECUTE code
+    # execution per user (on top of NOTES, one token per snippet).
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_IP: str = "1200/minute"
+    RATE_LIMIT_AUTH: str = "10/minute"
+    RATE_LIMIT_NOTES: str = "600/minute"
+    RATE_LIMIT_EXECUTE: str = "60/minute"
+    # Where buckets live: sqlite (a file shared by the workers of one host,
+    # in /dev/shm unless RATE_LIMIT_SQLITE_PATH is set), redis (shared by
+    # every host) or memory (per worker)
+    RATE_LIMIT_STORE: str = "sqlite"
+    RATE_LIMIT_SQLITE_PATH: str = ""
+    RATE_LIMIT_REDIS_URL: str = ""
+
+    # Note bodies are stored once per distinct text and compressed from
+    # CONTENT_COMPRESS_MIN_BYTES up with CONTENT_CODEC: auto (zstd when the
+    # zstandard package is installed, else zlib), zstd, zlib or none.
+    # Overwrites and deletes drop the bodies they orphan; `python -m
+    # app.contents gc` sweeps up any other unreferenced bodies unused for
+    # CONTENT_GC_GRACE_SECONDS.
+    CONTENT_CODEC: str = "auto"
+    CONTENT_COMPRESS_MIN_BYTES: int = 512
+    CONTENT_GC_GRACE_SECONDS: int = 3600
+
+    # Largest NDJSON import accepted by POST /notes/import. An import is one
+    # transaction and holds the SQLite write lock throughout, so SQLite's
+    # busy_timeout is raised to twice the longest import (at
+    # IMPORT_NOTES_PER_SECOND) for other writers to wait it out
+    IMPORT_MAX_NOTES: int = 20000
+    IMPORT_NOTES_PER_SECOND: int = 15000
+
+    # Change feed: how often each worker polls for changes to push over SSE,
+    # the keepalive interval of idle streams, how often an idle stream re-reads
+    # anyway in case a wakeup was missed, and the reconnect delay sent to
+    # clients. Tombstones older than CHANGE_TOMBSTONE_DAYS are dropped by
+    # `python -m app.changes`; older cursors then get 410 and must resync.
+    CHANGE_POLL_INTERVAL: float = 1.0
+    CHANGE_KEEPALIVE_SECONDS: float = 25.0
+    CHANGE_STREAM_BACKSTOP_SECONDS: float = 300.0
+    CHANGE_STREAM_RETRY_MS: int = 3000
+    CHANGE_TOMBSTONE_DAYS: int = 30
+
+    # Logging: "text" or "json"; request lines are sampled at LOG_SAMPLE_RATE
+    # (0-1), while 5xx responses and requests slower than LOG_SLOW_REQUEST_MS
+    # are always logged
+    LOG_FORMAT: str = "text"
+    LOG_SAMPLE_RATE: float = 1.0
+    LOG_SLOW_REQUEST_MS: float = 1000.0
+
+    # Response compression: gzip, br (needs brotli-asgi) or off
+    COMPRESSION: str = "gzip"
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes; smaller bodies are sent as is
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 4
+
     # CORS Configuration
     # Can be a comma-separated string in .env
     ALLOWED_ORIGINS: str = "*"
 
+    @property
+    def sqlite_busy_timeout_ms(self) -> int:
+        longest_import_ms = 1000 * self.IMPORT_MAX_NOTES / max(self.IMPORT_NOTES_PER_SECOND, 1)
+        return int(max(self.SQLITE_BUSY_TIMEOUT_MS, 2 * longest_import_ms))
+
     @property
     def parsed_origins(self) -> List[str]:
         if self.ALLOWED_ORIGINS == "*":
             return ["*"]
         return [origin.strip() for origin in self.ALLOWED_ORIGINS.split(",") if origin.strip()]
 
+    @property
+    def parsed_replica_urls(self) -> List[str]:
+        return [url.strip() for url in self.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+
+    @property
+    def parsed_piston_urls(self) -> List[str]:
+        return [url.strip() for url in self.PISTON_URL.split(",") if url.strip()]
+
+    @property
+    def parsed_execute_cache_excluded_languages(self) -> List[str]:
+        return [lang.strip().lower() for lang in self.EXECUTE_CACHE_EXCLUDED_LANGUAGES.split(",") if lang.strip()]
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
@@ -0,0 +1,238 @@
+import argparse
+import hashlib
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+from sqlalchemy import delete, exists, func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+
+try:
+    import zstandard
+except ImportError:  # optional; bodies fall back to zlib
+    zstandard = None
+
+# Note bodies live in note_contents, keyed by the SHA-256 of the text, so
+# identical bodies are stored once and the notes table only carries a hash.
+# Bodies of CONTENT_COMPRESS_MIN_BYTES or more are compressed; the codec is
+# recorded per row, so changing CONTENT_CODEC never breaks existing rows.
+
+ZSTD_LEVEL = 3
+ZLIB_LEVEL = 6
+STORE_CHUNK_SIZE = 500
+
+def _codec() -> str:
+    codec = settings.CONTENT_CODEC.strip().lower()
+    if codec == "auto":
+        return "zstd" if zstandard is not None else "zlib"
+    if codec == "zstd" and zstandard is None:
+        raise RuntimeError("CONTENT_CODEC=zstd requires the zstandard package")
+    if codec not in ("zstd", "zlib", "none"):
+        raise RuntimeError(f"Unknown CONTENT_CODEC {settings.CONTENT_CODEC!r}")
+    return codec
+
+CODEC = _codec()
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def encode(text: str) -> dict:
+    """Row values for note_contents holding `text`"""
+    raw = text.encode("utf-8")
+    encoding, data = "raw", raw
+    if CODEC != "none" and len(raw) >= settings.CONTENT_COMPRESS_MIN_BYTES:
+        if CODEC == "zstd":
+            packed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        else:
+            packed = zlib.compress(raw, ZLIB_LEVEL)
+        # Incompressible bodies stay raw
+        if len(packed) < len(raw):
+            encoding, data = CODEC, packed
+    return {"hash": hashlib.sha256(raw).hexdigest(), "encoding": encoding, "size": len(raw), "data": data}
+
+def decode(encoding: Optional[str], data: Optional[bytes]) -> str:
+    if data is None:
+        return ""
+    if encoding == "zstd":
+        if zstandard is None:
+            raise RuntimeError("This note body is zstd-compressed; install the zstandard package")
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+def _upsert(db: Session, rows: List[dict]):
+    # Existing bodies only get their last_used_at touched, which also keeps
+    # a concurrent gc() from dropping a body that is being referenced again
+    now = datetime.now(timezone.utc)
+    for row in rows:
+        row["last_used_at"] = now
+    name = db.get_bind().dialect.name
+    table = models.NoteContent.__table__
+    if name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if name == "sqlite" else postgresql.insert
+        statement = dialect_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.hash], set_={"last_used_at": statement.excluded.last_used_at}
+        )
+    elif name == "mysql":
+        statement = mysql.insert(table)
+        statement = statement.on_duplicate_key_update(last_used_at=statement.inserted.last_used_at)
+    else:
+        # Generic path: insert only what is missing
+        existing = set(db.execute(select(table.c.hash).where(table.c.hash.in_([r["hash"] for r in rows]))).scalars())
+        rows = [row for row in rows if row["hash"] not in existing]
+        if not rows:
+            return
+        statement = table.insert()
+    db.execute(statement, rows)
+
+def store_many(db: Session, texts: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """Store bodies (deduplicated) and return their hashes; empty bodies get None (caller commits)"""
+    hashes: List[Optional[str]] = []
+    pending: Dict[str, dict] = {}
+    for text in texts:
+        if not text:
+            hashes.append(None)
+            continue
+        row = encode(text)
+        hashes.append(row["hash"])
+        pending.setdefault(row["hash"], row)
+    rows = list(pending.values())
+    for start in range(0, len(rows), STORE_CHUNK_SIZE):
+        _upsert(db, rows[start:start + STORE_CHUNK_SIZE])
+    return hashes
+
+def store(db: Session, text: Optional[str]) -> Optional[str]:
+    return store_many(db, [text])[0]
+
+def prepare_rows(db: Session, rows: List[dict]) -> List[dict]:
+    """Swap the `content` of bulk-insert rows for stored `content_hash`es"""
+    hashes = store_many(db, (row.pop("content", None) for row in rows))
+    for row, digest in zip(rows, hashes):
+        row["content_hash"] = digest
+    return rows
+
+# Reading
+
+def select_with_content(*entities, content_hash):
+    """SELECT `entities` plus the stored body that `content_hash` points to"""
+    body = models.NoteContent
+    return select(
+        *entities, body.encoding.label("content_encoding"), body.data.label("content_data")
+    ).outerjoin(body, body.hash == content_hash)
+
+def decode_row(row) -> dict:
+    """Turn a row selected through select_with_content() into a dict with `content`"""
+    row = dict(row)
+    row.pop("content_hash", None)
+    row["content"] = decode(row.pop("content_encoding", None), row.pop("content_data", None))
+    return row
+
+def decode_rows(rows) -> Iterator[dict]:
+    return (decode_row(row) for row in rows)
+
+def load(db: Session, digest: Optional[str]) -> str:
+    if digest is None:
+        return ""
+    body = db.get(models.NoteContent, digest)
+    return decode(body.encoding, body.data) if body is not None else ""
+
+# Maintenance
+
+RELEASE_CHUNK_SIZE = 500
+
+def release(db: Session, hashes: Iterable[Optional[str]]) -> int:
+    """Drop the bodies among `hashes` that no note refers to any more, right
+    after an overwrite or delete (caller commits).
+
+    A body that a concurrent transaction starts using again fails the
+    foreign key check; its savepoint is rolled back and gc() gets it later
+    if it really is unused.
+    """
+    hashes = sorted({digest for digest in hashes if digest})
+    body = models.NoteContent
+    released = 0
+    for start in range(0, len(hashes), RELEASE_CHUNK_SIZE):
+        try:
+            with db.begin_nested():
+                released += db.execute(
+                    delete(body).where(
+                        body.hash.in_(hashes[start:start + RELEASE_CHUNK_SIZE]),
+                        ~exists().where(models.Note.content_hash == body.hash)
+                    ),
+                    execution_options={"synchronize_session": False}
+                ).rowcount
+        except IntegrityError:
+            pass
+    return released
+
+def gc(db: Session, grace_seconds: Optional[int] = None) -> int:
+    """Delete bodies no note refers to that were not used within the grace period (caller commits).
+
+    Writes release their own orphans; this sweeps up what a failed release
+    or an out-of-band change left behind.
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.CONTENT_GC_GRACE_SECONDS
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+    body = models.NoteContent
+    result = db.execute(
+        delete(body).where(
+            body.last_used_at < cutoff,
+            ~exists().where(models.Note.content_hash == body.hash)
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    return result.rowcount
+
+def report(db: Session) -> dict:
+    """Logical vs stored size of note bodies"""
+    body = models.NoteContent
+    referenced = db.execute(
+        select(func.count(), func.coalesce(func.sum(body.size), 0))
+        .select_from(models.Note).join(body, body.hash == models.Note.content_hash)
+    ).one()
+    stored = db.execute(
+        select(func.count(), func.coalesce(func.sum(body.size), 0), func.coalesce(func.sum(func.length(body.data)), 0))
+    ).one()
+    by_encoding = {
+        encoding: {"bodies": count, "bytes": int(size)}
+        for encoding, count, size in db.execute(
+            select(body.encoding, func.count(), func.sum(body.size)).group_by(body.encoding)
+        ).all()
+    }
+    logical = int(referenced[1])
+    return {
+        "notes_with_content": referenced[0],
+        "logical_bytes": logical,
+        "distinct_bodies": stored[0],
+        "distinct_bytes": int(stored[1]),
+        "stored_bytes": int(stored[2]),
+        "saved_ratio": round(1 - int(stored[2]) / logical, 4) if logical else 0.0,
+        "by_encoding": by_encoding,
+        "codec": CODEC,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain stored note bodies")
+    parser.add_argument("command", choices=("report", "gc"))
+    args = parser.parse_args()
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if args.command == "gc":
+            result = {"deleted_bodies": gc(db)}
+            db.commit()
+        else:
+            result = report(db)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine
+import time
+from typing import Dict, Tuple
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from .config import settings
+from app import metrics, writer
 
 # Database URL from configuration
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
@@ -12,12 +19,143 @@ connect_args = {}
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
     connect_args = {"check_same_thread": False}
 
+def pool_sizes(engines_per_worker: int, sqlite: bool = False) -> Tuple[int, int]:
+    """(pool_size, max_overflow) for one engine, following DB_POOL_SIZING"""
+    if settings.DB_POOL_SIZING == "fixed":
+        return settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+    if sqlite:
+        per_engine = max(settings.SQLITE_POOL_CONNECTIONS, 1)
+    else:
+        budget = max(settings.DB_MAX_CONNECTIONS - settings.DB_RESERVED_CONNECTIONS, 1)
+        per_engine = max(budget // (max(settings.WEB_CONCURRENCY, 1) * engines_per_worker), 1)
+    # Keep half warm and let the rest open only under bursts
+    pool_size = max(per_engine // 2, 1)
+    return pool_size, per_engine - pool_size
+
+def pool_options(url: str, engines_per_worker: int, poolclass) -> dict:
+    # In-memory SQLite keeps its default single-connection pool
+    if ":memory:" in url:
+        return {}
+    pool_size, max_overflow = pool_sizes(engines_per_worker, sqlite=make_url(url).get_backend_name() == "sqlite")
+    return {
+        # Queue pools are subclassed to time checkout waits (see /metrics)
+        "poolclass": poolclass,
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_PRE_PING == "always",
+    }
+
+def install_idle_ping(engine: Engine):
+    """Ping only connections that sat idle in the pool, instead of every checkout"""
+    if settings.DB_PRE_PING != "idle":
+        return
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        connection_record.info["last_used"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        last_used = connection_record.info.get("last_used")
+        if last_used is None or time.monotonic() - last_used < settings.DB_PRE_PING_IDLE_SECONDS:
+            return
+        try:
+            engine.dialect.do_ping(dbapi_connection)
+        except Exception as e:
+            # The pool discards this connection and retries with a fresh one
+            raise exc.DisconnectionError(f"Idle connection failed its ping: {e}")
+
+# The sync engine also serves exports and scripts when ASYNC_DB is on
+ENGINES_PER_WORKER = 2 if settings.ASYNC_DB else 1
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     connect_args=connect_args,
-    pool_recycle=3600,  # Recycle connections every hour
-    pool_pre_ping=True  # Check connection validity before using
+    **pool_options(SQLALCHEMY_DATABASE_URL, ENGINES_PER_WORKER, metrics.InstrumentedQueuePool)
 )
+metrics.instrument_engine(engine, "sync")
+install_idle_ping(engine)
+
+# SQLite production mode: tuned pragmas, a dedicated writer connection and a
+# read-only pool (see SQLITE_* settings and app/writer.py)
+IS_SQLITE_FILE = engine.dialect.name == "sqlite" and ":memory:" not in SQLALCHEMY_DATABASE_URL
+
+def install_sqlite_pragmas(bound: Engine, read_only: bool = False):
+    @event.listens_for(bound, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not read_only:
+            # Persistent in the file; readers and writers stop blocking each other
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={settings.sqlite_busy_timeout_ms}")
+        cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}")
+        # Negative cache_size is in KiB
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        if read_only:
+            cursor.execute("PRAGMA query_only=1")
+        cursor.close()
+
+if IS_SQLITE_FILE and settings.SQLITE_TUNED:
+    install_sqlite_pragmas(engine)
+
+def create_immediate_engine(label: str) -> Engine:
+    """One SQLite connection that opens every transaction with BEGIN IMMEDIATE,
+    so the write lock is taken (or waited for, up to busy_timeout) up front
+    instead of failing when a read transaction tries to upgrade"""
+    bound = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=connect_args,
+        poolclass=metrics.InstrumentedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    metrics.instrument_engine(bound, label)
+    if settings.SQLITE_TUNED:
+        install_sqlite_pragmas(bound)
+
+    @event.listens_for(bound, "connect")
+    def _manual_transactions(dbapi_connection, connection_record):
+        # Take transaction control away from pysqlite so BEGIN can be ours
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(bound, "begin")
+    def _begin_immediate(conn):
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+    return bound
+
+write_queue = None
+bulk_engine = None
+if IS_SQLITE_FILE and settings.SQLITE_WRITE_QUEUE:
+    writer_engine = create_immediate_engine("writer")
+    write_queue = writer.WriteQueue(
+        # Results are returned after the group commit; keep their attributes loaded
+        sessionmaker(bind=writer_engine, class_=writer.GroupCommitSession, autoflush=False, expire_on_commit=False),
+        batch_max=settings.SQLITE_WRITE_BATCH_MAX,
+        batch_window=settings.SQLITE_WRITE_BATCH_WINDOW_MS / 1000
+    )
+    # Large single-transaction writes (imports) run on a connection of their
+    # own instead of inside a group commit, one at a time per worker
+    bulk_engine = create_immediate_engine("bulk")
+    BulkSessionLocal = sessionmaker(bind=bulk_engine, autoflush=False, expire_on_commit=False)
+
+read_engine = None
+ReadSessionLocal = None
+if IS_SQLITE_FILE and settings.SQLITE_READ_POOL and not settings.ASYNC_DB:
+    read_url = make_url(SQLALCHEMY_DATABASE_URL)
+    read_url = read_url.set(database=f"file:{read_url.database}", query={"mode": "ro", "uri": "true"})
+    read_engine = create_engine(
+        read_url,
+        connect_args=connect_args,
+        **pool_options(SQLALCHEMY_DATABASE_URL, ENGINES_PER_WORKER, metrics.InstrumentedQueuePool)
+    )
+    metrics.instrument_engine(read_engine, "read")
+    install_sqlite_pragmas(read_engine, read_only=True)
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -32,3 +170,147 @@ def get_db():
         yield db
     finally:
         db.close()
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver"""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    drivers = {"sqlite": "aiosqlite", "postgresql": "asyncpg", "mysql": "aiomysql"}
+    if dialect not in drivers:
+        raise ValueError(f"No async driver configured for '{dialect}'")
+    return f"{dialect}+{drivers[dialect]}{sep}{rest}"
+
+# Async engine, only created when enabled so the async drivers stay optional
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DB:
+    async_url = settings.ASYNC_DATABASE_URL or to_async_url(SQLALCHEMY_DATABASE_URL)
+    async_engine = create_async_engine(
+        async_url,
+        **pool_options(async_url, ENGINES_PER_WORKER, metrics.InstrumentedAsyncQueuePool)
+    )
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+    install_idle_ping(async_engine.sync_engine)
+    # Objects stay usable after commit; there is no implicit IO in async mode
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+# Dependency to get an async DB session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# Session dependency used by the routers, selected by settings.ASYNC_DB
+get_session = get_async_db if settings.ASYNC_DB else get_db
+
+# Dependency to get a session on the read-only pool
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Session dependency for endpoints that only read
+get_read_session = get_read_db if read_engine is not None else get_session
+
+# Other engines (e.g. read replicas) register here to show up in pool_status
+extra_engines: Dict[str, Engine] = {}
+
+def pool_status() -> dict:
+    """Live usage of every connection pool in this worker"""
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine.sync_engine
+    if write_queue is not None:
+        engines["writer"] = writer_engine
+        engines["bulk"] = bulk_engine
+    if read_engine is not None:
+        engines["read"] = read_engine
+    engines.update(extra_engines)
+    status = {}
+    for label, bound in engines.items():
+        pool = bound.pool
+        entry = {"class": type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                checked_in=pool.checkedin(),
+                overflow=pool.overflow(),
+                open=pool.checkedin() + pool.checkedout(),
+                max_overflow=pool._max_overflow,
+                timeout=pool.timeout(),
+            )
+        entry.update(metrics.pool_wait_summary(label))
+        if label == "writer":
+            entry.update(write_queue.stats())
+        status[label] = entry
+    return status
+
+@metrics.collector
+def _pool_metrics():
+    status = pool_status()
+    for key in ("size", "checked_out", "overflow"):
+        yield f"# TYPE db_pool_{key} gauge"
+        for label, entry in status.items():
+            if key in entry:
+                yield f'db_pool_{key}{{engine="{label}"}} {entry[key]}'
+    if write_queue is not None:
+        stats = write_queue.stats()
+        yield "# TYPE sqlite_write_queue_depth gauge"
+        yield f"sqlite_write_queue_depth {stats['queued']}"
+        for key in ("writes", "commits", "failed"):
+            yield f"# TYPE sqlite_write_queue_{key}_total counter"
+            yield f"sqlite_write_queue_{key}_total {stats[key]}"
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run a sync DB function `fn(session, ...)` against either kind of session.
+
+    AsyncSession runs it on the event loop through the async driver, while the
+    sync Session runs it in the threadpool exactly as sync endpoints did.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+async def run_write(db, fn, *args, **kwargs):
+    """Like run_db for small writes; goes through the SQLite write queue when enabled.
+
+    Queued functions run on the writer's own session, so they must not rely
+    on objects loaded through `db`.
+    """
+    if write_queue is not None:
+        return await write_queue.submit(fn, *args, **kwargs)
+    return await run_db(db, fn, *args, **kwargs)
+
+async def run_bulk_write(db, fn, *args, **kwargs):
+    """Like run_write for one large transaction (imports).
+
+    With the SQLite write queue it runs on the bulk connection instead of in a
+    group commit, so the queue keeps committing the writes around it (they
+    wait for the lock in SQLite, within busy_timeout) and none of them shares
+    its transaction.
+    """
+    if write_queue is None:
+        return await run_write(db, fn, *args, **kwargs)
+    return await run_in_threadpool(_run_bulk, fn, *args, **kwargs)
+
+def _run_bulk(fn, *args, **kwargs):
+    db = BulkSessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+async def release_session(db):
+    """Hand the session's connection back before a long-lived response starts.
+
+    Session dependencies are only closed once the response has been sent,
+    which for a stream can be hours later.
+    """
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
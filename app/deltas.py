@@ -0,0 +1,28 @@
+from typing import List, Sequence
+from fastapi import HTTPException
+from app import schemas
+
+# Text edits are expressed in UTF-16 code units, the unit JavaScript string
+# offsets use, so browser editors can send their positions unchanged.
+
+def apply_edits(content: str, edits: Sequence[schemas.TextEdit]) -> str:
+    """Apply non-overlapping replacements, all relative to the same base text"""
+    if not edits:
+        return content
+    units = content.encode("utf-16-le")
+    length = len(units) // 2
+    pieces: List[bytes] = []
+    position = 0
+    for edit in sorted(edits, key=lambda e: (e.start, e.end)):
+        if edit.start < position:
+            raise HTTPException(status_code=422, detail="Edits overlap")
+        if edit.end > length:
+            raise HTTPException(status_code=422, detail="Edit range is outside the document")
+        pieces.append(units[position * 2:edit.start * 2])
+        pieces.append(edit.text.encode("utf-16-le"))
+        position = edit.end
+    pieces.append(units[position * 2:])
+    try:
+        return b"".join(pieces).decode("utf-16-le")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=422, detail="Edit splits a surrogate pair")
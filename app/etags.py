@@ -0,0 +1,30 @@
+import hashlib
+from typing import Optional
+from fastapi import Response
+
+# Strong validators for the note tree endpoints. The tag is a hash of a cheap
+# aggregate over the subtree (see tree.subtree_fingerprint) and of the query
+# variant, so a 304 can be answered without loading or serializing notes.
+
+def make_etag(*parts) -> str:
+    raw = "\x1f".join(str(part) for part in parts)
+    return '"' + hashlib.sha256(raw.encode()).hexdigest()[:32] + '"'
+
+def matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag` (RFC 9110)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in candidates)
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    # Let browsers keep the body but always revalidate it
+    response.headers["Cache-Control"] = "private, no-cache"
+
+def not_modified(etag: str) -> Response:
+    response = Response(status_code=304)
+    set_etag(response, etag)
+    return response
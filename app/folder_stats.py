@@ -0,0 +1,255 @@
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import bindparam, delete, func, insert, or_, select, update
+from sqlalchemy.orm import Session
+from app import models, tree
+
+# Per-folder aggregates in folder_stats: direct children, all descendants,
+# the uncompressed body bytes below the folder and the time of the latest
+# write anywhere in the subtree. Every write path applies its deltas to the
+# written note's ancestors (read off its materialized path) in the same
+# transaction, so the numbers never need a subtree walk.
+#
+# `last_modified_at` only moves forward: deleting or moving a note out of a
+# folder counts as a change to the folder. A rebuild recomputes it from the
+# notes' updated_at, which can therefore be earlier than the stored value.
+
+APPLY_CHUNK_SIZE = 500
+SCAN_BATCH_SIZE = 5000
+CLOCK_TOLERANCE = timedelta(seconds=1)
+
+STATS_COLUMNS = (
+    models.FolderStats.child_count,
+    models.FolderStats.descendant_count,
+    models.FolderStats.content_bytes,
+    models.FolderStats.last_modified_at,
+)
+
+def text_size(text: Optional[str]) -> int:
+    return len(text.encode("utf-8")) if text else 0
+
+def stored_size(db: Session, content_hash: Optional[str]) -> int:
+    """Uncompressed size of a stored body, without loading it"""
+    if content_hash is None:
+        return 0
+    return db.execute(
+        select(models.NoteContent.size).where(models.NoteContent.hash == content_hash)
+    ).scalar() or 0
+
+def subtree_totals(db: Session, note: models.Note) -> tuple:
+    """(notes, body bytes) of a note and everything below it"""
+    body = models.NoteContent
+    count, size = db.execute(
+        select(func.count(), func.coalesce(func.sum(body.size), 0))
+        .select_from(models.Note)
+        .outerjoin(body, body.hash == models.Note.content_hash)
+        .where(
+            models.Note.owner_id == note.owner_id,
+            tree.path_startswith(db.get_bind().dialect.name, tree.descendant_prefix(note.path, note.id))
+        )
+    ).one()
+    return count + 1, int(size) + stored_size(db, note.content_hash)
+
+# Incremental maintenance (callers commit)
+
+def create(db: Session, owner_id: int, folder_ids: Iterable[int], modified_at: Optional[datetime] = None):
+    """Empty stats rows for new folders"""
+    rows = [{"folder_id": folder_id, "owner_id": owner_id} for folder_id in folder_ids]
+    if modified_at is not None:
+        for row in rows:
+            row["last_modified_at"] = modified_at
+    if rows:
+        db.execute(insert(models.FolderStats), rows)
+
+def apply(db: Session, deltas: Dict[int, list], modified_at: Optional[datetime] = None):
+    """Add [children, descendants, bytes] to each folder and mark it modified
+    now (or at `modified_at`, for imported notes dated later).
+
+    Rows are updated in id order, so concurrent writers lock them in the
+    same order.
+    """
+    stats = models.FolderStats.__table__
+    statement = update(stats).where(stats.c.folder_id == bindparam("b_folder_id")).values(
+        child_count=stats.c.child_count + bindparam("b_children"),
+        descendant_count=stats.c.descendant_count + bindparam("b_descendants"),
+        content_bytes=stats.c.content_bytes + bindparam("b_bytes"),
+        last_modified_at=func.now() if modified_at is None else modified_at,
+    )
+    rows = [
+        {"b_folder_id": folder_id, "b_children": children, "b_descendants": descendants, "b_bytes": size}
+        for folder_id, (children, descendants, size) in sorted(deltas.items())
+    ]
+    for start in range(0, len(rows), APPLY_CHUNK_SIZE):
+        db.execute(statement, rows[start:start + APPLY_CHUNK_SIZE])
+
+def add_to_ancestors(deltas: Dict[int, list], path: str, parent_id: Optional[int], count: int, size: int,
+                     sign: int = 1):
+    """Accumulate a subtree of `count` notes and `size` bytes arriving at
+    `path` in `parent_id` (sign=1) or leaving it (sign=-1)"""
+    for ancestor_id in tree.ancestor_ids(path):
+        delta = deltas.setdefault(ancestor_id, [0, 0, 0])
+        delta[1] += sign * count
+        delta[2] += sign * size
+    if parent_id is not None:
+        deltas.setdefault(parent_id, [0, 0, 0])[0] += sign
+
+def note_added(db: Session, note: models.Note, size: int):
+    deltas: Dict[int, list] = {}
+    add_to_ancestors(deltas, note.path, note.parent_id, 1, size)
+    if note.is_folder:
+        create(db, note.owner_id, [note.id])
+    apply(db, deltas)
+
+def note_changed(db: Session, note: models.Note, size_delta: int = 0):
+    """An edit of `note`: its ancestors (and the note itself, for a folder) were modified"""
+    deltas = {ancestor_id: [0, 0, size_delta] for ancestor_id in tree.ancestor_ids(note.path)}
+    if note.is_folder:
+        deltas[note.id] = [0, 0, 0]
+    apply(db, deltas)
+
+def note_moved(db: Session, old_path: str, old_parent_id: Optional[int], note: models.Note, totals: tuple):
+    """`note` and its subtree (`totals` from subtree_totals) moved from `old_path` to its current path"""
+    count, size = totals
+    deltas: Dict[int, list] = {}
+    add_to_ancestors(deltas, old_path, old_parent_id, count, size, sign=-1)
+    add_to_ancestors(deltas, note.path, note.parent_id, count, size)
+    apply(db, deltas)
+
+def note_removed(db: Session, note: models.Note):
+    """Before deleting `note` and its subtree: drop their stats rows and update the ancestors"""
+    count, size = subtree_totals(db, note)
+    subtree = select(models.Note.id).where(
+        models.Note.owner_id == note.owner_id,
+        tree.path_startswith(db.get_bind().dialect.name, tree.descendant_prefix(note.path, note.id))
+    )
+    db.execute(
+        delete(models.FolderStats).where(
+            or_(models.FolderStats.folder_id == note.id, models.FolderStats.folder_id.in_(subtree))
+        ),
+        execution_options={"synchronize_session": False}
+    )
+    deltas: Dict[int, list] = {}
+    add_to_ancestors(deltas, note.path, note.parent_id, count, size, sign=-1)
+    apply(db, deltas)
+
+# Reading
+
+def list_folders(db: Session, owner_id: int, parent_id: Optional[int]) -> List[dict]:
+    """The folders directly in `parent_id` (None for the root level) with their stats, in one query"""
+    note = models.Note
+    rows = db.execute(
+        select(*tree.LISTING_COLUMNS, *STATS_COLUMNS)
+        .join(models.FolderStats, models.FolderStats.folder_id == note.id)
+        .where(note.owner_id == owner_id, note.parent_id == parent_id, note.is_folder.is_(True))
+        .order_by(note.id)
+    ).mappings().all()
+    return [dict(row) for row in rows]
+
+# Check and rebuild
+
+def compute(db: Session, owner_id: Optional[int] = None) -> Dict[int, dict]:
+    """Stats of every folder (of `owner_id`, or of everyone) from a scan of the notes"""
+    note, body = models.Note, models.NoteContent
+    statement = (
+        select(note.id, note.owner_id, note.parent_id, note.path, note.is_folder, note.updated_at,
+               func.coalesce(body.size, 0).label("size"))
+        .outerjoin(body, body.hash == note.content_hash)
+    )
+    if owner_id is not None:
+        statement = statement.where(note.owner_id == owner_id)
+    stats: Dict[int, dict] = {}
+
+    def entry(folder_id: int) -> dict:
+        return stats.setdefault(folder_id, {
+            "owner_id": None, "child_count": 0, "descendant_count": 0, "content_bytes": 0, "last_modified_at": None,
+        })
+
+    def touch(current: dict, updated_at):
+        if updated_at is not None and (current["last_modified_at"] is None or updated_at > current["last_modified_at"]):
+            current["last_modified_at"] = updated_at
+
+    for row in db.execute(statement.execution_options(yield_per=SCAN_BATCH_SIZE)):
+        if row.is_folder:
+            current = entry(row.id)
+            current["owner_id"] = row.owner_id
+            touch(current, row.updated_at)
+        for ancestor_id in tree.ancestor_ids(row.path):
+            current = entry(ancestor_id)
+            current["descendant_count"] += 1
+            current["content_bytes"] += row.size
+            touch(current, row.updated_at)
+        if row.parent_id is not None:
+            entry(row.parent_id)["child_count"] += 1
+    # Ancestors that are not folders (earlier imports could nest under notes) get no row
+    return {folder_id: values for folder_id, values in stats.items() if values["owner_id"] is not None}
+
+def check(db: Session, owner_id: Optional[int] = None) -> dict:
+    """Compare stored stats with recomputed ones"""
+    expected = compute(db, owner_id)
+    statement = select(models.FolderStats)
+    if owner_id is not None:
+        statement = statement.where(models.FolderStats.owner_id == owner_id)
+    mismatches = []
+    seen = set()
+    for stored in db.execute(statement).scalars():
+        seen.add(stored.folder_id)
+        values = expected.get(stored.folder_id)
+        if values is None:
+            mismatches.append({"folder_id": stored.folder_id, "problem": "stats row without a folder"})
+            continue
+        for key in ("child_count", "descendant_count", "content_bytes"):
+            if getattr(stored, key) != values[key]:
+                mismatches.append({"folder_id": stored.folder_id, "problem": key,
+                                   "stored": getattr(stored, key), "expected": values[key]})
+        # Only ever later than the newest updated_at (see above), give or
+        # take the second precision of the database clock
+        latest = values["last_modified_at"]
+        if latest is not None and (stored.last_modified_at is None or
+                                   _naive(stored.last_modified_at) < _naive(latest) - CLOCK_TOLERANCE):
+            mismatches.append({"folder_id": stored.folder_id, "problem": "last_modified_at",
+                               "stored": str(stored.last_modified_at), "expected": str(latest)})
+    for folder_id in expected.keys() - seen:
+        mismatches.append({"folder_id": folder_id, "problem": "missing stats row"})
+    return {"folders": len(expected), "mismatches": len(mismatches), "details": mismatches[:100]}
+
+def _naive(value):
+    # SQLite hands back naive datetimes, Postgres aware ones; both are UTC
+    return value.replace(tzinfo=None)
+
+def rebuild(db: Session, owner_id: Optional[int] = None) -> int:
+    """Replace the stats rows (of `owner_id`, or all) with recomputed ones (caller commits)"""
+    expected = compute(db, owner_id)
+    statement = delete(models.FolderStats)
+    if owner_id is not None:
+        statement = statement.where(models.FolderStats.owner_id == owner_id)
+    db.execute(statement, execution_options={"synchronize_session": False})
+    rows = [dict(values, folder_id=folder_id) for folder_id, values in expected.items()]
+    for start in range(0, len(rows), APPLY_CHUNK_SIZE):
+        db.execute(insert(models.FolderStats), rows[start:start + APPLY_CHUNK_SIZE])
+    return len(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check or rebuild the per-folder aggregates")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    parser.add_argument("--owner", type=int, help="only this user's folders")
+    args = parser.parse_args()
+    from app.database import SessionLocal
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            result = {"rebuilt_folders": rebuild(db, args.owner)}
+            db.commit()
+        else:
+            result = check(db, args.owner)
+    finally:
+        db.close()
+    print(json.dumps(result, indent=2))
+    # A failed check fails the command, for cron and CI
+    if result.get("mismatches"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
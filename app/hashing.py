@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from fastapi import HTTPException
+from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
+from app.config import settings
+from app import metrics
+
+logger = logging.getLogger("anctext.hashing")
+
+# bcrypt runs in a dedicated process pool so a burst of logins cannot starve
+# the event loop (or the GIL) that serves the note endpoints.
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+_BCRYPT_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+def hash_password_sync(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_password_sync(password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(password, hashed_password)
+
+def needs_rehash(hashed_password: str) -> bool:
+    """True when a stored hash was made with a different cost than BCRYPT_ROUNDS"""
+    match = _BCRYPT_COST_RE.match(hashed_password or "")
+    return match is None or int(match.group(1)) != settings.BCRYPT_ROUNDS
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: forking a process that runs an event loop and DB pools is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def _run(fn, *args):
+    global _pending
+    # Admission control: shed load instead of queueing logins without bound
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many sign-ins in progress, try again shortly",
+            headers={"Retry-After": "1"}
+        )
+    _pending += 1
+    try:
+        if settings.PASSWORD_HASH_WORKERS <= 0:
+            return await run_in_threadpool(fn, *args)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool next time and serve this call anyway
+            logger.error("Password hashing pool broke, restarting it")
+            shutdown()
+            return await run_in_threadpool(fn, *args)
+    finally:
+        _pending -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run(hash_password_sync, password)
+
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run(verify_password_sync, password, hashed_password)
+
+def stats() -> dict:
+    return {"pending": _pending, "workers": settings.PASSWORD_HASH_WORKERS, "rounds": settings.BCRYPT_ROUNDS}
+
+@metrics.collector
+def _hashing_metrics():
+    yield "# TYPE password_hash_pending gauge"
+    yield f"password_hash_pending {_pending}"
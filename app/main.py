@@ -1,28 +1,44 @@
 import logging
-import time
-from fastapi import FastAPI, Request, status
-from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from app.database import engine, Base
-from app import routes, auth_routes
+from sqlalchemy.orm.exc import StaleDataError
+from app import routes, auth_routes, cache, piston, migrations, hashing, compression, metrics, database, replicas, changes, ratelimit
+from app.responses import FastJSONResponse
 from .config import settings
 
-# Structured Logging Configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-)
+# Structured Logging Configuration (LOG_FORMAT=json for one object per line)
+metrics.configure_logging()
 logger = logging.getLogger("anctext")
 
-# Create database tables
-Base.metadata.create_all(bind=engine)
+# Bring the schema up to date (disabled in the Docker image, which migrates
+# once before starting the workers)
+if settings.AUTO_MIGRATE:
+    migrations.run_migrations()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    replicas.replica_set.start()
+    yield
+    await replicas.replica_set.stop()
+    await changes.broker.stop()
+    await piston.close_client()
+    hashing.shutdown()
+    if database.write_queue is not None:
+        database.write_queue.stop()
 
 app = FastAPI(
     title=settings.APP_NAME,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse
 )
 
+# Per-IP rate limit, inside CORS so browsers can read the 429
+if "ip" in ratelimit.RULES:
+    app.add_middleware(ratelimit.RateLimitMiddleware)
+
 # CORS Middleware - Robust Configuration
 origins = settings.parsed_origins
 
@@ -48,28 +64,35 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients read pagination cursors and validators
+    expose_headers=["X-Next-Cursor", "X-Cache", "ETag"],
 )
 
+compression.add_compression(app)
+
+# A versioned note was written concurrently between our read and our UPDATE
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    return FastJSONResponse(
+        status_code=status.HTTP_409_CONFLICT,
+        content={"detail": "Note was modified concurrently, reload and retry"},
+    )
+
 # Global Exception Handler
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     logger.error(f"Unhandled exception: {exc}", exc_info=True)
-    return JSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content={"detail": "An internal server error occurred. Please contact support."},
     )
 
-# Request Logging Middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = (time.time() - start_time) * 1000
-    formatted_process_time = "{0:.2f}ms".format(process_time)
-    logger.info(
-        f"RID: {request.scope.get('root_path')} | Path: {request.url.path} | Method: {request.method} | Status: {response.status_code} | Time: {formatted_process_time}"
-    )
-    return response
+# Clients that just wrote read from the primary for a while
+if replicas.replica_set.replicas:
+    app.add_middleware(replicas.StickyWritesMiddleware)
+
+# Request metrics and sampled request logging (outermost, so it times everything)
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Include routers
 app.include_router(auth_routes.router)
@@ -79,6 +102,31 @@ app.include_router(routes.router)
 def health_check():
     return {"status": "ok"}
 
+# Prometheus scrape endpoint (per worker process)
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Connection pool usage and checkout waits of this worker
+@app.get("/health/db")
+def db_health():
+    return database.pool_status()
+
+# Replica health and how many reads fell back to the primary
+@app.get("/health/replicas")
+def replica_health():
+    return replicas.replica_set.stats()
+
+# Active rate limit rules and the number of live buckets
+@app.get("/health/ratelimit")
+def ratelimit_health():
+    return ratelimit.stats()
+
+# Hit/miss counters of the in-process caches, for sizing them
+@app.get("/health/caches")
+def cache_health():
+    return cache.cache_stats()
+
 @app.get("/")
 def root():
     return {
@@ -0,0 +1,312 @@
+import contextvars
+import json
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+
+logger = logging.getLogger("anctext.requests")
+
+# In-process metrics rendered in the Prometheus text format at /metrics.
+# Each worker process keeps its own series; scrape every worker (or put
+# them behind distinct targets) to get totals.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_registry: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[str]]] = []
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+INF_LABEL = 'le="+Inf"'
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def summary(self, *labels) -> dict:
+        with self._lock:
+            series = self._series.get(labels)
+            count, total = (series[-1], series[-2]) if series else (0, 0.0)
+        return {"count": count, "sum": total}
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, INF_LABEL)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+def collector(fn: Callable[[], Iterable[str]]):
+    """Register a function producing exposition lines at scrape time"""
+    _collectors.append(fn)
+    return fn
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for fn in _collectors:
+        lines.extend(fn())
+    return "\n".join(lines) + "\n"
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to fully send a response", ("method", "route", "status"))
+REQUEST_SQL_QUERIES = Histogram(
+    "http_request_sql_queries", "SQL statements executed per request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 500))
+SQL_DURATION = Histogram(
+    "db_query_duration_seconds", "Time spent in cursor.execute", ("engine",), buckets=QUERY_BUCKETS)
+POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds", "Time waiting to check a connection out of the pool", ("engine",),
+    buckets=QUERY_BUCKETS + (2.5, 5.0, 10.0, 30.0))
+UPSTREAM_DURATION = Histogram(
+    "piston_execute_duration_seconds", "Latency of execute calls to the Piston API", ("outcome",))
+SERIALIZE_DURATION = Histogram(
+    "http_response_serialize_seconds", "Time spent encoding JSON response bodies per request", ("route",),
+    buckets=QUERY_BUCKETS + (2.5, 5.0))
+
+class RequestStats:
+    """Per-request accumulators, shared with worker threads through a contextvar"""
+
+    __slots__ = ("sql_count", "sql_seconds", "pool_wait_seconds", "upstream_seconds", "serialize_seconds")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.pool_wait_seconds = 0.0
+        self.upstream_seconds = 0.0
+        self.serialize_seconds = 0.0
+
+_request_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+def current_stats() -> Optional[RequestStats]:
+    return _request_stats.get()
+
+# Database
+
+class _PoolTimingMixin:
+    metrics_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            waited = time.perf_counter() - start
+            POOL_WAIT.observe(waited, self.metrics_label)
+            stats = _request_stats.get()
+            if stats is not None:
+                stats.pool_wait_seconds += waited
+
+class InstrumentedQueuePool(_PoolTimingMixin, QueuePool):
+    """QueuePool that records how long each checkout waited"""
+
+class InstrumentedAsyncQueuePool(_PoolTimingMixin, AsyncAdaptedQueuePool):
+    metrics_label = "async"
+
+def pool_wait_summary(label: str) -> dict:
+    summary = POOL_WAIT.summary(label)
+    mean = summary["sum"] / summary["count"] if summary["count"] else 0.0
+    return {"checkouts": summary["count"], "wait_total_ms": round(summary["sum"] * 1000, 2),
+            "wait_mean_ms": round(mean * 1000, 3)}
+
+def instrument_engine(engine, label: str):
+    """Time every statement on a (sync) Engine and attribute it to the current request"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        SQL_DURATION.observe(elapsed, label)
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.sql_count += 1
+            stats.sql_seconds += elapsed
+
+# Upstream calls
+
+def observe_upstream(seconds: float, outcome: str):
+    UPSTREAM_DURATION.observe(seconds, outcome)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.upstream_seconds += seconds
+
+# Response encoding
+
+def observe_serialization(seconds: float):
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.serialize_seconds += seconds
+
+# Requests and logging
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line; request fields arrive through `extra={"fields": ...}`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    if settings.LOG_FORMAT.lower() == "json":
+        handler.setFormatter(JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(logging.INFO)
+
+def _route_template(scope: Scope) -> str:
+    route = scope.get("route")
+    # Templates, not raw paths, keep the label set bounded
+    return getattr(route, "path", None) or "unmatched"
+
+class MetricsMiddleware:
+    """Records route latency histograms and per-request DB/upstream/encoding costs.
+
+    The duration runs until the last body chunk is sent, so streamed
+    responses are measured in full. Request log lines are sampled at
+    LOG_SAMPLE_RATE; server errors and slow requests are always logged.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_stats.reset(token)
+            self._record(scope, status, time.perf_counter() - start, stats)
+
+    def _record(self, scope: Scope, status: int, elapsed: float, stats: RequestStats):
+        route = _route_template(scope)
+        REQUEST_DURATION.observe(elapsed, scope["method"], route, status)
+        REQUEST_SQL_QUERIES.observe(stats.sql_count, route)
+        # Only requests that encoded a JSON body; streams and 304s have none
+        if stats.serialize_seconds:
+            SERIALIZE_DURATION.observe(stats.serialize_seconds, route)
+
+        slow = elapsed * 1000 >= settings.LOG_SLOW_REQUEST_MS > 0
+        if status < 500 and not slow and random.random() >= settings.LOG_SAMPLE_RATE:
+            return
+        fields = {
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": route,
+            "status": status,
+            "duration_ms": round(elapsed * 1000, 2),
+            "sql_queries": stats.sql_count,
+            "sql_ms": round(stats.sql_seconds * 1000, 2),
+            "pool_wait_ms": round(stats.pool_wait_seconds * 1000, 2),
+            "upstream_ms": round(stats.upstream_seconds * 1000, 2),
+            "serialize_ms": round(stats.serialize_seconds * 1000, 2),
+        }
+        if settings.LOG_FORMAT.lower() == "json":
+            logger.info("request", extra={"fields": fields})
+        else:
+            logger.info(" | ".join(f"{key}={value}" for key, value in fields.items()))
@@ -0,0 +1,38 @@
+import logging
+import os
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect
+from app.database import engine
+
+logger = logging.getLogger("anctext.migrations")
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+# Revision matching the schema Base.metadata.create_all used to build
+BASELINE_REVISION = "0001"
+
+def alembic_config(connection=None) -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    config.attributes["configure_logging"] = False
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+def run_migrations():
+    """Upgrade the database to the latest revision.
+
+    Databases created before migrations existed (tables present, no
+    alembic_version) are stamped at the baseline first, so only the newer
+    revisions run against them.
+    """
+    with engine.begin() as connection:
+        inspector = inspect(connection)
+        if inspector.has_table("notes") and not inspector.has_table("alembic_version"):
+            logger.info(f"Stamping existing database at revision {BASELINE_REVISION}")
+            command.stamp(alembic_config(connection), BASELINE_REVISION)
+        command.upgrade(alembic_config(connection), "head")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    run_migrations()
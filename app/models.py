@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from typing import Optional
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, DateTime, ForeignKey, Index, LargeBinary, event, select
+from sqlalchemy.orm import Session, object_session, relationship
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -20,17 +21,135 @@ class Note(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(255), nullable=False)
-    content = Column(Text, nullable=True, default="")
+    # The body lives in note_contents; see the `content` property below
+    content_hash = Column(String(64), ForeignKey("note_contents.hash"), nullable=True)
     is_folder = Column(Boolean, default=False)
     parent_id = Column(Integer, ForeignKey("notes.id"), nullable=True)
+    # Materialized path of ancestor ids, root first: "/" for root notes,
+    # "/4/17/" for a note in folder 17 inside folder 4 (see app/tree.py)
+    path = Column(String(512), nullable=False)
     cover_image = Column(String(500), nullable=True)
     owner_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    # Bumped by every ORM update; a concurrent stale write raises StaleDataError
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     # Self-referential relationship
     parent = relationship("Note", remote_side=[id], backref="children")
     owner = relationship("User", back_populates="notes")
 
+    # Every hot query filters on owner_id plus parent_id or id (see migrations/)
+    __table_args__ = (
+        Index("ix_notes_owner_parent_updated", "owner_id", "parent_id", "updated_at"),
+        Index("ix_notes_owner_updated", "owner_id", "updated_at"),
+        Index("ix_notes_parent_id", "parent_id"),
+        Index("ix_notes_content_hash", "content_hash"),
+        # Subtree lookups are prefix matches on path within an owner
+        Index("ix_notes_owner_path", "owner_id", "path", postgresql_ops={"path": "text_pattern_ops"}),
+    )
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Bodies are only read (and decompressed) when `content` is accessed;
+    # assigning it stores the text when the session flushes
+    @property
+    def content(self) -> str:
+        cached = getattr(self, "_content", None)
+        if cached is not None and cached[0] == self.content_hash:
+            return cached[1]
+        if self.content_hash is None:
+            return ""
+        from app import contents
+        text = contents.load(object_session(self), self.content_hash)
+        self._content = (self.content_hash, text)
+        return text
+
+    @content.setter
+    def content(self, text: Optional[str]):
+        from app import contents
+        text = text or ""
+        digest = contents.content_hash(text) if text else None
+        self.content_hash = digest
+        self._content = (digest, text)
+        self._unsaved_content = text if digest is not None else None
+
     def __repr__(self):
         return f"<Note(id={self.id}, title='{self.title}', is_folder={self.is_folder})>"
+
+class NoteContent(Base):
+    """A note body, stored once per distinct text (see app/contents.py)"""
+    __tablename__ = "note_contents"
+
+    hash = Column(String(64), primary_key=True)  # SHA-256 of the text
+    encoding = Column(String(8), nullable=False)  # raw, zlib or zstd
+    size = Column(Integer, nullable=False)  # uncompressed bytes
+    data = Column(LargeBinary, nullable=False)
+    last_used_at = Column(DateTime(timezone=True), server_default=func.now())
+
+@event.listens_for(Session, "before_flush")
+def _store_note_bodies(session, flush_context, instances):
+    notes = [
+        obj for obj in list(session.new) + list(session.dirty)
+        if isinstance(obj, Note) and getattr(obj, "_unsaved_content", None) is not None
+    ]
+    if not notes:
+        return
+    from app import contents
+    contents.store_many(session, [note._unsaved_content for note in notes])
+    for note in notes:
+        note._unsaved_content = None
+
+@event.listens_for(Note, "before_insert")
+def _set_note_path(mapper, connection, note):
+    # Parents are inserted before their children, so a parent created in the
+    # same flush already has its path here
+    if note.path is not None:
+        return
+    if note.parent_id is None:
+        note.path = "/"
+        return
+    parent = note.__dict__.get("parent")
+    if parent is not None and parent.id == note.parent_id and parent.path is not None:
+        parent_path = parent.path
+    else:
+        parent_path = connection.execute(select(Note.path).where(Note.id == note.parent_id)).scalar()
+    from app import tree
+    note.path = tree.child_path(parent_path, note.parent_id)
+
+class FolderStats(Base):
+    """Aggregates over a folder's subtree, kept up to date by the write paths (see app/folder_stats.py)"""
+    __tablename__ = "folder_stats"
+
+    folder_id = Column(Integer, ForeignKey("notes.id"), primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    child_count = Column(Integer, nullable=False, default=0)
+    descendant_count = Column(Integer, nullable=False, default=0)
+    content_bytes = Column(BigInteger, nullable=False, default=0)  # uncompressed body bytes below the folder
+    # Latest write to the folder or anything below it, deletes and moves included
+    last_modified_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class NoteChange(Base):
+    """Sync change log: the latest change of each note, in commit order per owner"""
+    __tablename__ = "note_changes"
+
+    # The id is the feed cursor; AUTOINCREMENT stops SQLite from reusing ids
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    # No foreign key: tombstones outlive their note
+    note_id = Column(Integer, nullable=False)
+    deleted = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_note_changes_owner_id_id", "owner_id", "id"),
+        Index("ix_note_changes_note_id", "note_id"),
+        {"sqlite_autoincrement": True},
+    )
+
+class NoteChangeHorizon(Base):
+    """Highest change id whose tombstones were pruned, per owner"""
+    __tablename__ = "note_change_horizons"
+
+    owner_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    pruned_through = Column(Integer, nullable=False)
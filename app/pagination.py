@@ -0,0 +1,46 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from fastapi import HTTPException
+from sqlalchemy import String, tuple_, type_coerce
+from app import models
+
+# Keyset (cursor) pagination over notes, newest first on (updated_at, id).
+# Cursors are opaque url-safe tokens carrying the sort key of the last row.
+
+MAX_PAGE_SIZE = 500
+
+def sort_key(dialect_name: str):
+    # Served by ix_notes_owner_parent_updated; updated_at is never NULL since migration 0003
+    key = models.Note.updated_at
+    if dialect_name == "sqlite":
+        # SQLite keeps timestamps as text; compare the stored strings directly
+        # so a cursor always matches its own row exactly
+        return type_coerce(key, String)
+    return key
+
+def encode_cursor(key_value, note_id: int) -> str:
+    if isinstance(key_value, datetime):
+        key_value = key_value.isoformat()
+    raw = json.dumps({"k": key_value, "i": note_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, dialect_name: str) -> Tuple[object, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        key_value, note_id = data["k"], int(data["i"])
+        if dialect_name != "sqlite" and key_value is not None:
+            key_value = datetime.fromisoformat(key_value)
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return key_value, note_id
+
+def apply_keyset(query, dialect_name: str, cursor: Optional[str]):
+    """Order a select over notes newest first and resume after `cursor`"""
+    key = sort_key(dialect_name)
+    if cursor:
+        key_value, note_id = decode_cursor(cursor, dialect_name)
+        query = query.where(tuple_(key, models.Note.id) < tuple_(key_value, note_id))
+    return query.order_by(key.desc(), models.Note.id.desc())
@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import httpx
+from fastapi import HTTPException
+from app.config import settings
+from app import cache, metrics, schemas
+
+logger = logging.getLogger("anctext.piston")
+
+# Shared keep-alive client for the Piston API, created on first use and
+# closed from the app lifespan
+_client: Optional[httpx.AsyncClient] = None
+_upstreams = itertools.cycle(settings.parsed_piston_urls)
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.PISTON_TIMEOUT, connect=settings.PISTON_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=settings.PISTON_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.PISTON_MAX_CONNECTIONS
+            ),
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def too_many_requests(detail: str) -> HTTPException:
+    return HTTPException(status_code=429, detail=detail, headers={"Retry-After": "1"})
+
+class ExecutionLimiter:
+    """Bounds concurrent executions globally and per user.
+
+    A user over their own limit is rejected straight away. Otherwise callers
+    queue for a global slot; once `max_queue` callers are already waiting, or
+    a slot does not free up within `queue_timeout` seconds, they get a 429.
+    """
+
+    def __init__(self, max_concurrency: int, max_per_user: int, max_queue: int, queue_timeout: float):
+        self.max_concurrency = max_concurrency
+        self.max_per_user = max_per_user
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = defaultdict(int)
+        self.waiting = 0
+        self.running = 0
+        self.rejected = 0
+
+    def check_user(self, user_id: int):
+        if self._in_flight.get(user_id, 0) >= self.max_per_user:
+            self.rejected += 1
+            raise too_many_requests("Too many executions in progress for this user")
+
+    @asynccontextmanager
+    async def user_slot(self, user_id: Optional[int]):
+        # user_id is None when the caller already holds a user slot (batches)
+        if user_id is None:
+            yield
+            return
+        self.check_user(user_id)
+        self._in_flight[user_id] += 1
+        try:
+            yield
+        finally:
+            self._in_flight[user_id] -= 1
+            if not self._in_flight[user_id]:
+                del self._in_flight[user_id]
+
+    @asynccontextmanager
+    async def global_slot(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Counted rather than read off the semaphore, which only locks once
+        # the acquires of callers arriving together have actually run
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self.rejected += 1
+            raise too_many_requests("Execution queue is full, try again shortly")
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise too_many_requests("Execution queue timed out, try again shortly")
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, user_id: Optional[int]):
+        async with self.user_slot(user_id):
+            async with self.global_slot():
+                yield
+
+    def stats(self) -> dict:
+        return {"running": self.running, "waiting": self.waiting, "rejected": self.rejected}
+
+limiter = ExecutionLimiter(
+    max_concurrency=settings.PISTON_MAX_CONCURRENCY,
+    max_per_user=settings.PISTON_MAX_PER_USER,
+    max_queue=settings.PISTON_MAX_QUEUE,
+    queue_timeout=settings.PISTON_QUEUE_TIMEOUT
+)
+
+@metrics.collector
+def _limiter_metrics():
+    for key, value in limiter.stats().items():
+        kind = "counter" if key == "rejected" else "gauge"
+        name = f"piston_executions_{key}" + ("_total" if kind == "counter" else "")
+        yield f"# TYPE {name} {kind}"
+        yield f"{name} {value}"
+
+async def execute(payload: dict) -> dict:
+    """Forward an execution to Piston, mapping upstream failures to a 502"""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        response = await get_client().post(next(_upstreams), json=payload)
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPStatusError as e:
+        outcome = "http_error"
+        logger.warning(f"Piston API Error: {e}")
+        raise HTTPException(status_code=502, detail=f"Piston Error: {e.response.text}")
+    except httpx.HTTPError as e:
+        outcome = "timeout" if isinstance(e, httpx.TimeoutException) else "transport_error"
+        logger.warning(f"Piston API Error: {e!r}")
+        raise HTTPException(status_code=502, detail="Execution Failed")
+    finally:
+        metrics.observe_upstream(time.perf_counter() - start, outcome)
+
+# Content-addressed cache of execution results, keyed by the normalized request
+result_cache = cache.build_cache(
+    "executions",
+    maxsize=settings.EXECUTE_CACHE_SIZE,
+    ttl=settings.EXECUTE_CACHE_TTL,
+    redis_url=settings.EXECUTE_CACHE_REDIS_URL
+)
+# Identical executions already on their way to Piston, shared by every caller
+_pending = {}
+
+class SharedExecution:
+    """One upstream call run as its own task, so cancelling the caller that
+    started it does not cancel it for the others awaiting the same result.
+    The call is only cancelled once every caller has gone away."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.callers = 0
+
+def execution_key(request: schemas.ExecuteRequest) -> str:
+    payload = request.model_dump()
+    payload["language"] = payload["language"].strip().lower()
+    payload["files"] = [
+        {key: value.replace("\r\n", "\n") if isinstance(value, str) else value for key, value in file.items()}
+        for file in payload["files"]
+    ]
+    payload["stdin"] = payload["stdin"].replace("\r\n", "\n")
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def is_cacheable(request: schemas.ExecuteRequest) -> bool:
+    return request.language.strip().lower() not in settings.parsed_execute_cache_excluded_languages
+
+def is_deterministic(result: dict) -> bool:
+    # Runs killed by a signal (timeouts, memory limits) depend on load, not on the input
+    stages = [result.get(stage) or {} for stage in ("compile", "run")]
+    return all(stage.get("signal") is None for stage in stages)
+
+async def execute_cached(request: schemas.ExecuteRequest, user_id: Optional[int]):
+    """Execute through the result cache; returns (result, cache status).
+
+    The status is HIT, MISS or BYPASS (language opted out). Hits never touch
+    the limiter or the upstream quota, and concurrent identical misses share
+    a single upstream call, which runs on while any of them still waits.
+    Every caller waiting on a shared call holds a slot of its own user's
+    limit; the call itself only takes a global slot, so it can never fail
+    with one user's 429 for the others.
+    """
+    if not is_cacheable(request):
+        async with limiter.slot(user_id):
+            return await execute(request.model_dump()), "BYPASS"
+
+    key = execution_key(request)
+    cached = await result_cache.aget(key)
+    if cached is not None:
+        return cached, "HIT"
+
+    async with limiter.user_slot(user_id):
+        shared = _pending.get(key)
+        status = "HIT"
+        if shared is None:
+            shared = _pending[key] = SharedExecution(asyncio.create_task(_execute_shared(key, request)))
+            shared.task.add_done_callback(lambda _: _forget(key, shared))
+            status = "MISS"
+        shared.callers += 1
+        try:
+            return await asyncio.shield(shared.task), status
+        finally:
+            shared.callers -= 1
+            if not shared.callers and not shared.task.done():
+                # Nobody is left to use the result: stop the upstream call, and
+                # let later callers start a fresh one instead of joining it
+                _forget(key, shared)
+                shared.task.cancel()
+
+async def _execute_shared(key: str, request: schemas.ExecuteRequest) -> dict:
+    async with limiter.global_slot():
+        result = await execute(request.model_dump())
+    if is_deterministic(result):
+        await result_cache.aset(key, result)
+    return result
+
+def _forget(key: str, shared: SharedExecution):
+    if _pending.get(key) is shared:
+        del _pending[key]
+
+async def execute_batch(requests: List[schemas.ExecuteRequest], user_id: int):
+    """Run a batch concurrently and yield one NDJSON line per result as it completes.
+
+    The whole batch holds a single per-user slot; each item still queues for a
+    global slot, and at most EXECUTE_BATCH_PARALLELISM items run at once.
+    Failures are reported in their own line instead of aborting the stream.
+    """
+    parallelism = asyncio.Semaphore(settings.EXECUTE_BATCH_PARALLELISM)
+
+    async def run(index: int, request: schemas.ExecuteRequest) -> dict:
+        async with parallelism:
+            try:
+                result, cache_status = await execute_cached(request, None)
+                return {"index": index, "status": 200, "cache": cache_status, "result": result}
+            except HTTPException as e:
+                return {"index": index, "status": e.status_code, "error": e.detail}
+
+    async with limiter.user_slot(user_id):
+        tasks = [asyncio.create_task(run(index, request)) for index, request in enumerate(requests)]
+        try:
+            for completed in asyncio.as_completed(tasks):
+                yield json.dumps(await completed) + "\n"
+        finally:
+            # Client went away or the stream failed: stop the remaining executions
+            for task in tasks:
+                task.cancel()
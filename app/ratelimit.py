@@ -0,0 +1,287 @@
+import logging
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+from fastapi import Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app import auth, metrics, models
+from app.config import settings
+from app.responses import FastJSONResponse
+
+logger = logging.getLogger("anctext.ratelimit")
+
+# Token buckets per user and per client IP, shared by the worker processes.
+# Each bucket is kept as a single "theoretical arrival time" (GCRA): a
+# request is allowed when the bucket, refilled since the last request, still
+# holds its cost. One number per key means one atomic upsert per check, in a
+# SQLite file every worker on the host opens (in /dev/shm when it exists, so
+# it never touches a disk) or in Redis when several hosts share the limits.
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+# Expired buckets are swept every this many checks per worker
+PRUNE_EVERY = 10000
+# Paths the per-IP limit never applies to
+EXEMPT_PREFIXES = ("/health", "/metrics")
+
+REJECTED = metrics.Counter("rate_limit_rejected_total", "Requests rejected by a rate limit", ("rule",))
+STORE_ERRORS = metrics.Counter("rate_limit_store_errors_total", "Rate limit checks let through on a store error")
+
+class Rule:
+    """`requests` per `period` seconds, with bursts of up to `requests`"""
+
+    def __init__(self, name: str, requests: int, period: float):
+        self.name = name
+        self.requests = requests
+        self.period = period
+        self.interval = period / requests
+
+    @classmethod
+    def parse(cls, name: str, spec: str) -> Optional["Rule"]:
+        """`"<requests>/<second|minute|hour|day>"`; an empty spec turns the rule off"""
+        spec = spec.strip().lower()
+        if not spec:
+            return None
+        try:
+            count, _, unit = spec.partition("/")
+            period = PERIODS.get(unit.strip()) or float(unit.rstrip("s"))
+            requests = int(count)
+            if requests <= 0 or period <= 0:
+                raise ValueError
+        except ValueError:
+            raise RuntimeError(f"Invalid rate limit for {name}: {spec!r} (expected e.g. '60/minute')")
+        return cls(name, requests, period)
+
+def _rules() -> Dict[str, Rule]:
+    specs = {
+        "ip": settings.RATE_LIMIT_IP,
+        "auth": settings.RATE_LIMIT_AUTH,
+        "notes": settings.RATE_LIMIT_NOTES,
+        "execute": settings.RATE_LIMIT_EXECUTE,
+    }
+    rules = {}
+    for name, spec in specs.items():
+        rule = Rule.parse(name, spec)
+        if rule is not None:
+            rules[name] = rule
+    return rules
+
+RULES = _rules() if settings.RATE_LIMIT_ENABLED else {}
+
+# Stores. hit() consumes `cost` tokens and returns 0.0, or the seconds to
+# wait before the request would be allowed (nothing is consumed then).
+
+class MemoryStore:
+    """Buckets of this worker only, for a single process or tests"""
+
+    name = "memory"
+    # A dict lookup: cheap enough to run on the event loop
+    blocking = False
+
+    def __init__(self):
+        self._tat: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def hit(self, key: str, now: float, cost: float, period: float) -> float:
+        with self._lock:
+            tat = max(self._tat.get(key, now), now) + cost
+            if tat - now > period:
+                return tat - now - period
+            self._tat[key] = tat
+            self._hits += 1
+            if self._hits % PRUNE_EVERY == 0:
+                self._tat = {k: v for k, v in self._tat.items() if v > now}
+            return 0.0
+
+    def size(self) -> int:
+        return len(self._tat)
+
+def default_sqlite_path() -> str:
+    directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(directory, "anctext-ratelimit.db")
+
+class SQLiteStore:
+    """Buckets in a SQLite file shared by every worker on this host.
+
+    A check is one INSERT ... ON CONFLICT DO UPDATE ... RETURNING, so it is
+    atomic across processes without a read-modify-write round trip.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    HIT = (
+        "INSERT INTO buckets (key, tat, allowed) "
+        "VALUES (:key, CASE WHEN :cost <= :period THEN :now + :cost ELSE :now END, :cost <= :period) "
+        "ON CONFLICT(key) DO UPDATE SET "
+        "allowed = max(tat, :now) + :cost - :now <= :period, "
+        "tat = CASE WHEN max(tat, :now) + :cost - :now <= :period THEN max(tat, :now) + :cost ELSE tat END "
+        "RETURNING tat, allowed"
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._hits = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per process; a forked worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            # Workers starting together queue on the schema setup below
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                conn.execute("PRAGMA journal_mode=WAL")
+            # Limits are soft state: losing the last writes to a crash is fine
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets "
+                "(key TEXT PRIMARY KEY, tat REAL NOT NULL, allowed INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            # A check queues behind other workers' writes for at most 100ms
+            conn.execute("PRAGMA busy_timeout=100")
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def hit(self, key: str, now: float, cost: float, period: float) -> float:
+        with self._lock:
+            conn = self._connect()
+            tat, allowed = conn.execute(self.HIT, {"key": key, "now": now, "cost": cost, "period": period}).fetchall()[0]
+            self._hits += 1
+            if self._hits % PRUNE_EVERY == 0:
+                # A bucket whose arrival time has passed is full, same as no row
+                conn.execute("DELETE FROM buckets WHERE tat < ?", (now,))
+        if allowed:
+            return 0.0
+        return max(tat, now) + cost - now - period
+
+    def size(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM buckets").fetchone()[0]
+
+class RedisStore:
+    """Buckets in Redis, shared by every worker on every host"""
+
+    name = "redis"
+    blocking = True
+
+    SCRIPT = """
+local now = tonumber(ARGV[1])
+local cost = tonumber(ARGV[2])
+local period = tonumber(ARGV[3])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + cost
+if tat - now > period then
+  return tostring(tat - now - period)
+end
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+return '0'
+"""
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_STORE=redis but the redis package is not installed")
+        # Short timeouts: a slow limiter must never hold requests up
+        client = redis.Redis.from_url(url, socket_timeout=0.05, socket_connect_timeout=0.05)
+        self._script = client.register_script(self.SCRIPT)
+        self._client = client
+
+    def hit(self, key: str, now: float, cost: float, period: float) -> float:
+        return float(self._script(keys=[f"anctext:ratelimit:{key}"], args=[repr(now), repr(cost), repr(period)]))
+
+    def size(self) -> Optional[int]:
+        return None
+
+def build_store():
+    backend = settings.RATE_LIMIT_STORE.strip().lower()
+    if backend == "sqlite":
+        return SQLiteStore(settings.RATE_LIMIT_SQLITE_PATH or default_sqlite_path())
+    if backend == "redis":
+        if not settings.RATE_LIMIT_REDIS_URL:
+            raise RuntimeError("RATE_LIMIT_STORE=redis needs RATE_LIMIT_REDIS_URL")
+        return RedisStore(settings.RATE_LIMIT_REDIS_URL)
+    if backend == "memory":
+        return MemoryStore()
+    raise RuntimeError(f"Unknown RATE_LIMIT_STORE {settings.RATE_LIMIT_STORE!r}")
+
+store = build_store() if RULES else None
+
+async def retry_after(rule_name: str, key: str, cost: int = 1) -> float:
+    """Take `cost` tokens from `key`'s bucket; seconds to wait when it is empty, else 0"""
+    rule = RULES.get(rule_name)
+    if rule is None:
+        return 0.0
+    args = (f"{rule_name}:{key}", time.time(), rule.interval * cost, rule.period)
+    try:
+        # SQLite can wait out a contended lock and Redis a round trip: off the loop
+        if store.blocking:
+            return await run_in_threadpool(store.hit, *args)
+        return store.hit(*args)
+    except Exception as e:
+        # Fail open: an unavailable store must not take the API down with it
+        STORE_ERRORS.inc()
+        logger.warning(f"Rate limit store ({store.name}) failed: {e}")
+        return 0.0
+
+def _headers(wait: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(wait)))}
+
+async def check(rule_name: str, key: str, cost: int = 1):
+    """Raise a 429 with Retry-After when `key` is over the `rule_name` limit"""
+    wait = await retry_after(rule_name, key, cost)
+    if wait > 0:
+        REJECTED.inc(rule_name)
+        raise HTTPException(status_code=429, detail="Rate limit exceeded, retry later", headers=_headers(wait))
+
+def client_ip(scope) -> str:
+    # The peer address; behind a proxy, run the server with --forwarded-allow-ips
+    # so it is taken from X-Forwarded-For
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def limit_user(rule_name: str):
+    """Route dependency: one token per request from the current user's bucket"""
+    async def dependency(current_user: models.User = Depends(auth.get_current_user)):
+        await check(rule_name, f"user:{current_user.id}")
+    return dependency
+
+def limit_ip(rule_name: str):
+    """Route dependency: one token per request from the client IP's bucket"""
+    async def dependency(request: Request):
+        await check(rule_name, f"ip:{client_ip(request.scope)}")
+    return dependency
+
+class RateLimitMiddleware:
+    """Per-IP limit on every request, rejected before any routing or parsing"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        wait = await retry_after("ip", f"ip:{client_ip(scope)}")
+        if wait > 0:
+            REJECTED.inc("ip")
+            response = FastJSONResponse(
+                status_code=429, content={"detail": "Rate limit exceeded, retry later"}, headers=_headers(wait)
+            )
+            await response(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+def stats() -> dict:
+    return {
+        "enabled": bool(RULES),
+        "store": store.name if store is not None else None,
+        "buckets": store.size() if store is not None else 0,
+        "rules": {name: f"{rule.requests}/{rule.period:g}s" for name, rule in RULES.items()},
+    }
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import itertools
+import logging
+import time
+from typing import List, Optional
+from fastapi import Request
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app import cache, database, metrics
+from app.config import settings
+
+logger = logging.getLogger("anctext.replicas")
+
+# Read replicas for GET endpoints (DATABASE_REPLICA_URLS). Reads rotate over
+# the healthy replicas; a client that has just written reads from the primary
+# for REPLICA_STICKY_SECONDS so it always sees its own writes.
+
+STICKY_COOKIE = "sv_primary_until"
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.healthy = True
+        if settings.ASYNC_DB:
+            async_url = database.to_async_url(url)
+            self.engine = create_async_engine(
+                async_url, **database.pool_options(async_url, 1, metrics.InstrumentedAsyncQueuePool)
+            )
+            self.sync_engine = self.engine.sync_engine
+            self.sessionmaker = async_sessionmaker(self.engine, autoflush=False, expire_on_commit=False)
+        else:
+            connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+            self.engine = create_engine(
+                url, connect_args=connect_args, **database.pool_options(url, 1, metrics.InstrumentedQueuePool)
+            )
+            self.sync_engine = self.engine
+            self.sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.sync_engine.pool.metrics_label = name
+        metrics.instrument_engine(self.sync_engine, name)
+        database.install_idle_ping(self.sync_engine)
+        database.extra_engines[name] = self.sync_engine
+        event.listen(self.sync_engine, "handle_error", self._on_error)
+
+    def _on_error(self, context):
+        # A dropped connection takes the replica out until the next good ping
+        if context.is_disconnect:
+            self.mark_down(context.original_exception)
+
+    def mark_down(self, error):
+        if self.healthy:
+            logger.warning(f"Replica {self.name} marked down: {error!r}")
+        self.healthy = False
+
+    def _ping_sync(self):
+        with self.engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    async def ping(self):
+        try:
+            if settings.ASYNC_DB:
+                async with self.engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+            else:
+                await run_in_threadpool(self._ping_sync)
+        except Exception as e:
+            self.mark_down(e)
+            return
+        if not self.healthy:
+            logger.info(f"Replica {self.name} is back")
+        self.healthy = True
+
+class ReplicaSet:
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls, 1)]
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.primary_reads = 0
+
+    def pick(self) -> Optional[Replica]:
+        """Next healthy replica, round-robin; None when all are down"""
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.gather(*(replica.ping() for replica in self.replicas))
+            await asyncio.sleep(settings.REPLICA_HEALTH_INTERVAL)
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._health_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "replicas": {replica.name: {"healthy": replica.healthy} for replica in self.replicas},
+            "primary_reads": self.primary_reads,
+        }
+
+replica_set = ReplicaSet(settings.parsed_replica_urls)
+
+# Clients that wrote recently, by Authorization header; covers API clients
+# that drop cookies, within this worker
+sticky_clients = cache.TTLCache("replica_sticky", maxsize=100000, ttl=settings.REPLICA_STICKY_SECONDS)
+
+def _client_key(authorization: Optional[str]) -> Optional[str]:
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+def is_sticky(request: Request) -> bool:
+    key = _client_key(request.headers.get("authorization"))
+    if key is not None and sticky_clients.get(key):
+        return True
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+class StickyWritesMiddleware:
+    """Remember clients that just wrote, in-process and in a cookie shared by every worker"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS"):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                headers = MutableHeaders(scope=message)
+                key = _client_key(dict(scope["headers"]).get(b"authorization", b"").decode() or None)
+                if key is not None:
+                    sticky_clients.set(key, True)
+                until = time.time() + settings.REPLICA_STICKY_SECONDS
+                headers.append("set-cookie", (
+                    f"{STICKY_COOKIE}={until:.3f}; Max-Age={int(settings.REPLICA_STICKY_SECONDS) + 1}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                ))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+def _primary_read_factory():
+    if settings.ASYNC_DB:
+        return database.AsyncSessionLocal
+    return database.ReadSessionLocal or database.SessionLocal
+
+# Dependency to get a session for a read-only endpoint
+async def _get_replica_session(request: Request):
+    replica = None if is_sticky(request) else replica_set.pick()
+    if replica is None:
+        replica_set.primary_reads += 1
+    factory = replica.sessionmaker if replica is not None else _primary_read_factory()
+    if settings.ASYNC_DB:
+        async with factory() as db:
+            yield db
+        return
+    db = factory()
+    try:
+        yield db
+    finally:
+        db.close()
+
+# Without replicas, reads keep using the primary's read dependency as before
+get_replica_session = _get_replica_session if replica_set.replicas else database.get_read_session
@@ -1,149 +1,439 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app import models, schemas, auth
-from app.database import get_db
+from starlette.concurrency import run_in_threadpool
+from app import models, schemas, auth, search, tree, pagination, piston, deltas, etags, transfer, replicas, changes, ratelimit, folder_stats, contents
+from app.config import settings
+from app.database import get_session, release_session, run_bulk_write, run_db, run_write
 
-router = APIRouter(prefix="/notes", tags=["notes"])
+# Every route takes a token from the user's RATE_LIMIT_NOTES bucket
+router = APIRouter(prefix="/notes", tags=["notes"], dependencies=[Depends(ratelimit.limit_user("notes"))])
 
-# Get all root notes/folders (no parent)
-@router.get("/", response_model=List[schemas.NoteResponse])
-def get_root_notes(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    notes = db.query(models.Note).filter(
-        models.Note.parent_id == None,
-        models.Note.owner_id == current_user.id
-    ).all()
-    return notes
+# Handlers are async and hand their DB work to run_db, which runs the sync
+# helpers below on an AsyncSession or in the threadpool (see settings.ASYNC_DB).
+# Small writes go through run_write (the SQLite write queue when enabled) and
+# GET handlers use the read-only pool where there is one.
 
-# Get specific note by ID with its children
-@router.get("/{note_id}", response_model=schemas.NoteResponse)
-def get_note(note_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+def get_owned_note(db: Session, note_id: int, owner_id: int, detail: str = "Note not found") -> models.Note:
     note = db.query(models.Note).filter(
         models.Note.id == note_id,
-        models.Note.owner_id == current_user.id
+        models.Note.owner_id == owner_id
     ).first()
     if not note:
-        raise HTTPException(status_code=404, detail="Note not found")
+        raise HTTPException(status_code=404, detail=detail)
     return note
 
-# Get children of a specific folder
-@router.get("/{note_id}/children", response_model=List[schemas.NoteResponse])
-def get_note_children(note_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+def get_parent_folder(db: Session, parent_id: int, owner_id: int) -> models.Note:
+    parent = get_owned_note(db, parent_id, owner_id, detail="Parent note not found")
+    if not parent.is_folder:
+        raise HTTPException(status_code=400, detail="Parent must be a folder")
+    return parent
+
+def nested_too_deeply() -> HTTPException:
+    return HTTPException(status_code=400, detail="Folders are nested too deeply")
+
+def move_note(db: Session, db_note: models.Note, parent_id: Optional[int], owner_id: int):
+    """Move a note (with its subtree) into `parent_id`, or to the root level"""
+    parent = get_parent_folder(db, parent_id, owner_id) if parent_id else None
+    if parent is not None and (
+        parent.id == db_note.id or parent.path.startswith(tree.descendant_prefix(db_note.path, db_note.id))
+    ):
+        raise HTTPException(status_code=400, detail="Cannot move a note into itself or one of its descendants")
+    new_path = tree.child_path(parent.path if parent else None, parent.id if parent else None)
+    growth = len(new_path) - len(db_note.path)
+    if growth > 0 and tree.deepest_path_length(db, owner_id, db_note.path, db_note.id) + growth > tree.MAX_PATH_LENGTH:
+        raise nested_too_deeply()
+    totals = folder_stats.subtree_totals(db, db_note)
+    old_path, old_parent_id = db_note.path, db_note.parent_id
+    tree.move_subtree(db, db_note, parent)
+    folder_stats.note_moved(db, old_path, old_parent_id, db_note, totals)
+
+# Get all root notes/folders (no parent)
+# Without `limit` the whole tree is returned; with it, one keyset page of
+# root notes is returned (without bodies or subtrees unless asked for) and
+# the next page is announced in X-Next-Cursor
+@router.get("/", response_model=List[schemas.NoteListItem])
+async def get_root_notes(
+    response: Response,
+    depth: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_content: Optional[bool] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    depth, include_content = listing_defaults(limit, depth, include_content)
+    etag, notes, next_cursor = await run_db(
+        db, _get_root_notes, current_user.id, depth, limit, cursor, include_content, if_none_match
+    )
+    if notes is None:
+        return etags.not_modified(etag)
+    etags.set_etag(response, etag)
+    set_next_cursor(response, next_cursor)
+    return notes
+
+def _get_root_notes(db: Session, owner_id: int, depth: Optional[int], limit: Optional[int],
+                    cursor: Optional[str], include_content: bool, if_none_match: Optional[str]):
+    # A page depends on the whole root level, so the tag covers all of it
+    fingerprint = tree.subtree_fingerprint(db, owner_id, depth=depth)
+    etag = etags.make_etag(owner_id, "root", depth, limit, cursor, include_content, *fingerprint)
+    if etags.matches(if_none_match, etag):
+        return etag, None, None
+    if limit is None:
+        return etag, tree.load_tree(db, owner_id, depth=depth, include_content=include_content), None
+    notes, next_cursor = tree.load_page(db, owner_id, None, limit, cursor=cursor, depth=depth,
+                                        include_content=include_content)
+    return etag, notes, next_cursor
+
+def listing_defaults(limit: Optional[int], depth: Optional[int], include_content: Optional[bool]) -> tuple:
+    """(depth, include_content) for a listing: a page holds just its own notes
+    without bodies, so its payload scales with `limit`; the full tree keeps them"""
+    if limit is None:
+        return depth, True if include_content is None else include_content
+    return 0 if depth is None else depth, False if include_content is None else include_content
+
+def set_next_cursor(response: Response, next_cursor: Optional[str]):
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+# Folders in a folder (or at the root level) with their item counts, body
+# bytes and last-modified times, from the maintained aggregates
+@router.get("/folders", response_model=List[schemas.FolderSummary])
+async def list_folders(
+    parent_id: Optional[int] = None,
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return await run_db(db, folder_stats.list_folders, current_user.id, parent_id)
+
+# Global Search (declared before /{note_id} so it is not captured by get_note)
+@router.get("/search", response_model=List[schemas.SearchResult])
+async def search_notes(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    offset: int = Query(0, ge=0, le=1000),
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return await run_db(db, search.search_notes, current_user.id, q, limit=limit, offset=offset)
+
+# Incremental sync: what changed after a cursor, deletes as tombstones.
+# Without `since`, returns the cursor to start from after loading the tree
+@router.get("/changes", response_model=schemas.ChangeFeed)
+async def get_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(changes.MAX_PAGE_SIZE, ge=1, le=changes.MAX_PAGE_SIZE),
+    include_content: bool = True,
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return await run_db(db, changes.changes_since, current_user.id, since, limit=limit, include_content=include_content)
+
+# The same feed pushed as server-sent events; reconnects resume from Last-Event-ID
+@router.get("/changes/stream")
+async def stream_changes(
+    since: Optional[int] = Query(None, ge=0),
+    include_content: bool = True,
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    since = await run_db(db, _stream_start, current_user.id, since)
+    # Idle streams must not pin a pooled connection
+    await release_session(db)
+    return StreamingResponse(
+        changes.stream_changes(current_user.id, since, include_content=include_content),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _stream_start(db: Session, owner_id: int, since: Optional[int]) -> int:
+    if since is None:
+        return changes.head_cursor(db, owner_id)
+    # Reject stale cursors while a 410 can still be sent
+    changes.check_cursor(db, owner_id, since)
+    return since
+
+# Export the whole workspace, or one note's subtree, as NDJSON or a zip of markdown
+@router.get("/export")
+async def export_notes(
+    format: str = Query("ndjson", pattern="^(ndjson|zip)$"),
+    root_id: Optional[int] = None,
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if root_id is not None:
+        await run_db(db, get_owned_note, root_id, current_user.id)
+    if format == "zip":
+        return StreamingResponse(
+            transfer.export_zip(current_user.id, root_id),
+            media_type="application/zip",
+            headers={"Content-Disposition": 'attachment; filename="notes.zip"'}
+        )
+    return StreamingResponse(
+        transfer.export_ndjson(current_user.id, root_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="notes.ndjson"'}
+    )
+
+# Import an NDJSON export (parents before children). Lines are validated and
+# spooled as they stream in, then written in one transaction through
+# run_bulk_write, so the write lock is not held while the body uploads.
+@router.post("/import", response_model=schemas.ImportResult)
+async def import_notes(
+    request: Request,
+    parent_id: Optional[int] = None,
+    db: Session = Depends(get_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    if parent_id is not None:
+        await run_db(db, get_parent_folder, parent_id, current_user.id)
+    importer = transfer.Importer(current_user.id, parent_id, settings.IMPORT_MAX_NOTES)
+    try:
+        lines, partial = [], b""
+        async for chunk in request.stream():
+            parts = (partial + chunk).split(b"\n")
+            partial = parts.pop()
+            lines.extend(parts)
+            if len(lines) >= transfer.IMPORT_CHUNK_SIZE:
+                await run_in_threadpool(importer.feed, lines)
+                lines = []
+        lines.append(partial)
+        await run_in_threadpool(importer.feed, lines)
+        result = await run_bulk_write(db, importer.write)
+    finally:
+        importer.close()
+    changes.broker.notify(current_user.id)
+    return result
+
+# Get specific note by ID with its children
+@router.get("/{note_id}", response_model=schemas.NoteResponse)
+async def get_note(
+    note_id: int,
+    response: Response,
+    depth: Optional[int] = Query(None, ge=0),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    etag, note = await run_db(db, _get_note, note_id, current_user.id, depth, if_none_match)
+    if note is None:
+        return etags.not_modified(etag)
+    etags.set_etag(response, etag)
+    return note
+
+def _get_note(db: Session, note_id: int, owner_id: int, depth: Optional[int], if_none_match: Optional[str]):
+    fingerprint = tree.subtree_fingerprint(db, owner_id, root_id=note_id, depth=depth)
+    if not fingerprint[0]:
+        raise HTTPException(status_code=404, detail="Note not found")
+    etag = etags.make_etag(owner_id, "note", note_id, depth, *fingerprint)
+    if etags.matches(if_none_match, etag):
+        return etag, None
+    return etag, tree.load_tree(db, owner_id, root_id=note_id, depth=depth)[0]
+
+# Get children of a specific folder (paginated like the root listing)
+@router.get("/{note_id}/children", response_model=List[schemas.NoteListItem])
+async def get_note_children(
+    note_id: int,
+    response: Response,
+    depth: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    include_content: Optional[bool] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    depth, include_content = listing_defaults(limit, depth, include_content)
+    etag, notes, next_cursor = await run_db(
+        db, _get_note_children, note_id, current_user.id, depth, limit, cursor, include_content, if_none_match
+    )
+    if notes is None:
+        return etags.not_modified(etag)
+    etags.set_etag(response, etag)
+    set_next_cursor(response, next_cursor)
+    return notes
+
+def _get_note_children(db: Session, note_id: int, owner_id: int, depth: Optional[int],
+                       limit: Optional[int], cursor: Optional[str], include_content: bool,
+                       if_none_match: Optional[str]):
     # Verify parent exists and is a folder
-    parent = db.query(models.Note).filter(
-        models.Note.id == note_id,
-        models.Note.owner_id == current_user.id
-    ).first()
-    if not parent:
-        raise HTTPException(status_code=404, detail="Parent note not found")
+    parent = get_owned_note(db, note_id, owner_id, detail="Parent note not found")
     if not parent.is_folder:
         raise HTTPException(status_code=400, detail="Note is not a folder")
-    
-    children = db.query(models.Note).filter(models.Note.parent_id == note_id).all()
-    return children
-
-# Global Search
-@router.get("/search", response_model=List[schemas.NoteResponse])
-def search_notes(q: str, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    notes = db.query(models.Note).filter(
-        models.Note.owner_id == current_user.id,
-        (models.Note.title.ilike(f"%{q}%")) | (models.Note.content.ilike(f"%{q}%"))
-    ).limit(10).all()
+
+    fingerprint = tree.subtree_fingerprint(db, owner_id, children_of=note_id, depth=depth)
+    etag = etags.make_etag(owner_id, "children", note_id, depth, limit, cursor, include_content, *fingerprint)
+    if etags.matches(if_none_match, etag):
+        return etag, None, None
+    if limit is None:
+        notes = tree.load_tree(db, owner_id, children_of=note_id, depth=depth, include_content=include_content)
+        return etag, notes, None
+    notes, next_cursor = tree.load_page(db, owner_id, note_id, limit, cursor=cursor, depth=depth,
+                                        include_content=include_content)
+    return etag, notes, next_cursor
+
+# Ancestors of a note, root first, from its materialized path
+@router.get("/{note_id}/ancestors", response_model=List[schemas.NoteListItem])
+async def get_note_ancestors(
+    note_id: int,
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    notes = await run_db(db, _load_ancestors, note_id, current_user.id, tree.LISTING_COLUMNS)
+    return notes[:-1]
+
+# Breadcrumb trail to a note: its ancestors, root first, then the note
+@router.get("/{note_id}/breadcrumb", response_model=List[schemas.Breadcrumb])
+async def get_note_breadcrumb(
+    note_id: int,
+    db: Session = Depends(replicas.get_replica_session),
+    current_user: models.User = Depends(auth.get_current_user)
+):
+    return await run_db(db, _load_ancestors, note_id, current_user.id, tree.BREADCRUMB_COLUMNS)
+
+def _load_ancestors(db: Session, note_id: int, owner_id: int, columns) -> List[dict]:
+    notes = tree.load_ancestors(db, owner_id, note_id, columns=columns)
+    if notes is None:
+        raise HTTPException(status_code=404, detail="Note not found")
     return notes
 
 # Create new note or folder
 @router.post("/", response_model=schemas.NoteResponse)
-def create_note(note: schemas.NoteCreate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+async def create_note(note: schemas.NoteCreate, db: Session = Depends(get_session), current_user: models.User = Depends(auth.get_current_user)):
+    created = await run_write(db, _create_note, note, current_user.id)
+    changes.broker.notify(current_user.id)
+    return created
+
+def _create_note(db: Session, note: schemas.NoteCreate, owner_id: int):
     # If parent_id is provided, verify it exists and is a folder
+    path = tree.ROOT_PATH
     if note.parent_id:
-        parent = db.query(models.Note).filter(
-            models.Note.id == note.parent_id,
-            models.Note.owner_id == current_user.id
-        ).first()
-        if not parent:
-            raise HTTPException(status_code=404, detail="Parent note not found")
-        if not parent.is_folder:
-            raise HTTPException(status_code=400, detail="Parent must be a folder")
+        parent = get_parent_folder(db, note.parent_id, owner_id)
+        path = tree.child_path(parent.path, parent.id)
+        if len(path) > tree.MAX_PATH_LENGTH:
+            raise nested_too_deeply()
     
-    db_note = models.Note(**note.model_dump(), owner_id=current_user.id)
+    db_note = models.Note(**note.model_dump(), owner_id=owner_id, path=path)
     db.add(db_note)
+    db.flush()
+    search.index_note(db, db_note)
+    folder_stats.note_added(db, db_note, folder_stats.text_size(note.content))
+    changes.record_changes(db, owner_id, [db_note.id], new=True)
     db.commit()
-    db.refresh(db_note)
-    return db_note
+    return tree.load_tree(db, owner_id, root_id=db_note.id)[0]
 
 # Update note or folder
 @router.put("/{note_id}", response_model=schemas.NoteResponse)
-def update_note(note_id: int, note_update: schemas.NoteUpdate, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_note = db.query(models.Note).filter(
-        models.Note.id == note_id,
-        models.Note.owner_id == current_user.id
-    ).first()
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found")
+async def update_note(note_id: int, note_update: schemas.NoteUpdate, db: Session = Depends(get_session), current_user: models.User = Depends(auth.get_current_user)):
+    updated = await run_write(db, _update_note, note_id, note_update, current_user.id)
+    changes.broker.notify(current_user.id)
+    return updated
+
+def _update_note(db: Session, note_id: int, note_update: schemas.NoteUpdate, owner_id: int):
+    db_note = get_owned_note(db, note_id, owner_id)
     
     # Update only provided fields
     update_data = note_update.model_dump(exclude_unset=True)
     
-    # If moving to a new parent, verify it exists and is a folder
-    if "parent_id" in update_data and update_data["parent_id"]:
-        parent = db.query(models.Note).filter(
-            models.Note.id == update_data["parent_id"],
-            models.Note.owner_id == current_user.id
-        ).first()
-        if not parent:
-            raise HTTPException(status_code=404, detail="Parent note not found")
-        if not parent.is_folder:
-            raise HTTPException(status_code=400, detail="Parent must be a folder")
+    # Moves rewrite the paths of the whole subtree, and may not create a cycle
+    moved = False
+    if "parent_id" in update_data:
+        parent_id = update_data.pop("parent_id")
+        if parent_id != db_note.parent_id:
+            move_note(db, db_note, parent_id, owner_id)
+            moved = True
     
+    size_delta = 0
+    old_hash = db_note.content_hash
+    if "content" in update_data:
+        size_delta = folder_stats.text_size(update_data["content"]) - folder_stats.stored_size(db, old_hash)
     for key, value in update_data.items():
         setattr(db_note, key, value)
     
+    if "title" in update_data or "content" in update_data:
+        search.index_note(db, db_note)
+    if db_note.content_hash != old_hash:
+        db.flush()
+        contents.release(db, [old_hash])
+    if update_data:
+        folder_stats.note_changed(db, db_note, size_delta)
+    if update_data or moved:
+        changes.record_changes(db, owner_id, [note_id])
     db.commit()
-    db.refresh(db_note)
-    return db_note
+    return tree.load_tree(db, owner_id, root_id=note_id)[0]
+
+# Incremental save: apply text edits against a known version
+@router.patch("/{note_id}", response_model=schemas.NoteVersion)
+async def patch_note(note_id: int, patch: schemas.NotePatch, db: Session = Depends(get_session), current_user: models.User = Depends(auth.get_current_user)):
+    result = await run_write(db, _patch_note, note_id, patch, current_user.id)
+    changes.broker.notify(current_user.id)
+    return result
+
+def _patch_note(db: Session, note_id: int, patch: schemas.NotePatch, owner_id: int):
+    db_note = get_owned_note(db, note_id, owner_id)
+    if db_note.version != patch.base_version:
+        raise HTTPException(
+            status_code=409,
+            detail={"message": "Note was modified since base_version", "version": db_note.version}
+        )
+
+    size_delta = 0
+    old_hash = db_note.content_hash
+    if patch.edits:
+        old_content = db_note.content or ""
+        db_note.content = deltas.apply_edits(old_content, patch.edits)
+        size_delta = folder_stats.text_size(db_note.content) - folder_stats.text_size(old_content)
+    if patch.title is not None:
+        db_note.title = patch.title
+    if patch.edits or patch.title is not None:
+        # The version check in the UPDATE catches a write racing this one
+        search.index_note(db, db_note)
+        folder_stats.note_changed(db, db_note, size_delta)
+        changes.record_changes(db, owner_id, [note_id])
+        if db_note.content_hash != old_hash:
+            db.flush()
+            contents.release(db, [old_hash])
+        db.commit()
+    return {"id": db_note.id, "version": db_note.version, "updated_at": db_note.updated_at}
 
 # Delete note or folder
 @router.delete("/{note_id}")
-def delete_note(note_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
-    db_note = db.query(models.Note).filter(
-        models.Note.id == note_id,
-        models.Note.owner_id == current_user.id
-    ).first()
-    if not db_note:
-        raise HTTPException(status_code=404, detail="Note not found")
-    
-    # If it's a folder, delete all children recursively (this respects current_user implicitally as children have same owner)
-    if db_note.is_folder:
-        delete_children_recursive(db, note_id)
-    
-    db.delete(db_note)
-    db.commit()
+async def delete_note(note_id: int, db: Session = Depends(get_session), current_user: models.User = Depends(auth.get_current_user)):
+    await run_write(db, _delete_note, note_id, current_user.id)
+    changes.broker.notify(current_user.id)
     return {"message": "Note deleted successfully"}
 
-def delete_children_recursive(db: Session, parent_id: int):
-    """Recursively delete all children of a folder"""
-    children = db.query(models.Note).filter(models.Note.parent_id == parent_id).all()
-    for child in children:
-        if child.is_folder:
-            delete_children_recursive(db, child.id)
-        db.delete(child)
+def _delete_note(db: Session, note_id: int, owner_id: int):
+    # Collects the whole subtree with one path-prefix query and removes it
+    # (and the bodies only it used) with chunked bulk deletes, all inside a
+    # single transaction
+    db_note = get_owned_note(db, note_id, owner_id)
+    folder_stats.note_removed(db, db_note)
+    deleted_ids = tree.delete_subtree(db, owner_id, note_id)
+    
+    search.unindex_notes(db, deleted_ids)
+    changes.record_changes(db, owner_id, deleted_ids, deleted=True)
+    db.commit()
 
 # Code Execution Proxy (Piston API)
-import requests
+@router.post("/execute", dependencies=[Depends(ratelimit.limit_user("execute"))])
+async def execute_code(request: schemas.ExecuteRequest, response: Response, current_user: models.User = Depends(auth.get_current_user)):
+    result, cache_status = await piston.execute_cached(request, current_user.id)
+    response.headers["X-Cache"] = cache_status
+    return result
 
-@router.post("/execute")
-def execute_code(request: schemas.ExecuteRequest, current_user: models.User = Depends(auth.get_current_user)):
-    piston_url = "https://emkc.org/api/v2/piston/execute"
-    payload = request.dict()
-    
-    try:
-        response = requests.post(piston_url, json=payload, timeout=15)
-        response.raise_for_status()
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        print(f"Piston API Error: {e}")
-        error_detail = "Execution Failed"
-        if hasattr(e, 'response') and e.response is not None:
-             error_detail = f"Piston Error: {e.response.text}"
-        
-        raise HTTPException(status_code=502, detail=error_detail)
+# Run several snippets at once; results stream back as NDJSON in completion order
+@router.post("/execute/batch")
+async def execute_batch(batch: schemas.ExecuteBatchRequest, current_user: models.User = Depends(auth.get_current_user)):
+    # Reject before the stream starts, while a 429 can still be sent
+    await ratelimit.check("execute", f"user:{current_user.id}", cost=len(batch.requests))
+    piston.limiter.check_user(current_user.id)
+    return StreamingResponse(
+        piston.execute_batch(batch.requests, current_user.id),
+        media_type="application/x-ndjson"
+    )
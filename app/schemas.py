@@ -1,6 +1,7 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field, model_validator
 from typing import Optional, List
 from datetime import datetime
+from app.config import settings
 
 class Token(BaseModel):
     access_token: str
@@ -42,6 +43,7 @@ class NoteUpdate(BaseModel):
 
 class NoteResponse(NoteBase):
     id: int
+    version: int = 1
     created_at: datetime
     updated_at: Optional[datetime] = None
     children: List['NoteResponse'] = []
@@ -53,6 +55,104 @@ class NoteResponse(NoteBase):
 # Update forward references for recursive model
 NoteResponse.model_rebuild()
 
+# Lightweight listing shape: `content` is only filled when the client asks for it
+class NoteListItem(BaseModel):
+    id: int
+    title: str
+    content: Optional[str] = None
+    is_folder: bool = False
+    parent_id: Optional[int] = None
+    cover_image: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 1
+    children: List['NoteListItem'] = []
+
+NoteListItem.model_rebuild()
+
+# Replace the UTF-16 range [start, end) of the base text with `text`
+class TextEdit(BaseModel):
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+    text: str = ""
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.end < self.start:
+            raise ValueError("end must not be before start")
+        return self
+
+# Incremental save: edits apply to the content as of `base_version`
+class NotePatch(BaseModel):
+    base_version: int
+    edits: List[TextEdit] = []
+    title: Optional[str] = None
+
+# A folder with the aggregates of its subtree
+class FolderSummary(BaseModel):
+    id: int
+    title: str
+    parent_id: Optional[int] = None
+    cover_image: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+    version: int = 1
+    child_count: int = 0
+    descendant_count: int = 0
+    content_bytes: int = 0
+    last_modified_at: Optional[datetime] = None
+
+# One step of a breadcrumb trail, root first
+class Breadcrumb(BaseModel):
+    id: int
+    title: str
+    is_folder: bool = False
+
+class NoteVersion(BaseModel):
+    id: int
+    version: int
+    updated_at: Optional[datetime] = None
+
+# One line of an NDJSON import; ids only link rows within the file
+class NoteImportItem(BaseModel):
+    id: int
+    parent_id: Optional[int] = None
+    title: str = Field(..., max_length=255)
+    content: Optional[str] = ""
+    is_folder: bool = False
+    cover_image: Optional[str] = Field(None, max_length=500)
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ImportResult(BaseModel):
+    imported: int
+    root_ids: List[int]
+
+# Change feed entry: `note` is the current state (without children), or
+# None for a tombstone
+class NoteChange(BaseModel):
+    cursor: int
+    note_id: int
+    deleted: bool = False
+    note: Optional[NoteListItem] = None
+
+class ChangeFeed(BaseModel):
+    cursor: int
+    has_more: bool = False
+    changes: List[NoteChange] = []
+
+class SearchResult(BaseModel):
+    id: int
+    title: str
+    is_folder: bool = False
+    parent_id: Optional[int] = None
+    cover_image: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    title_highlight: str
+    snippet: str
+    rank: float
+
 class ExecuteRequest(BaseModel):
     language: str
     version: str = "*"
@@ -63,3 +163,6 @@ class ExecuteRequest(BaseModel):
     run_timeout: int = 3000
     compile_memory_limit: int = -1
     run_memory_limit: int = -1
+
+class ExecuteBatchRequest(BaseModel):
+    requests: List[ExecuteRequest] = Field(..., min_length=1, max_length=settings.EXECUTE_BATCH_MAX_ITEMS)
@@ -0,0 +1,296 @@
+import itertools
+import re
+import unicodedata
+from typing import Callable, Dict, Iterable, List
+from sqlalchemy import bindparam, func, text
+from sqlalchemy.orm import Session
+from app import contents, models
+
+# Full-text search index for notes.
+# SQLite uses an FTS5 virtual table (BM25 ranking, snippet highlighting),
+# Postgres uses a tsvector side table with a GIN index and MySQL an InnoDB
+# FULLTEXT index over a plain copy of the text (migration 0011). Other
+# backends fall back to a bounded scan so the endpoint keeps working
+# everywhere.
+#
+# On SQLite 3.43+ the FTS5 table is contentless (migration 0009): it holds
+# only the index, not a second, uncompressed copy of every title and body,
+# so highlights are built here from the stored bodies, as on Postgres. Older
+# SQLite cannot delete from a contentless table and keeps the copy.
+#
+# Each FTS5 row also indexes its owner as the token u<owner_id> (migration
+# 0010), and every query ANDs it with the user's terms, so FTS5 only ranks
+# the searching user's matches instead of filtering every user's afterwards;
+# the owner check on the joined notes row is just a guard.
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_END = "</mark>"
+MAX_QUERY_TERMS = 8
+UNINDEX_CHUNK_SIZE = 500
+SNIPPET_WORDS = 16
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+def dialect_name(bind) -> str:
+    return bind.dialect.name
+
+def index_note(db: Session, note: models.Note):
+    """Insert or refresh the search entry of a single note (caller commits)"""
+    index_notes(db, [(note.id, note.owner_id, note.title, note.content)])
+
+def index_notes(db: Session, rows: Iterable[tuple]):
+    """Bulk version of index_note taking (id, owner_id, title, content) tuples"""
+    params = [
+        {
+            "id": note_id, "owner_id": owner_id, "owner": _owner_token(owner_id),
+            "title": title or "", "content": content or "",
+        }
+        for note_id, owner_id, title, content in rows
+    ]
+    if not params:
+        return
+    name = dialect_name(db.get_bind())
+    if name == "sqlite":
+        db.execute(text("DELETE FROM notes_fts WHERE rowid = :id"), params)
+        db.execute(text(
+            "INSERT INTO notes_fts (rowid, title, content, owner) "
+            "VALUES (:id, :title, :content, :owner)"
+        ), params)
+    elif name == "postgresql":
+        db.execute(text(
+            "INSERT INTO note_search (note_id, owner_id, document) VALUES (:id, :owner_id, "
+            "setweight(to_tsvector('english', :title), 'A') || "
+            "setweight(to_tsvector('english', :content), 'B')) "
+            "ON CONFLICT (note_id) DO UPDATE SET owner_id = EXCLUDED.owner_id, document = EXCLUDED.document"
+        ), params)
+    elif name == "mysql":
+        db.execute(text(
+            "INSERT INTO note_search (note_id, owner_id, title, body) VALUES (:id, :owner_id, :title, :content) "
+            "ON DUPLICATE KEY UPDATE owner_id = VALUES(owner_id), title = VALUES(title), body = VALUES(body)"
+        ), params)
+
+def unindex_notes(db: Session, note_ids: List[int]):
+    """Remove notes from the search index (caller commits)"""
+    name = dialect_name(db.get_bind())
+    if name == "sqlite":
+        statement = text("DELETE FROM notes_fts WHERE rowid IN :ids")
+    elif name in ("postgresql", "mysql"):
+        statement = text("DELETE FROM note_search WHERE note_id IN :ids")
+    else:
+        return
+    statement = statement.bindparams(bindparam("ids", expanding=True))
+    for start in range(0, len(note_ids), UNINDEX_CHUNK_SIZE):
+        db.execute(statement, {"ids": note_ids[start:start + UNINDEX_CHUNK_SIZE]})
+
+def _owner_token(owner_id: int) -> str:
+    return f"u{owner_id}"
+
+def _fts5_query(owner_id: int, q: str) -> str:
+    # Quote every term so user input can never be parsed as FTS5 syntax,
+    # and prefix-match the last one for search-as-you-type. The terms only
+    # match title and body; the owner token narrows them to one user.
+    terms = _TERM_RE.findall(q)[:MAX_QUERY_TERMS]
+    if not terms:
+        return ""
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return f'owner : "{_owner_token(owner_id)}" AND {{title content}} : ({" ".join(quoted)})'
+
+def _boolean_query(q: str) -> str:
+    # MySQL boolean mode: every term required, the last one as a prefix;
+    # \w+ terms carry none of the operator characters
+    terms = _TERM_RE.findall(q)[:MAX_QUERY_TERMS]
+    if not terms:
+        return ""
+    return " ".join(f"+{term}" for term in terms) + "*"
+
+# Whether notes_fts keeps a copy of the text, per database URL
+_fts_stores_text: Dict[str, bool] = {}
+
+def fts_stores_text(db: Session) -> bool:
+    bind = db.get_bind()
+    key = str(bind.url)
+    if key not in _fts_stores_text:
+        sql = db.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).scalar()
+        _fts_stores_text[key] = "content=''" not in (sql or "").replace(" ", "")
+    return _fts_stores_text[key]
+
+def _fold(word: str) -> str:
+    # Case and diacritics folded like the unicode61 tokenizer does
+    return "".join(ch for ch in unicodedata.normalize("NFKD", word.casefold()) if not unicodedata.combining(ch))
+
+def _term_matcher(q: str) -> Callable[[str], bool]:
+    """Whether a word matches the query as _fts5_query() runs it (the last term as a prefix)"""
+    terms = [_fold(term) for term in _TERM_RE.findall(q)[:MAX_QUERY_TERMS]]
+    exact, prefix = set(terms[:-1]), terms[-1]
+    return lambda word: _fold(word) in exact or _fold(word).startswith(prefix)
+
+def _highlight(value: str, is_hit: Callable[[str], bool]) -> str:
+    return _TERM_RE.sub(
+        lambda m: f"{HIGHLIGHT_START}{m.group()}{HIGHLIGHT_END}" if is_hit(m.group()) else m.group(), value
+    )
+
+def _snippet(value: str, is_hit: Callable[[str], bool]) -> str:
+    """SNIPPET_WORDS words around the first hit, highlighted, like FTS5's snippet()"""
+    words = list(_TERM_RE.finditer(value))
+    if not words:
+        return ""
+    first = next((i for i, word in enumerate(words) if is_hit(word.group())), 0)
+    start = max(0, min(first - SNIPPET_WORDS // 4, len(words) - SNIPPET_WORDS))
+    end = min(len(words), start + SNIPPET_WORDS)
+    piece = _highlight(value[words[start].start():words[end - 1].end()], is_hit)
+    return ("…" if start > 0 else "") + piece + ("…" if end < len(words) else "")
+
+def search_notes(db: Session, owner_id: int, q: str, limit: int = 10, offset: int = 0) -> List[dict]:
+    """Return ranked, highlighted search hits for a user's notes"""
+    name = dialect_name(db.get_bind())
+    if name == "sqlite" and not fts_stores_text(db):
+        match = _fts5_query(owner_id, q)
+        if not match:
+            return []
+        rows = db.execute(text(
+            "SELECT n.id, n.title, n.is_folder, n.parent_id, n.cover_image, n.created_at, n.updated_at, "
+            "c.encoding AS content_encoding, c.data AS content_data, "
+            "notes_fts.rank AS rank "
+            "FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid "
+            "LEFT JOIN note_contents c ON c.hash = n.content_hash "
+            "WHERE notes_fts MATCH :match AND notes_fts.rank MATCH 'bm25(10.0, 1.0, 0.0)' "
+            "AND n.owner_id = :owner_id "
+            "ORDER BY notes_fts.rank LIMIT :limit OFFSET :offset"
+        ), {"match": match, "owner_id": owner_id, "limit": limit, "offset": offset}).mappings().all()
+        is_hit = _term_matcher(q)
+        hits = []
+        for row in contents.decode_rows(rows):
+            body = row.pop("content")
+            hits.append(dict(
+                row, title_highlight=_highlight(row["title"], is_hit), snippet=_snippet(body, is_hit), rank=-row["rank"]
+            ))
+        return hits
+    if name == "sqlite":
+        match = _fts5_query(owner_id, q)
+        if not match:
+            return []
+        rows = db.execute(text(
+            "SELECT n.id, n.title, n.is_folder, n.parent_id, n.cover_image, n.created_at, n.updated_at, "
+            "highlight(notes_fts, 0, :hs, :he) AS title_highlight, "
+            "snippet(notes_fts, 1, :hs, :he, '…', 16) AS snippet, "
+            "notes_fts.rank AS rank "
+            "FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid "
+            "WHERE notes_fts MATCH :match AND notes_fts.rank MATCH 'bm25(10.0, 1.0, 0.0)' "
+            "AND n.owner_id = :owner_id "
+            # Ordering by the hidden rank column lets FTS5 sort internally and
+            # only build highlights for the rows of the requested page
+            "ORDER BY notes_fts.rank LIMIT :limit OFFSET :offset"
+        ), {
+            "match": match, "owner_id": owner_id, "limit": limit, "offset": offset,
+            "hs": HIGHLIGHT_START, "he": HIGHLIGHT_END,
+        }).mappings().all()
+        # bm25() is lower-is-better; expose a higher-is-better score
+        return [dict(row, rank=-row["rank"]) for row in rows]
+    if name == "postgresql":
+        if not _TERM_RE.search(q):
+            return []
+        # Rank and page first, then only fetch bodies for the rows returned
+        rows = db.execute(text(
+            "WITH query AS (SELECT websearch_to_tsquery('english', :q) AS tsq), "
+            "hits AS ("
+            "  SELECT s.note_id, ts_rank_cd(s.document, query.tsq) AS rank "
+            "  FROM note_search s, query "
+            "  WHERE s.owner_id = :owner_id AND s.document @@ query.tsq "
+            "  ORDER BY rank DESC, s.note_id LIMIT :limit OFFSET :offset"
+            ") "
+            "SELECT n.id, n.title, n.is_folder, n.parent_id, n.cover_image, n.created_at, n.updated_at, "
+            "ts_headline('english', n.title, query.tsq, :title_opts) AS title_highlight, "
+            "c.encoding AS content_encoding, c.data AS content_data, "
+            "hits.rank "
+            "FROM hits JOIN notes n ON n.id = hits.note_id "
+            "LEFT JOIN note_contents c ON c.hash = n.content_hash, query "
+            "ORDER BY hits.rank DESC, n.id"
+        ), {
+            "q": q, "owner_id": owner_id, "limit": limit, "offset": offset,
+            "title_opts": f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, HighlightAll=true",
+        }).mappings().all()
+        hits = [contents.decode_row(row) for row in rows]
+        if not hits:
+            return []
+        # Bodies are stored compressed, so the snippets are built from the
+        # decoded text in one round trip
+        snippets = db.execute(text(
+            "SELECT ts_headline('english', body, websearch_to_tsquery('english', :q), :snippet_opts) "
+            "FROM unnest(CAST(:bodies AS text[])) WITH ORDINALITY AS b(body, position) "
+            "ORDER BY position"
+        ), {
+            "q": q, "bodies": [hit.pop("content") for hit in hits],
+            "snippet_opts": f"StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=32, MinWords=12",
+        }).scalars().all()
+        return [dict(hit, snippet=snippet) for hit, snippet in zip(hits, snippets)]
+
+    if name == "mysql":
+        match = _boolean_query(q)
+        if not match:
+            return []
+        rows = db.execute(text(
+            "SELECT n.id, n.title, n.is_folder, n.parent_id, n.cover_image, n.created_at, n.updated_at, "
+            "s.body, MATCH (s.title, s.body) AGAINST (:match IN BOOLEAN MODE) AS rank "
+            "FROM note_search s JOIN notes n ON n.id = s.note_id "
+            "WHERE s.owner_id = :owner_id AND MATCH (s.title, s.body) AGAINST (:match IN BOOLEAN MODE) "
+            "ORDER BY rank DESC, n.id LIMIT :limit OFFSET :offset"
+        ), {"match": match, "owner_id": owner_id, "limit": limit, "offset": offset}).mappings().all()
+        is_hit = _term_matcher(q)
+        hits = []
+        for row in rows:
+            row = dict(row)
+            body = row.pop("body")
+            hits.append(dict(
+                row, title_highlight=_highlight(row["title"], is_hit), snippet=_snippet(body, is_hit),
+                rank=float(row["rank"])
+            ))
+        return hits
+
+    return scan_notes(db, owner_id, q, limit=limit, offset=offset)
+
+SCAN_BATCH_SIZE = 500
+# Notes (newest first) the fallback scan decodes at most per search
+SCAN_MAX_ROWS = 5000
+
+def scan_notes(db: Session, owner_id: int, q: str, limit: int = 10, offset: int = 0) -> List[dict]:
+    """Fallback for backends without a native full-text index.
+
+    Bodies are compressed, so they can only be matched in Python. Notes whose
+    title matches are found in SQL and come first; the body scan then decodes
+    at most the owner's SCAN_MAX_ROWS newest other notes.
+    """
+    needle = q.lower()
+    note = models.Note
+    title_match = func.lower(note.title).contains(needle, autoescape=True)
+
+    def scan(condition, max_rows: int):
+        statement = contents.select_with_content(
+            note.id, note.title, note.is_folder, note.parent_id, note.cover_image, note.created_at, note.updated_at,
+            content_hash=note.content_hash
+        ).where(note.owner_id == owner_id, condition).order_by(note.id.desc()).limit(max_rows)
+        for row in db.execute(statement, execution_options={"yield_per": SCAN_BATCH_SIZE}).mappings():
+            yield contents.decode_row(row)
+
+    hits = []
+    for row in itertools.chain(scan(title_match, offset + limit), scan(~title_match, SCAN_MAX_ROWS)):
+        content = row.pop("content")
+        if needle not in row["title"].lower() and needle not in content.lower():
+            continue
+        if offset:
+            offset -= 1
+            continue
+        hits.append(dict(row, title_highlight=row["title"], snippet=content[:200], rank=0.0))
+        if len(hits) >= limit:
+            break
+    return hits
+
+def reindex_user_notes(db: Session, owner_id: int):
+    """Rebuild the search entries of every note owned by a user (caller commits)"""
+    note = models.Note
+    rows = db.execute(contents.select_with_content(
+        note.id, note.owner_id, note.title, content_hash=note.content_hash
+    ).where(note.owner_id == owner_id)).mappings()
+    index_notes(db, [
+        (row["id"], row["owner_id"], row["title"], row["content"]) for row in contents.decode_rows(rows)
+    ])
@@ -7,7 +7,7 @@ from datetime import datetime
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app.database import SessionLocal, engine
-from app import models, auth
+from app import models, auth, search, folder_stats
 
 def seed():
     db = SessionLocal()
@@ -112,6 +112,9 @@ def seed():
                     )
                     db.add(db_note)
         
+        db.flush()
+        search.reindex_user_notes(db, user.id)
+        folder_stats.rebuild(db, user.id)
         db.commit()
         print("Done seeding professional data!")
 
@@ -0,0 +1,260 @@
+import json
+import re
+import tempfile
+import zipfile
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from app import changes, contents, folder_stats, models, schemas, search, tree
+from app.database import SessionLocal
+
+# Streaming export/import of note trees. Exports walk the subtree CTE parents
+# first and are written out chunk by chunk; imports remap the file's ids onto
+# new rows with bulk inserts, all committed in one transaction.
+
+EXPORT_BATCH_SIZE = 500
+IMPORT_CHUNK_SIZE = 1000
+# Validated import lines are kept in memory up to this size, then on disk
+IMPORT_SPOOL_MEMORY = 16 * 1024 * 1024
+
+EXPORT_COLUMNS = tree.TREE_COLUMNS
+
+def _export_rows(owner_id: int, root_id: Optional[int]) -> Iterator[dict]:
+    # Own session: the response body is produced after the request's session is gone
+    db = SessionLocal()
+    try:
+        subtree = tree.subtree_cte(owner_id, root_id=root_id, columns=EXPORT_COLUMNS)
+        result = db.execute(
+            contents.select_with_content(subtree, content_hash=subtree.c.content_hash)
+            .order_by(subtree.c.level, subtree.c.id),
+            execution_options={"yield_per": EXPORT_BATCH_SIZE}
+        ).mappings()
+        for row in result:
+            row = contents.decode_row(row)
+            # The export's anchors become roots wherever the file is imported
+            if row.pop("level") == 0:
+                row["parent_id"] = None
+            yield row
+    finally:
+        db.close()
+
+def _isoformat(value) -> Optional[str]:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def export_ndjson(owner_id: int, root_id: Optional[int] = None) -> Iterator[bytes]:
+    """Yield the subtree as NDJSON lines, parents before children"""
+    lines = []
+    for row in _export_rows(owner_id, root_id):
+        row["created_at"] = _isoformat(row["created_at"])
+        row["updated_at"] = _isoformat(row["updated_at"])
+        lines.append(json.dumps(row, ensure_ascii=False))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ("\n".join(lines) + "\n").encode()
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode()
+
+class _ZipStream:
+    """Write-only sink for ZipFile; the unseekable stream makes it emit data descriptors"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+_UNSAFE_NAME_RE = re.compile(r'[\x00-\x1f<>:"/\\|?*]+')
+
+def _file_name(title: str, note_id: int, taken: set) -> str:
+    name = _UNSAFE_NAME_RE.sub("_", title or "").strip(" .") or "untitled"
+    name = name[:100]
+    if name.lower() in taken:
+        name = f"{name} ({note_id})"
+    taken.add(name.lower())
+    return name
+
+def _zip_time(value) -> tuple:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime) or value.year < 1980:
+        value = datetime.now(timezone.utc)
+    return value.timetuple()[:6]
+
+def _as_utc(value: datetime) -> datetime:
+    # Naive timestamps are taken as UTC, like the database stores them
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+def export_zip(owner_id: int, root_id: Optional[int] = None) -> Iterator[bytes]:
+    """Yield a zip of markdown files mirroring the folder structure"""
+    sink = _ZipStream()
+    # Only folder paths are kept in memory, never note bodies
+    folder_paths: Dict[Optional[int], str] = {None: ""}
+    names_in_folder: Dict[Optional[int], set] = {}
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for row in _export_rows(owner_id, root_id):
+            parent_path = folder_paths.get(row["parent_id"], "")
+            taken = names_in_folder.setdefault(row["parent_id"], set())
+            name = _file_name(row["title"], row["id"], taken)
+            if row["is_folder"]:
+                path = f"{parent_path}{name}/"
+                folder_paths[row["id"]] = path
+                archive.writestr(zipfile.ZipInfo(path, _zip_time(row["updated_at"])), b"")
+                if row["content"]:
+                    info = zipfile.ZipInfo(f"{path}README.md", _zip_time(row["updated_at"]))
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                    archive.writestr(info, row["content"])
+            else:
+                info = zipfile.ZipInfo(f"{parent_path}{name}.md", _zip_time(row["updated_at"]))
+                info.compress_type = zipfile.ZIP_DEFLATED
+                archive.writestr(info, row["content"] or "")
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+class Importer:
+    """Bulk NDJSON importer: feed() lines in order, then write() them all.
+
+    feed() only parses and validates, spooling the accepted lines to a
+    temporary file (kept in memory up to IMPORT_SPOOL_MEMORY bytes), so
+    nothing is written while the body is uploaded. write() then inserts the
+    whole file in one transaction (run_bulk_write): rows go in in chunks with
+    INSERT .. RETURNING, a chunk is cut early only when a row refers to a
+    parent still waiting in it, and the file's ids are remapped onto the new
+    rows. close() drops the spool.
+    """
+
+    def __init__(self, owner_id: int, parent_id: Optional[int], max_notes: int):
+        self.owner_id = owner_id
+        self.parent_id = parent_id
+        self.max_notes = max_notes
+        # Ids seen in the file, with whether each is a folder
+        self.seen_ids: Dict[int, bool] = {}
+        self.spool = tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_MEMORY)
+        self.line_number = 0
+        self.count = 0
+
+    def feed(self, lines: List[bytes]):
+        for raw in lines:
+            self.line_number += 1
+            raw = raw.strip()
+            if not raw:
+                continue
+            try:
+                item = schemas.NoteImportItem.model_validate_json(raw)
+            except ValidationError as e:
+                raise HTTPException(status_code=422, detail=f"Line {self.line_number}: {e.errors()[0]['msg']}")
+            if item.id in self.seen_ids:
+                raise HTTPException(status_code=422, detail=f"Line {self.line_number}: duplicate id {item.id}")
+            if item.parent_id is not None and item.parent_id not in self.seen_ids:
+                raise HTTPException(status_code=422, detail=f"Line {self.line_number}: parent {item.parent_id} must come before its children")
+            if item.parent_id is not None and not self.seen_ids[item.parent_id]:
+                raise HTTPException(status_code=422, detail=f"Line {self.line_number}: parent {item.parent_id} is not a folder")
+            self.count += 1
+            if self.count > self.max_notes:
+                raise HTTPException(status_code=413, detail=f"Imports are limited to {self.max_notes} notes")
+            self.seen_ids[item.id] = item.is_folder
+            self.spool.write(raw + b"\n")
+
+    def write(self, db: Session) -> dict:
+        """Insert every line fed so far and commit (through run_bulk_write)"""
+        parent_path = None
+        if self.parent_id is not None:
+            # The parent may have gone since the request checked it
+            parent = db.execute(
+                select(models.Note.path).where(models.Note.id == self.parent_id, models.Note.owner_id == self.owner_id)
+            ).first()
+            if parent is None:
+                raise HTTPException(status_code=404, detail="Parent note not found")
+            parent_path = parent.path
+        root_path = tree.child_path(parent_path, self.parent_id)
+        id_map: Dict[int, int] = {}
+        # Materialized paths of the inserted notes, for their children
+        paths: Dict[int, str] = {}
+        root_ids: List[int] = []
+        batch: List[schemas.NoteImportItem] = []
+        batch_ids: set = set()
+        self.spool.seek(0)
+        for raw in self.spool:
+            item = schemas.NoteImportItem.model_validate_json(raw)
+            if item.parent_id in batch_ids:
+                self._insert(db, batch, root_path, id_map, paths, root_ids)
+                batch, batch_ids = [], set()
+            batch.append(item)
+            batch_ids.add(item.id)
+            if len(batch) >= IMPORT_CHUNK_SIZE:
+                self._insert(db, batch, root_path, id_map, paths, root_ids)
+                batch, batch_ids = [], set()
+        if batch:
+            self._insert(db, batch, root_path, id_map, paths, root_ids)
+        db.commit()
+        return {"imported": self.count, "root_ids": root_ids}
+
+    def close(self):
+        self.spool.close()
+
+    def _insert(self, db: Session, batch: List[schemas.NoteImportItem], root_path: str, id_map: Dict[int, int],
+                paths: Dict[int, str], root_ids: List[int]):
+        now = datetime.now(timezone.utc)
+        rows = []
+        for item in batch:
+            parent_id = self.parent_id if item.parent_id is None else id_map[item.parent_id]
+            path = root_path if item.parent_id is None else tree.child_path(paths[parent_id], parent_id)
+            if len(path) > tree.MAX_PATH_LENGTH:
+                raise HTTPException(status_code=422, detail="Notes are nested too deeply")
+            rows.append({
+                "title": item.title,
+                "content": item.content or "",
+                "is_folder": item.is_folder,
+                "cover_image": item.cover_image,
+                "parent_id": parent_id,
+                "path": path,
+                "owner_id": self.owner_id,
+                "created_at": item.created_at or now,
+                "updated_at": item.updated_at or item.created_at or now,
+            })
+        texts = [row["content"] for row in rows]
+        new_ids = _insert_notes(db, contents.prepare_rows(db, rows))
+
+        stats: Dict[int, list] = {}
+        for item, new_id, row, text in zip(batch, new_ids, rows, texts):
+            id_map[item.id] = new_id
+            paths[new_id] = row["path"]
+            if item.parent_id is None:
+                root_ids.append(new_id)
+            folder_stats.add_to_ancestors(stats, row["path"], row["parent_id"], 1, folder_stats.text_size(text))
+        # Imported timestamps may be later than the import itself
+        latest = max(_as_utc(row["updated_at"]) for row in rows)
+        modified_at = latest if latest > now else None
+        folder_stats.create(db, self.owner_id, [new_id for item, new_id in zip(batch, new_ids) if item.is_folder],
+                            modified_at=modified_at)
+        folder_stats.apply(db, stats, modified_at=modified_at)
+        search.index_notes(db, (
+            (new_id, self.owner_id, row["title"], text) for new_id, row, text in zip(new_ids, rows, texts)
+        ))
+        changes.record_changes(db, self.owner_id, new_ids, new=True)
+
+def _insert_notes(db: Session, rows: List[dict]) -> List[int]:
+    if db.get_bind().dialect.insert_executemany_returning_sort_by_parameter_order:
+        return db.execute(
+            insert(models.Note).returning(models.Note.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    # Backends without batched RETURNING (MySQL): let the unit of work fetch ids
+    notes = [models.Note(**row) for row in rows]
+    db.add_all(notes)
+    db.flush()
+    return [note.id for note in notes]
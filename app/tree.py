@@ -0,0 +1,248 @@
+from typing import List, Optional, Sequence
+from sqlalchemy import String, and_, delete, func, literal, select, update
+from sqlalchemy.orm import Session
+from app import contents, models, pagination
+
+# Columns exposed by schemas.NoteResponse; the body is joined in by hash
+TREE_COLUMNS = (
+    models.Note.id,
+    models.Note.title,
+    models.Note.content_hash,
+    models.Note.is_folder,
+    models.Note.parent_id,
+    models.Note.cover_image,
+    models.Note.created_at,
+    models.Note.updated_at,
+    models.Note.version,
+)
+# Same without the markdown bodies, for listings (schemas.NoteListItem)
+LISTING_COLUMNS = tuple(column for column in TREE_COLUMNS if column.key != "content_hash")
+# schemas.Breadcrumb
+BREADCRUMB_COLUMNS = (models.Note.id, models.Note.title, models.Note.is_folder)
+
+# Materialized paths. A note's path lists its ancestors' ids, root first
+# ("/4/17/"), so its descendants are exactly the notes whose path starts
+# with its own path plus its id: ancestors, cycle checks and subtree reads
+# are one indexed lookup, and a move rewrites the moved subtree's paths in
+# a single UPDATE.
+
+ROOT_PATH = "/"
+MAX_PATH_LENGTH = 512  # models.Note.path
+
+def child_path(parent_path: Optional[str], parent_id: Optional[int]) -> str:
+    """Path of a note placed in `parent_id`, whose own path is `parent_path`"""
+    if parent_id is None:
+        return ROOT_PATH
+    return f"{parent_path}{parent_id}/"
+
+def descendant_prefix(path: str, note_id: int) -> str:
+    """The path prefix every descendant of note `note_id` shares"""
+    return f"{path}{note_id}/"
+
+def ancestor_ids(path: str) -> List[int]:
+    return [int(part) for part in path.strip("/").split("/") if part]
+
+def path_startswith(dialect_name: str, prefix: str):
+    """Filter on notes whose path starts with `prefix`, written so the path index is used"""
+    column = models.Note.path
+    if dialect_name == "sqlite":
+        # SQLite only optimizes a case-sensitive LIKE; a range over the binary
+        # collation is equivalent ("0" is the character after "/")
+        return and_(column >= prefix, column < prefix[:-1] + "0")
+    # Postgres indexes path with text_pattern_ops for this
+    return column.like(prefix + "%")
+
+def load_ancestors(db: Session, owner_id: int, note_id: int, columns=LISTING_COLUMNS) -> Optional[List[dict]]:
+    """The ancestors of a note, root first, then the note itself; None if it does not exist.
+
+    Two indexed queries however deep the note is.
+    """
+    note = models.Note
+    path = db.execute(select(note.path).where(note.owner_id == owner_id, note.id == note_id)).scalar()
+    if path is None:
+        return None
+    ids = ancestor_ids(path) + [note_id]
+    # By primary key only: the ids come from the owner's own note, and with
+    # owner_id in the WHERE clause SQLite tends to scan the owner's index
+    rows = {row["id"]: dict(row) for row in db.execute(select(*columns).where(note.id.in_(ids))).mappings()}
+    return [rows[i] for i in ids if i in rows]
+
+def move_subtree(db: Session, db_note: models.Note, parent: Optional[models.Note]):
+    """Put `db_note` into `parent` (None for the root level) and rewrite the
+    paths below it with one UPDATE (caller commits and checks for cycles)"""
+    new_path = child_path(parent.path if parent is not None else None, parent.id if parent is not None else None)
+    old_prefix = descendant_prefix(db_note.path, db_note.id)
+    new_prefix = descendant_prefix(new_path, db_note.id)
+    if new_prefix != old_prefix:
+        note = models.Note
+        db.execute(
+            update(note)
+            .where(note.owner_id == db_note.owner_id, path_startswith(db.get_bind().dialect.name, old_prefix))
+            .values(
+                path=literal(new_prefix, String).concat(func.substr(note.path, len(old_prefix) + 1, type_=String)),
+                # Descendants are not edited: keep updated_at (and the keyset
+                # order built on it) instead of letting onupdate bump it
+                updated_at=note.updated_at,
+            ),
+            execution_options={"synchronize_session": False}
+        )
+    db_note.parent_id = parent.id if parent is not None else None
+    db_note.path = new_path
+
+def deepest_path_length(db: Session, owner_id: int, path: str, note_id: int) -> int:
+    """Length of the longest path in a note's subtree, the note included"""
+    longest = db.execute(
+        select(func.max(func.length(models.Note.path))).where(
+            models.Note.owner_id == owner_id, path_startswith(db.get_bind().dialect.name, descendant_prefix(path, note_id))
+        )
+    ).scalar()
+    return max(longest or 0, len(path))
+
+def subtree_cte(owner_id: int, root_id: Optional[int] = None, children_of: Optional[int] = None,
+                depth: Optional[int] = None, columns=TREE_COLUMNS, root_ids: Optional[Sequence[int]] = None):
+    """Build a recursive CTE over an owner's notes.
+
+    The anchor is the note `root_id` (or the notes `root_ids`), the children
+    of `children_of`, or all root notes when none is given. Each row carries
+    its `level` below the anchor; `depth` limits how many levels below the
+    anchor are walked.
+    """
+    note = models.Note
+    anchor = select(*columns, literal(0).label("level")).where(note.owner_id == owner_id)
+    if root_id is not None:
+        anchor = anchor.where(note.id == root_id)
+    elif root_ids is not None:
+        anchor = anchor.where(note.id.in_(root_ids))
+    elif children_of is not None:
+        anchor = anchor.where(note.parent_id == children_of)
+    else:
+        anchor = anchor.where(note.parent_id == None)
+    tree = anchor.cte("note_tree", recursive=True)
+
+    step = select(*columns, (tree.c.level + 1).label("level")).join(
+        tree, note.parent_id == tree.c.id
+    ).where(note.owner_id == owner_id)
+    if depth is not None:
+        step = step.where(tree.c.level < depth)
+    return tree.union_all(step)
+
+def load_tree(db: Session, owner_id: int, root_id: Optional[int] = None, children_of: Optional[int] = None,
+              depth: Optional[int] = None, include_content: bool = True,
+              root_ids: Optional[Sequence[int]] = None) -> List[dict]:
+    """Load a whole subtree with a single query and nest it in memory.
+
+    Returns the anchor notes as dicts shaped like schemas.NoteResponse.
+    """
+    columns = TREE_COLUMNS if include_content else LISTING_COLUMNS
+    tree = subtree_cte(owner_id, root_id=root_id, children_of=children_of, depth=depth,
+                       columns=columns, root_ids=root_ids)
+    if not include_content:
+        rows = db.execute(select(tree).order_by(tree.c.level, tree.c.id)).mappings().all()
+        return build_tree(rows)
+    rows = db.execute(
+        contents.select_with_content(tree, content_hash=tree.c.content_hash).order_by(tree.c.level, tree.c.id)
+    ).mappings().all()
+    return build_tree(contents.decode_rows(rows))
+
+# Everything a tree response depends on: an edit bumps a version, a create,
+# delete or move changes the count or the id / parent sums. The sums alone
+# can collide (SQLite reuses the rowid of a deleted newest note), so the
+# latest change-feed id of the subtree's notes, which only ever grows, is
+# part of it too: every create, edit and move records a new one.
+FINGERPRINT_COLUMNS = (models.Note.id, models.Note.parent_id, models.Note.version, models.Note.updated_at)
+
+def subtree_fingerprint(db: Session, owner_id: int, root_id: Optional[int] = None,
+                        children_of: Optional[int] = None, depth: Optional[int] = None) -> tuple:
+    """Aggregate (count, sum of ids, sum of parent ids, sum of versions, max updated_at,
+    max change id) over a subtree"""
+    tree = subtree_cte(owner_id, root_id=root_id, children_of=children_of, depth=depth,
+                       columns=FINGERPRINT_COLUMNS)
+    row = db.execute(select(
+        func.count(),
+        func.sum(tree.c.id),
+        func.sum(tree.c.parent_id),
+        func.sum(tree.c.version),
+        func.max(tree.c.updated_at),
+        func.max(models.NoteChange.id),
+    ).select_from(tree).outerjoin(models.NoteChange, models.NoteChange.note_id == tree.c.id)).one()
+    return tuple(row)
+
+def load_page(db: Session, owner_id: int, parent_id: Optional[int], limit: int, cursor: Optional[str] = None,
+              depth: Optional[int] = None, include_content: bool = True):
+    """Load one keyset page of a folder (or of the root level) with its subtrees.
+
+    Returns (notes, next_cursor); next_cursor is None on the last page.
+    """
+    dialect_name = db.get_bind().dialect.name
+    key = pagination.sort_key(dialect_name)
+    page = select(models.Note.id, key.label("sort_key")).where(
+        models.Note.owner_id == owner_id,
+        models.Note.parent_id == parent_id
+    )
+    page = pagination.apply_keyset(page, dialect_name, cursor).limit(limit + 1)
+    rows = db.execute(page).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_cursor(rows[-1].sort_key, rows[-1].id)
+    if not rows:
+        return [], None
+
+    ids = [row.id for row in rows]
+    notes = load_tree(db, owner_id, root_ids=ids, depth=depth, include_content=include_content)
+    position = {note_id: index for index, note_id in enumerate(ids)}
+    notes.sort(key=lambda note: position[note["id"]])
+    return notes, next_cursor
+
+def build_tree(rows) -> List[dict]:
+    """Nest flat rows (ordered parents first) into children lists in O(n)"""
+    nodes = {}
+    roots = []
+    for row in rows:
+        node = dict(row)
+        level = node.pop("level", 0)
+        node["children"] = []
+        nodes[node["id"]] = node
+        parent = nodes.get(node["parent_id"])
+        if level == 0 or parent is None:
+            roots.append(node)
+        else:
+            parent["children"].append(node)
+    return roots
+
+# Keeps each IN (...) list well under the bind parameter limits of every backend
+DELETE_CHUNK_SIZE = 500
+
+def collect_subtree_ids(db: Session, owner_id: int, root_id: int) -> List[int]:
+    """Return the ids of a note and all its descendants, deepest first"""
+    note = models.Note
+    path = db.execute(select(note.path).where(note.owner_id == owner_id, note.id == root_id)).scalar()
+    if path is None:
+        return []
+    # Longer paths are deeper
+    rows = db.execute(
+        select(note.id)
+        .where(note.owner_id == owner_id, path_startswith(db.get_bind().dialect.name, descendant_prefix(path, root_id)))
+        .order_by(func.length(note.path).desc(), note.id)
+    ).all()
+    return [row.id for row in rows] + [root_id]
+
+def delete_subtree(db: Session, owner_id: int, root_id: int) -> List[int]:
+    """Delete a note and its whole subtree with set-based statements, then the
+    bodies nothing else uses (caller commits).
+
+    Ids are deleted deepest level first so every chunk only references parents
+    that are still present, which keeps foreign keys valid on Postgres.
+    """
+    ids = collect_subtree_ids(db, owner_id, root_id)
+    hashes = set()
+    for start in range(0, len(ids), DELETE_CHUNK_SIZE):
+        chunk = ids[start:start + DELETE_CHUNK_SIZE]
+        hashes.update(db.execute(select(models.Note.content_hash).where(models.Note.id.in_(chunk))).scalars())
+        db.execute(
+            delete(models.Note).where(models.Note.id.in_(chunk)),
+            execution_options={"synchronize_session": False}
+        )
+    contents.release(db, hashes)
+    return ids
@@ -0,0 +1,140 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+from sqlalchemy.orm import Session, sessionmaker
+
+logger = logging.getLogger("anctext.writer")
+
+# Single-writer queue for SQLite. SQLite allows one writer at a time, so
+# instead of many threads (and worker processes) fighting over the write
+# lock, each worker funnels its writes through one thread that runs a burst
+# of them inside one transaction and commits once for the whole group.
+
+class GroupCommitSession(Session):
+    """Session handed to queued write functions.
+
+    Their own commit() only flushes; the queue commits the real transaction
+    once every function in the group has run.
+    """
+
+    def commit(self):
+        if self.info.get("group_commit"):
+            self.flush()
+            return
+        super().commit()
+
+class WriteQueue:
+    def __init__(self, session_factory: sessionmaker, batch_max: int, batch_window: float):
+        self.session_factory = session_factory
+        self.batch_max = batch_max
+        self.batch_window = batch_window
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.writes = 0
+        self.commits = 0
+        self.failed = 0
+
+    async def submit(self, fn, *args, **kwargs):
+        """Run `fn(session, *args, **kwargs)` on the writer thread and await its result"""
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # The caller's context carries the per-request metrics
+        self._queue.put((fn, args, kwargs, contextvars.copy_context(), loop, future))
+        return await future
+
+    def stop(self):
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join(timeout=5)
+                self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "writes": self.writes,
+            "commits": self.commits,
+            "failed": self.failed,
+            "writes_per_commit": round(self.writes / self.commits, 2) if self.commits else 0.0,
+        }
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+                    self._thread.start()
+
+    def _next_batch(self) -> Optional[list]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._run_batch(batch)
+            except Exception:
+                logger.exception("Write queue batch failed")
+
+    def _run_batch(self, batch: list):
+        outcomes = []
+        db = self.session_factory()
+        db.info["group_commit"] = True
+        try:
+            for fn, args, kwargs, context, _, _ in batch:
+                # A savepoint per write: a failing write is undone without
+                # taking the rest of the group down with it
+                savepoint = db.begin_nested()
+                try:
+                    result = context.run(fn, db, *args, **kwargs)
+                    if savepoint.is_active:
+                        savepoint.commit()
+                    outcomes.append((True, result))
+                except BaseException as e:
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    outcomes.append((False, e))
+            db.info["group_commit"] = False
+            db.commit()
+            self.commits += 1
+        except Exception as e:
+            db.rollback()
+            outcomes = [(False, e)] * len(batch)
+        finally:
+            db.close()
+
+        for (_, _, _, _, loop, future), (ok, value) in zip(batch, outcomes):
+            self.writes += 1
+            self.failed += not ok
+            loop.call_soon_threadsafe(_resolve, future, ok, value)
+
+def _resolve(future: asyncio.Future, ok: bool, value):
+    if future.cancelled():
+        return
+    if ok:
+        future.set_result(value)
+    else:
+        future.set_exception(value)
@@ -0,0 +1,177 @@
+import os
+import random
+import statistics
+import sys
+import time
+
+# Storage and listing cost of inline note bodies (schema revision 0005)
+# versus the separate, deduplicated and compressed note_contents table.
+# Builds the same workspace of markdown notes shaped like seed_data.py in
+# two scratch SQLite files, VACUUMs both and times the tree queries.
+#
+#   python benchmarks/bench_content_storage.py
+#
+# BENCH_NOTES, BENCH_DUPLICATES (share of copied bodies) and BENCH_REPEAT tune it.
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_storage_app.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+NOTES = int(os.environ.get("BENCH_NOTES", "20000"))
+DUPLICATES = float(os.environ.get("BENCH_DUPLICATES", "0.15"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "15"))
+FOLDERS = max(1, NOTES // 50)
+
+TOPICS = (
+    "React Hooks", "Server Components", "State Management", "Event Loop", "Closures", "FastAPI",
+    "SQLAlchemy 2.0", "Kubernetes", "Diffusion Models", "LLM Research", "Compound Components",
+)
+WORDS = (
+    "component render state effect hook closure scope promise queue microtask async await "
+    "request response schema session query index transaction migration pod service deployment "
+    "attention transformer token embedding noise model gradient cache latency throughput"
+).split()
+CODE = (
+    "```javascript\nfunction reverseStep(x_t, t) {\n  const predictedNoise = model.predict(x_t, t);\n"
+    "  return x_t - predictedNoise;\n}\n```",
+    "```python\n@app.get(\"/items/{item_id}\")\nasync def read_item(item_id: int):\n"
+    "    return {\"item_id\": item_id}\n```",
+    "```javascript\nconst [count, setCount] = useState(0);\nuseEffect(() => {\n"
+    "  document.title = `Clicked ${count} times`;\n}, [count]);\n```",
+)
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+def markdown(rng: random.Random) -> str:
+    """A note like the seeded ones: heading, prose, a bullet list and some code"""
+    topic = rng.choice(TOPICS)
+    parts = [f"# {topic}", " ".join(sentence(rng) for _ in range(rng.randint(1, 4)))]
+    # Most notes are short; a tail of long ones carries most of the bytes
+    sections = rng.choice((1, 1, 2, 3, 6, 20))
+    for _ in range(sections):
+        parts.append(f"### {rng.choice(WORDS).capitalize()} {rng.choice(WORDS)}")
+        parts.extend(f"- **{rng.choice(WORDS).capitalize()}**: {sentence(rng)}" for _ in range(rng.randint(2, 5)))
+        if rng.random() < 0.5:
+            parts.append(rng.choice(CODE))
+        parts.append(" ".join(sentence(rng) for _ in range(rng.randint(2, 6))))
+    return "\n\n".join(parts)
+
+def workspace(seed: int = 7):
+    rng = random.Random(seed)
+    bodies = []
+    for _ in range(NOTES):
+        if bodies and rng.random() < DUPLICATES:
+            bodies.append(rng.choice(bodies))  # copied notes and templates
+        else:
+            bodies.append(markdown(rng))
+    return bodies
+
+def build(path: str, revision: str, bodies):
+    from sqlalchemy import create_engine, insert, text
+    from sqlalchemy.orm import Session
+    from alembic import command
+    from app import contents, migrations, models
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as conn:
+        command.upgrade(migrations.alembic_config(conn), revision)
+    with Session(engine) as db:
+        user = models.User(email="storage@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        folders = [{"title": f"Folder {i}", "is_folder": True, "owner_id": user.id} for i in range(FOLDERS)]
+        if revision == "head":
+            for folder in folders:
+                folder["path"] = "/"
+        db.execute(insert(models.Note), folders)
+        folder_ids = db.execute(text("SELECT id FROM notes ORDER BY id")).scalars().all()
+        rows = [{
+            "title": f"Note {i}", "is_folder": False, "owner_id": user.id,
+            "parent_id": folder_ids[i % FOLDERS], "content": body,
+        } for i, body in enumerate(bodies)]
+        if revision == "head":
+            for row in rows:
+                row["path"] = f"/{row['parent_id']}/"
+            db.execute(insert(models.Note), contents.prepare_rows(db, rows))
+        else:
+            # Inline schema: the content column is not on the current model
+            db.execute(text(
+                "INSERT INTO notes (title, is_folder, owner_id, parent_id, content) "
+                "VALUES (:title, :is_folder, :owner_id, :parent_id, :content)"
+            ), rows)
+        db.commit()
+        owner_id = user.id
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    return engine, owner_id, folder_ids
+
+def timed(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def measure(engine, owner_id, folder_ids, inline: bool) -> dict:
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+    from app import contents, tree
+    folder = folder_ids[len(folder_ids) // 2]
+    with Session(engine) as db:
+        # Bytes a listing has to page through (dbstat is built into most SQLite builds)
+        try:
+            notes_bytes = db.execute(text("SELECT SUM(pgsize) FROM dbstat WHERE name = 'notes'")).scalar()
+        except Exception:
+            notes_bytes = None
+        result = {
+            "notes_bytes": notes_bytes,
+            "listing": timed(lambda: tree.load_tree(db, owner_id, include_content=False)),
+            "page": timed(lambda: tree.load_page(db, owner_id, folder, 50, include_content=False)),
+        }
+        params = {"owner_id": owner_id, "folder": folder}
+        if inline:
+            bodies = lambda: db.execute(text(
+                "SELECT id, title, content FROM notes WHERE owner_id = :owner_id AND parent_id = :folder"
+            ), params).all()
+        else:
+            # Same rows, with the join and decompression the endpoints do
+            bodies = lambda: [contents.decode_row(row) for row in db.execute(text(
+                "SELECT n.id, n.title, c.encoding AS content_encoding, c.data AS content_data FROM notes n "
+                "LEFT JOIN note_contents c ON c.hash = n.content_hash "
+                "WHERE n.owner_id = :owner_id AND n.parent_id = :folder"
+            ), params).mappings()]
+        result["folder_bodies"] = timed(bodies)
+    return result
+
+def main():
+    from app import contents
+    bodies = workspace()
+    logical = sum(len(body.encode()) for body in bodies)
+    print(f"{NOTES} notes in {FOLDERS} folders, {logical / 1e6:.1f} MB of markdown, "
+          f"{DUPLICATES:.0%} copies, codec {contents.CODEC}")
+
+    results = {}
+    for name, revision in (("inline", "0005"), ("separate", "head")):
+        path = os.path.abspath(f"bench_storage_{name}.db")
+        engine, owner_id, folder_ids = build(path, revision, bodies)
+        results[name] = dict(measure(engine, owner_id, folder_ids, inline=name == "inline"),
+                             size=os.path.getsize(path))
+        engine.dispose()
+
+    inline, separate = results["inline"], results["separate"]
+    print(f"{'':26s} {'inline':>10s} {'separate':>10s} {'change':>8s}")
+    print(f"{'database size (MB)':26s} {inline['size'] / 1e6:10.2f} {separate['size'] / 1e6:10.2f} "
+          f"{separate['size'] / inline['size'] - 1:+8.0%}")
+    if inline["notes_bytes"] and separate["notes_bytes"]:
+        print(f"{'notes table (MB)':26s} {inline['notes_bytes'] / 1e6:10.2f} {separate['notes_bytes'] / 1e6:10.2f} "
+              f"{separate['notes_bytes'] / inline['notes_bytes'] - 1:+8.0%}")
+    for key, label in (("listing", "whole tree, no bodies"), ("page", "folder page of 50"),
+                       ("folder_bodies", "folder with bodies")):
+        print(f"{label + ' (ms)':26s} {inline[key]:10.2f} {separate[key]:10.2f} {separate[key] / inline[key] - 1:+8.0%}")
+
+if __name__ == "__main__":
+    main()
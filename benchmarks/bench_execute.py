@@ -0,0 +1,53 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import stub_piston
+
+# The stub must be running before the app reads PISTON_URL
+stub = stub_piston.start()
+os.environ["PISTON_URL"] = stub_piston.url(stub)
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_execute.db")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from app.main import app
+
+USERS = int(os.environ.get("BENCH_USERS", "8"))
+REQUESTS_PER_USER = int(os.environ.get("BENCH_REQUESTS", "10"))
+SNIPPET = {"language": "python", "version": "3.10.0", "files": [{"content": "print('hi')"}]}
+
+async def login(client, i):
+    email = f"exec{i}@example.com"
+    await client.post("/auth/signup", json={"email": email, "password": "bench"})
+    response = await client.post("/auth/login", data={"username": email, "password": "bench"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+async def user_loop(client, headers, latencies, statuses):
+    for _ in range(REQUESTS_PER_USER):
+        start = time.perf_counter()
+        response = await client.post("/notes/execute", json=SNIPPET, headers=headers)
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        users = [await login(client, i) for i in range(USERS)]
+        latencies, statuses = [], {}
+        start = time.perf_counter()
+        await asyncio.gather(*(user_loop(client, headers, latencies, statuses) for headers in users))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"stub delay {stub_piston.DELAY * 1000:.0f}ms, {USERS} users x {REQUESTS_PER_USER} requests")
+    print(f"throughput {len(latencies) / elapsed:.1f} req/s, statuses {statuses}")
+    print(f"p50 {statistics.median(latencies):.1f}ms  p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f}ms")
+    print(f"upstream requests served: {stub_piston.StubPistonHandler.requests_served}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
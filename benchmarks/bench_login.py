@@ -0,0 +1,76 @@
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Login storm benchmark: measures login throughput and how the latency of a
+# note endpoint holds up while logins are running. Compare
+# PASSWORD_HASH_WORKERS=0 (threadpool) with the default process pool.
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_login.db")
+# Every login comes from one address
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from app.main import app
+from app.config import settings
+
+LOGINS = int(os.environ.get("BENCH_LOGINS", "60"))
+CONCURRENCY = int(os.environ.get("BENCH_CONCURRENCY", "16"))
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))]
+    return f"p50 {statistics.median(samples):.1f}ms  p95 {pick(0.95):.1f}ms  p99 {pick(0.99):.1f}ms"
+
+async def probe_notes(client, headers, stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/notes/", params={"limit": 20, "depth": 0}, headers=headers)
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+
+async def login_storm(client):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    statuses = {}
+
+    async def one():
+        async with semaphore:
+            response = await client.post("/auth/login", data={"username": "storm@example.com", "password": "storm"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(LOGINS)))
+    return time.perf_counter() - start, statuses
+
+async def main():
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        await client.post("/auth/signup", json={"email": "storm@example.com", "password": "storm"})
+        token = (await client.post("/auth/login", data={"username": "storm@example.com", "password": "storm"})).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        for i in range(20):
+            await client.post("/notes/", json={"title": f"note {i}", "content": "x" * 500}, headers=headers)
+
+        idle = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_notes(client, headers, stop, idle))
+        await asyncio.sleep(1)
+        stop.set()
+        await probe
+
+        loaded = []
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_notes(client, headers, stop, loaded))
+        elapsed, statuses = await login_storm(client)
+        stop.set()
+        await probe
+
+    print(f"bcrypt rounds {settings.BCRYPT_ROUNDS}, hash workers {settings.PASSWORD_HASH_WORKERS}")
+    print(f"logins: {LOGINS} in {elapsed:.2f}s = {LOGINS / elapsed:.1f}/s, statuses {statuses}")
+    print(f"GET /notes/ idle:         {percentiles(idle)}")
+    print(f"GET /notes/ during storm: {percentiles(loaded)}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
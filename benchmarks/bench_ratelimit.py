@@ -0,0 +1,100 @@
+import multiprocessing
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import time
+
+# Overhead of a rate limit check per store, and whether the SQLite store
+# holds a limit exactly when several worker processes share it:
+#
+#   python benchmarks/bench_ratelimit.py
+#
+# BENCH_CHECKS (per process), BENCH_PROCESSES and BENCH_KEYS tune it.
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_ratelimit_app.db")
+os.environ.setdefault("AUTO_MIGRATE", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CHECKS = int(os.environ.get("BENCH_CHECKS", "20000"))
+PROCESSES = int(os.environ.get("BENCH_PROCESSES", "4"))
+KEYS = int(os.environ.get("BENCH_KEYS", "1000"))
+# Shared-bucket check: this many requests per hour across all processes
+SHARED_LIMIT = 500
+
+def fresh_path() -> str:
+    # Same directory as the app's default (/dev/shm where there is one)
+    from app import ratelimit
+    path = os.path.join(os.path.dirname(ratelimit.default_sqlite_path()), "bench_ratelimit.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return path
+
+def make_store(kind: str, path: str):
+    from app import ratelimit
+    return ratelimit.SQLiteStore(path) if kind == "sqlite" else ratelimit.MemoryStore()
+
+def timed_checks(kind: str, path: str, seed: int) -> tuple:
+    """Microseconds per check over random keys of a 600/minute rule, and the
+    checks that hit the busy timeout (the app lets those through)"""
+    from app import ratelimit
+    rule = ratelimit.Rule("bench", 600, 60)
+    store = make_store(kind, path)
+    rng = random.Random(seed)
+    keys = [f"bench:user:{rng.randrange(KEYS)}" for _ in range(CHECKS)]
+    samples, busy = [], 0
+    for key in keys:
+        start = time.perf_counter()
+        try:
+            store.hit(key, time.time(), rule.interval, rule.period)
+        except sqlite3.OperationalError:
+            busy += 1
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples, busy
+
+def _timed_worker(args):
+    return timed_checks(*args)
+
+def _shared_worker(path: str) -> int:
+    # Everyone hammers one bucket; only SHARED_LIMIT hits may pass in total
+    from app import ratelimit
+    rule = ratelimit.Rule("shared", SHARED_LIMIT, 3600)
+    store = ratelimit.SQLiteStore(path)
+    allowed = 0
+    for _ in range(SHARED_LIMIT):
+        try:
+            allowed += store.hit("shared", time.time(), rule.interval, rule.period) == 0
+        except sqlite3.OperationalError:
+            pass
+    return allowed
+
+def summary(label: str, results: list):
+    samples = sorted(s for samples, _ in results for s in samples)
+    busy = sum(busy for _, busy in results)
+    p99 = samples[int(len(samples) * 0.99)]
+    print(f"{label:34s} {statistics.median(samples):8.1f} {p99:8.1f} {samples[-1]:9.1f} {busy:6d}")
+
+def main():
+    print(f"{CHECKS} checks per process over {KEYS} keys (microseconds)")
+    print(f"{'':34s} {'p50':>8s} {'p99':>8s} {'max':>9s} {'busy':>6s}")
+    summary("memory, 1 process", [timed_checks("memory", "", 1)])
+    summary("sqlite, 1 process", [timed_checks("sqlite", fresh_path(), 1)])
+
+    path = fresh_path()
+    with multiprocessing.Pool(PROCESSES) as pool:
+        results = pool.map(_timed_worker, [("sqlite", path, seed) for seed in range(PROCESSES)])
+    summary(f"sqlite, {PROCESSES} processes sharing", results)
+
+    path = fresh_path()
+    with multiprocessing.Pool(PROCESSES) as pool:
+        allowed = sum(pool.map(_shared_worker, [path] * PROCESSES))
+    # Busy checks are not counted, so fewer than the limit can pass; never more
+    verdict = "ok" if allowed <= SHARED_LIMIT else "FAIL"
+    print(f"{verdict}: {allowed} of {SHARED_LIMIT * PROCESSES} requests allowed on a shared "
+          f"{SHARED_LIMIT}/hour bucket across {PROCESSES} processes")
+    return 0 if allowed <= SHARED_LIMIT else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
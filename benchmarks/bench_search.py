@@ -0,0 +1,75 @@
+import os
+import random
+import statistics
+import sys
+import time
+
+# Run against a throwaway database unless one is given explicitly
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_search.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from app.database import SessionLocal
+from app import contents, models, search, migrations
+
+NOTES = int(os.environ.get("BENCH_NOTES", "20000"))
+QUERIES = ["python generators", "kubernetes", "react hooks", "attention", "diffusion noise", "zzznomatch"]
+WORDS = (
+    "python react hooks kubernetes pods services deployment attention transformer token "
+    "diffusion noise model state effect closure generator async await index query cache "
+    "latency throughput database folder markdown editor cosmos voyager architecture"
+).split()
+
+def seed(db, owner_id):
+    rng = random.Random(42)
+    rows = []
+    for i in range(NOTES):
+        body = " ".join(rng.choice(WORDS) for _ in range(rng.randint(50, 400)))
+        rows.append({
+            "title": f"Note {i} {rng.choice(WORDS)}",
+            "content": f"# Heading\n\n{body}",
+            "is_folder": False,
+            "path": "/",
+            "owner_id": owner_id,
+        })
+    db.execute(insert(models.Note), contents.prepare_rows(db, rows))
+    db.flush()
+    search.reindex_user_notes(db, owner_id)
+    db.commit()
+
+def ilike_scan(db, owner_id, q):
+    # The substring scan used on backends without a full-text index
+    return search.scan_notes(db, owner_id, q, limit=10)
+
+def timed(fn, repeat=20):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+def main():
+    migrations.run_migrations()
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == "bench@example.com").first()
+        if not user:
+            user = models.User(email="bench@example.com", hashed_password="x", full_name="Bench")
+            db.add(user)
+            db.commit()
+            db.refresh(user)
+            print(f"Seeding {NOTES} notes...")
+            seed(db, user.id)
+
+        print(f"{'query':<20} {'index p50':>10} {'index p95':>10} {'ilike p50':>10} {'ilike p95':>10}")
+        for q in QUERIES:
+            idx = timed(lambda: search.search_notes(db, user.id, q, limit=10))
+            scan = timed(lambda: ilike_scan(db, user.id, q))
+            print(f"{q:<20} {idx[0]:>8.2f}ms {idx[1]:>8.2f}ms {scan[0]:>8.2f}ms {scan[1]:>8.2f}ms")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import asyncio
+import gzip
+import json
+import os
+import sys
+import time
+from typing import List
+
+# Serialization and compression benchmark on note trees shaped like the ones
+# seed_data.py creates. The demo content is seeded BENCH_COPIES times to reach
+# the size of a heavy user's root listing.
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_serialization.db")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+from app import models, migrations, schemas, tree
+from app.database import SessionLocal
+
+COPIES = int(os.environ.get("BENCH_COPIES", "20"))
+ROUNDS = int(os.environ.get("BENCH_ROUNDS", "20"))
+
+def load_seeded_tree() -> List[dict]:
+    migrations.run_migrations()
+    import seed_data
+    db = SessionLocal()
+    try:
+        user = db.query(models.User).filter(models.User.email == "demo@anctext.com").first()
+        if user is None:
+            for _ in range(COPIES):
+                seed_data.seed_content()
+            user = db.query(models.User).filter(models.User.email == "demo@anctext.com").first()
+        return tree.load_tree(db, user.id)
+    finally:
+        db.close()
+
+def timed(fn):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = fn()
+    return (time.perf_counter() - start) / ROUNDS * 1000, result
+
+def bench_serializers(notes: List[dict]) -> bytes:
+    adapter = TypeAdapter(List[schemas.NoteResponse])
+    validated = adapter.validate_python(notes)
+    encoders = {
+        "stdlib json (jsonable_encoder)": lambda: json.dumps(jsonable_encoder(validated)).encode(),
+        "pydantic dump_json": lambda: adapter.dump_json(validated),
+    }
+    try:
+        import orjson
+        encoders["orjson"] = lambda: orjson.dumps(adapter.dump_python(validated, mode="json"))
+    except ImportError:
+        print("orjson not installed, skipping it")
+
+    print(f"Serializing {len(notes)} root notes ({ROUNDS} rounds each)")
+    body = b""
+    for name, encode in encoders.items():
+        elapsed, body = timed(encode)
+        print(f"  {name:32s} {elapsed:8.2f}ms  {len(body):>10,} bytes")
+    return body
+
+def bench_compression(body: bytes):
+    codecs = {f"gzip level {level}": (lambda level=level: gzip.compress(body, compresslevel=level)) for level in (1, 6, 9)}
+    try:
+        import brotli
+        for quality in (4, 11):
+            codecs[f"brotli quality {quality}"] = lambda quality=quality: brotli.compress(body, quality=quality)
+    except ImportError:
+        print("brotli not installed, skipping it")
+
+    print(f"Compressing a {len(body):,} byte response")
+    for name, compress in codecs.items():
+        elapsed, compressed = timed(compress)
+        print(f"  {name:32s} {elapsed:8.2f}ms  {len(compressed):>10,} bytes ({len(compressed) / len(body):.1%})")
+
+async def bench_wire():
+    import httpx
+    from app.main import app
+    from app.auth import create_access_token
+    token = create_access_token(data={"sub": "demo@anctext.com"})
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print("GET /notes/ through the app")
+        for encoding in ("identity", "gzip", "br"):
+            headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": encoding}
+            start = time.perf_counter()
+            for _ in range(ROUNDS):
+                response = await client.get("/notes/", headers=headers)
+            elapsed = (time.perf_counter() - start) / ROUNDS * 1000
+            wire = int(response.headers["content-length"])
+            print(f"  Accept-Encoding {encoding:9s} {elapsed:8.2f}ms  {wire:>10,} bytes "
+                  f"(content-encoding: {response.headers.get('content-encoding', 'none')})")
+
+def main():
+    notes = load_seeded_tree()
+    body = bench_serializers(notes)
+    bench_compression(body)
+    asyncio.run(bench_wire())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# SQLite write throughput with several worker processes writing at once, as
+# under gunicorn. Compares the stock configuration (rollback journal, no
+# busy_timeout, every thread writing on its own) with the production mode
+# (WAL, pragmas, per-worker group-commit write queue, read-only pool).
+#
+#   python benchmarks/bench_sqlite_writes.py
+#
+# BENCH_PROCESSES, BENCH_WRITERS (concurrent requests per process) and
+# BENCH_SECONDS tune the load.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+PROCESSES = int(os.environ.get("BENCH_PROCESSES", "4"))
+WRITERS = int(os.environ.get("BENCH_WRITERS", "8"))
+SECONDS = float(os.environ.get("BENCH_SECONDS", "5"))
+
+MODES = {
+    "stock": {"SQLITE_TUNED": "false", "SQLITE_WRITE_QUEUE": "false", "SQLITE_READ_POOL": "false"},
+    "production": {"SQLITE_TUNED": "true", "SQLITE_WRITE_QUEUE": "true", "SQLITE_READ_POOL": "true"},
+}
+
+def setup():
+    """Create the schema and one user per process; prints their tokens"""
+    sys.path.append(ROOT)
+    from app import auth, migrations, models
+    from app.database import SessionLocal
+    migrations.run_migrations()
+    db = SessionLocal()
+    tokens = []
+    try:
+        for p in range(PROCESSES):
+            email = f"writer{p}@example.com"
+            db.add(models.User(email=email, hashed_password="x"))
+            tokens.append(auth.create_access_token(data={"sub": email}))
+        db.commit()
+    finally:
+        db.close()
+    print(json.dumps(tokens))
+
+async def drive(token: str) -> dict:
+    import logging
+    import httpx
+    logging.disable(logging.WARNING)
+    from app.main import app
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies, statuses = [], {}
+    deadline = time.perf_counter() + SECONDS
+
+    async def writer(w):
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            i = 0
+            while time.perf_counter() < deadline:
+                i += 1
+                start = time.perf_counter()
+                response = await client.post("/notes/", json={"title": f"w{w} n{i}", "content": "x" * 500}, headers=headers)
+                if response.status_code == 200:
+                    note = response.json()
+                    response = await client.patch(f"/notes/{note['id']}", json={
+                        "base_version": note["version"], "edits": [{"start": 0, "end": 1, "text": "y"}]
+                    }, headers=headers)
+                latencies.append((time.perf_counter() - start) * 1000)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(writer(w) for w in range(WRITERS)))
+    return {"elapsed": time.perf_counter() - start, "latencies": latencies, "statuses": statuses}
+
+def run_mode(name: str, overrides: dict):
+    path = os.path.join(os.getcwd(), f"bench_writes_{name}.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", AUTO_MIGRATE="false",
+               RATE_LIMIT_ENABLED="false", **overrides)
+    tokens = json.loads(subprocess.check_output([sys.executable, __file__, "--setup"], env=env).splitlines()[-1])
+
+    workers = [
+        subprocess.Popen([sys.executable, __file__, "--worker", token], env=env, stdout=subprocess.PIPE)
+        for token in tokens
+    ]
+    results = [json.loads(worker.communicate()[0].splitlines()[-1]) for worker in workers]
+
+    latencies = sorted(l for r in results for l in r["latencies"])
+    statuses = {}
+    for r in results:
+        for status, count in r["statuses"].items():
+            statuses[status] = statuses.get(status, 0) + count
+    ok = statuses.get("200", 0)
+    elapsed = max(r["elapsed"] for r in results)
+    pick = lambda q: latencies[min(len(latencies) - 1, int(len(latencies) * q))] if latencies else 0.0
+    print(f"{name:11s} {ok / elapsed:8.1f} create+patch/s  errors {sum(c for s, c in statuses.items() if s != '200'):5d}  "
+          f"p50 {statistics.median(latencies) if latencies else 0:7.1f}ms  p95 {pick(0.95):7.1f}ms  p99 {pick(0.99):7.1f}ms  "
+          f"statuses {statuses}")
+
+def main():
+    print(f"{PROCESSES} processes x {WRITERS} concurrent writers for {SECONDS:.0f}s")
+    for name, overrides in MODES.items():
+        run_mode(name, overrides)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--setup":
+        setup()
+    elif len(sys.argv) > 2 and sys.argv[1] == "--worker":
+        sys.path.append(ROOT)
+        print(json.dumps(asyncio.run(drive(sys.argv[2]))))
+    else:
+        main()
@@ -0,0 +1,98 @@
+import os
+import statistics
+import sys
+import time
+
+# Materialized paths versus walking parent_id one query at a time:
+#
+#   python benchmarks/bench_tree_paths.py
+#
+# Builds a scratch SQLite tree BENCH_DEPTH levels deep with BENCH_FANOUT
+# folders per folder, then times a breadcrumb both ways and moves a
+# top-level folder (with half of the tree below it), counting statements.
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///./bench_paths.db")
+os.environ.setdefault("AUTO_MIGRATE", "false")
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DEPTH = int(os.environ.get("BENCH_DEPTH", "8"))
+FANOUT = int(os.environ.get("BENCH_FANOUT", "4"))
+REPEAT = int(os.environ.get("BENCH_REPEAT", "50"))
+
+from sqlalchemy import event, insert, select
+from app import migrations, models, tree
+from app.database import SessionLocal, engine
+
+def build(db) -> tuple:
+    user = models.User(email="paths@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    paths = {None: None}
+    parents, leaf = [None, None], None
+    for level in range(DEPTH):
+        rows = [{
+            "title": f"Folder {level}", "is_folder": True, "owner_id": user.id,
+            "parent_id": parent, "path": tree.child_path(paths[parent], parent),
+        } for parent in parents for _ in range(FANOUT if parent is not None else 1)]
+        ids = db.execute(
+            insert(models.Note).returning(models.Note.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+        paths.update((note_id, row["path"]) for note_id, row in zip(ids, rows))
+        parents, leaf = ids, ids[0]
+    db.commit()
+    return user.id, leaf
+
+def walk_parents(db, owner_id, note_id) -> list:
+    # What a breadcrumb cost before: one query per level
+    trail = []
+    while note_id is not None:
+        row = db.execute(select(models.Note.id, models.Note.title, models.Note.parent_id)
+                         .where(models.Note.owner_id == owner_id, models.Note.id == note_id)).one()
+        trail.append(row)
+        note_id = row.parent_id
+    return trail[::-1]
+
+def timed(fn) -> float:
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    path = engine.url.database
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if path and os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    migrations.run_migrations()
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    db = SessionLocal()
+    owner_id, leaf = build(db)
+    total = db.execute(select(models.Note.id).where(models.Note.owner_id == owner_id)).all()
+    print(f"{len(total)} folders, {DEPTH} levels deep")
+    walked = timed(lambda: walk_parents(db, owner_id, leaf))
+    by_path = timed(lambda: tree.load_ancestors(db, owner_id, leaf, columns=tree.BREADCRUMB_COLUMNS))
+    print(f"breadcrumb, parent walk   {walked:8.3f} ms  ({DEPTH} queries)")
+    print(f"breadcrumb, path lookup   {by_path:8.3f} ms  (2 queries)")
+
+    # Move the first top-level folder (and everything below it) under the second
+    roots = db.execute(select(models.Note).where(models.Note.owner_id == owner_id, models.Note.parent_id == None)
+                       .order_by(models.Note.id)).scalars().all()
+    subtree = len(tree.collect_subtree_ids(db, owner_id, roots[0].id))
+    statements.clear()
+    start = time.perf_counter()
+    tree.move_subtree(db, roots[0], roots[1])
+    db.commit()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"move of {subtree} notes       {elapsed:8.1f} ms  ({len(statements)} statements)")
+    moved = db.execute(select(models.Note.path).where(models.Note.id == leaf)).scalar()
+    ok = moved.startswith(tree.descendant_prefix("/", roots[1].id))
+    print(f"{'ok' if ok else 'FAIL'}: leaf path after the move is {moved}")
+    db.close()
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
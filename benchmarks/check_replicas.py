@@ -0,0 +1,96 @@
+import asyncio
+import os
+import sqlite3
+import sys
+
+# Read-replica routing check with two SQLite files standing in for a primary
+# and a lagging replica (a snapshot of the primary that never catches up):
+#
+#   python benchmarks/check_replicas.py
+#
+# Reads go to the replica, a client that has just written reads its write
+# back from the primary, the replica is used again once the sticky window
+# has passed, and reads fall back to the primary while the replica is down.
+
+PRIMARY = os.path.abspath("check_primary.db")
+REPLICA = os.path.abspath("check_replica.db")
+STICKY_SECONDS = 1.0
+
+for path in (PRIMARY, REPLICA):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{PRIMARY}",
+    DATABASE_REPLICA_URLS=f"sqlite:///{REPLICA}",
+    REPLICA_STICKY_SECONDS=str(STICKY_SECONDS),
+    AUTO_MIGRATE="false",
+)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from app import auth, migrations, models, replicas
+from app.database import SessionLocal
+
+def seed() -> str:
+    migrations.run_migrations()
+    db = SessionLocal()
+    try:
+        user = models.User(email="replica@example.com", hashed_password="x")
+        db.add(user)
+        db.flush()
+        db.add(models.Note(title="seeded", content="", owner_id=user.id))
+        db.commit()
+    finally:
+        db.close()
+    # Snapshot the primary into the replica
+    source, target = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    source.backup(target)
+    source.close()
+    target.close()
+    return auth.create_access_token(data={"sub": "replica@example.com"})
+
+def titles(response) -> list:
+    response.raise_for_status()
+    return sorted(note["title"] for note in response.json())
+
+async def main() -> int:
+    token = seed()
+    from app.main import app
+    headers = {"Authorization": f"Bearer {token}"}
+    transport = httpx.ASGITransport(app=app)
+    failures = 0
+
+    def check(label, got, expected):
+        nonlocal failures
+        ok = got == expected
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {label}: {got}")
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as client:
+        check("read from the replica", titles(await client.get("/notes/", headers=headers)), ["seeded"])
+
+        response = await client.post("/notes/", json={"title": "written", "content": ""}, headers=headers)
+        response.raise_for_status()
+        check("write sets the sticky cookie", replicas.STICKY_COOKIE in response.cookies, True)
+        check("read-your-writes from the primary", titles(await client.get("/notes/", headers=headers)), ["seeded", "written"])
+
+        # Another worker: no in-process memory of the write, only the cookie
+        replicas.sticky_clients.clear()
+        check("cookie alone keeps the client on the primary",
+              titles(await client.get("/notes/", headers=headers)), ["seeded", "written"])
+
+        await asyncio.sleep(STICKY_SECONDS + 0.2)
+        check("replica again after the sticky window", titles(await client.get("/notes/", headers=headers)), ["seeded"])
+
+        replicas.replica_set.replicas[0].mark_down(RuntimeError("simulated outage"))
+        check("primary while the replica is down", titles(await client.get("/notes/", headers=headers)), ["seeded", "written"])
+        await replicas.replica_set.replicas[0].ping()
+        check("replica back after a good ping", titles(await client.get("/notes/", headers=headers)), ["seeded"])
+
+    print(replicas.replica_set.stats())
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,396 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+# Benchmark harness: bulk-generates synthetic users and note trees, drives the
+# app in-process over httpx's ASGI transport and reports per-route throughput
+# and latency percentiles as JSON, so runs can be compared across commits.
+# Every /notes and /auth route has a scenario. The change stream never ends,
+# so it is timed to its first event, after which the client hangs up.
+#
+#   python benchmarks/harness.py --output results.json
+#   python benchmarks/harness.py --database-url postgresql://postgres@localhost/bench
+#
+# The database URL and the stub Piston upstream must be configured before the
+# app is imported, so arguments are parsed first and app imports happen in main().
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+WORDS = (
+    "python react hooks kubernetes pods services deployment attention transformer token "
+    "diffusion noise model state effect closure generator async await index query cache "
+    "latency throughput database folder markdown editor cosmos voyager architecture"
+).split()
+PASSWORD = "bench-password"
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every notes and auth route in-process")
+    parser.add_argument("--database-url", default="sqlite:///./bench_harness.db")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=3, help="folder levels below the root")
+    parser.add_argument("--fanout", type=int, default=5, help="children per folder")
+    parser.add_argument("--note-size", type=int, default=2000, help="approximate markdown bytes per note")
+    parser.add_argument("--requests", type=int, default=200, help="requests per route")
+    parser.add_argument("--import-size", type=int, default=50, help="notes per import request")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--routes", default="", help="comma-separated subset of scenario names")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="-", help="JSON results file, '-' for stdout")
+    return parser.parse_args(argv)
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def markdown(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return "# " + " ".join(words[:4]).title() + "\n\n" + " ".join(words)
+
+class Dataset:
+    """Synthetic users and notes, generated with one bulk INSERT per tree level"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.users = []  # [{"id", "email", "token", "folders", "notes", "scratch"}]
+        self.paths = {}  # materialized paths of the generated folders
+
+    def generate(self):
+        from sqlalchemy import insert
+        from app import auth, hashing, models, search
+        from app.database import SessionLocal
+
+        run = self.run = uuid.uuid4().hex[:8]
+        hashed = hashing.hash_password_sync(PASSWORD)
+        db = SessionLocal()
+        try:
+            user_ids = db.execute(
+                insert(models.User).returning(models.User.id, sort_by_parameter_order=True),
+                [{"email": f"bench-{run}-{u}@example.com", "hashed_password": hashed, "full_name": f"Bench {u}"}
+                 for u in range(self.args.users)]
+            ).scalars().all()
+            for u, user_id in enumerate(user_ids):
+                email = f"bench-{run}-{u}@example.com"
+                folders, notes = self._generate_tree(db, user_id)
+                # Leaf notes reserved for the destructive scenarios (PUT, PATCH, DELETE)
+                scratch = self._insert(db, user_id, [None] * (self.args.requests * 3 // self.args.users + 1), False)
+                self.users.append({
+                    "id": user_id,
+                    "email": email,
+                    "token": auth.create_access_token(data={"sub": email}),
+                    "folders": folders,
+                    "notes": notes,
+                    "scratch": scratch,
+                })
+                search.reindex_user_notes(db, user_id)
+            db.commit()
+        finally:
+            db.close()
+        return self
+
+    def _generate_tree(self, db, user_id):
+        folders, notes = [], []
+        parents = [None]
+        for level in range(self.args.depth):
+            last = level == self.args.depth - 1
+            parent_ids = [parent for parent in parents for _ in range(self.args.fanout)]
+            ids = self._insert(db, user_id, parent_ids, is_folder=not last)
+            (notes if last else folders).extend(ids)
+            parents = ids
+        return folders, notes
+
+    def _insert(self, db, user_id, parent_ids, is_folder):
+        from sqlalchemy import insert
+        from app import contents, models, tree
+        rows = [{
+            "title": f"{'Folder' if is_folder else 'Note'} {self.rng.choice(WORDS)} {i}",
+            "content": "" if is_folder else markdown(self.rng, self.args.note_size),
+            "is_folder": is_folder,
+            "parent_id": parent_id,
+            "path": tree.child_path(self.paths.get(parent_id), parent_id),
+            "owner_id": user_id,
+        } for i, parent_id in enumerate(parent_ids)]
+        ids = db.execute(
+            insert(models.Note).returning(models.Note.id, sort_by_parameter_order=True),
+            contents.prepare_rows(db, rows)
+        ).scalars().all()
+        if is_folder:
+            self.paths.update((note_id, row["path"]) for note_id, row in zip(ids, rows))
+        return ids
+
+    def note_count(self) -> int:
+        return sum(len(u["folders"]) + len(u["notes"]) + len(u["scratch"]) for u in self.users)
+
+class Scenarios:
+    """One request builder per route; each returns (method, url, kwargs)"""
+
+    def __init__(self, dataset: Dataset):
+        self.data = dataset
+        self.rng = random.Random(dataset.args.seed + 1)
+        self.scratch = {u["id"]: iter(u["scratch"]) for u in dataset.users}
+        self.etags = {}
+
+    def user(self, i):
+        return self.data.users[i % len(self.data.users)]
+
+    def auth(self, user):
+        return {"Authorization": f"Bearer {user['token']}"}
+
+    def folder(self, user):
+        return self.rng.choice(user["folders"] or user["notes"])
+
+    def leaf(self, user):
+        return self.rng.choice(user["notes"])
+
+    def all(self):
+        return {
+            "GET /notes/ (full tree)": lambda i: ("GET", "/notes/", {"headers": self.auth(self.user(i))}),
+            "GET /notes/ (page of 50, no content)": lambda i: (
+                "GET", "/notes/", {"params": {"limit": 50, "depth": 0, "include_content": False},
+                                   "headers": self.auth(self.user(i))}),
+            "GET /notes/ (If-None-Match)": self.conditional_root,
+            "GET /notes/search": lambda i: (
+                "GET", "/notes/search", {"params": {"q": " ".join(self.rng.sample(WORDS, 2))},
+                                         "headers": self.auth(self.user(i))}),
+            "GET /notes/{id}": lambda i: self.on_folder(i, "GET", "/notes/{}"),
+            "GET /notes/{id}/children": lambda i: self.on_folder(i, "GET", "/notes/{}/children", params={"limit": 50}),
+            "GET /notes/{id}/ancestors": lambda i: self.on_leaf(i, "/notes/{}/ancestors"),
+            "GET /notes/{id}/breadcrumb": lambda i: self.on_leaf(i, "/notes/{}/breadcrumb"),
+            "GET /notes/folders": lambda i: (
+                "GET", "/notes/folders", {"params": {} if i % 2 else {"parent_id": self.folder(self.user(i))},
+                                          "headers": self.auth(self.user(i))}),
+            "GET /notes/changes": lambda i: (
+                "GET", "/notes/changes", {"params": {"since": 0, "include_content": False},
+                                          "headers": self.auth(self.user(i))}),
+            "GET /notes/changes/stream (first event)": lambda i: (
+                "GET", "/notes/changes/stream", {"params": {"since": 0}, "headers": self.auth(self.user(i)),
+                                                 "first_event": True}),
+            "GET /notes/export (ndjson)": lambda i: ("GET", "/notes/export", {"headers": self.auth(self.user(i))}),
+            "GET /notes/export (zip of a folder)": lambda i: (
+                "GET", "/notes/export", {"params": {"format": "zip", "root_id": self.folder(self.user(i))},
+                                         "headers": self.auth(self.user(i))}),
+            "POST /notes/": lambda i: (
+                "POST", "/notes/", {"json": {"title": f"created {i}", "content": markdown(self.rng, self.data.args.note_size),
+                                             "parent_id": self.folder(self.user(i))},
+                                    "headers": self.auth(self.user(i))}),
+            "PUT /notes/{id}": lambda i: self.on_scratch(i, "PUT", {"json": {"content": markdown(self.rng, self.data.args.note_size)}}),
+            "PATCH /notes/{id}": lambda i: self.on_scratch(i, "PATCH", {"json": {
+                "base_version": 1, "edits": [{"start": 0, "end": 1, "text": "## "}]}}),
+            "DELETE /notes/{id}": lambda i: self.on_scratch(i, "DELETE", {}),
+            "POST /notes/import": self.import_notes,
+            "POST /notes/execute": lambda i: (
+                "POST", "/notes/execute", {"json": {"language": "python", "version": "3.10.0",
+                                                   "files": [{"content": f"print({i})"}]},
+                                          "headers": self.auth(self.user(i))}),
+            "POST /notes/execute/batch": lambda i: (
+                "POST", "/notes/execute/batch", {"json": {"requests": [
+                    {"language": "python", "version": "3.10.0", "files": [{"content": f"print({i}, {k})"}]}
+                    for k in range(4)]}, "headers": self.auth(self.user(i))}),
+            "POST /auth/signup": lambda i: (
+                "POST", "/auth/signup", {"json": {"email": f"signup-{self.data.run}-{i}@example.com", "password": PASSWORD}}),
+            "POST /auth/login": lambda i: (
+                "POST", "/auth/login", {"data": {"username": self.user(i)["email"], "password": PASSWORD}}),
+            "GET /auth/me": lambda i: ("GET", "/auth/me", {"headers": self.auth(self.user(i))}),
+        }
+
+    def on_folder(self, i, method, path, **kwargs):
+        user = self.user(i)
+        return method, path.format(self.folder(user)), {"headers": self.auth(user), **kwargs}
+
+    def on_leaf(self, i, path):
+        user = self.user(i)
+        return "GET", path.format(self.leaf(user)), {"headers": self.auth(user)}
+
+    def import_notes(self, i):
+        """One folder holding --import-size - 1 notes, imported into a random folder"""
+        user = self.user(i)
+        items = [{"id": 1, "title": f"Imported {i}", "is_folder": True}]
+        items += [{"id": k, "parent_id": 1, "title": f"Imported note {k}",
+                   "content": markdown(self.rng, self.data.args.note_size)}
+                  for k in range(2, self.data.args.import_size + 1)]
+        body = "\n".join(json.dumps(item) for item in items).encode()
+        return "POST", "/notes/import", {"params": {"parent_id": self.folder(user)}, "content": body,
+                                         "headers": {**self.auth(user), "Content-Type": "application/x-ndjson"}}
+
+    def on_scratch(self, i, method, kwargs):
+        user = self.user(i)
+        note_id = next(self.scratch[user["id"]])
+        return method, f"/notes/{note_id}", {"headers": self.auth(user), **kwargs}
+
+    def conditional_root(self, i):
+        user = self.user(i)
+        headers = self.auth(user)
+        if user["id"] in self.etags:
+            headers["If-None-Match"] = self.etags[user["id"]]
+        return "GET", "/notes/", {"headers": headers, "remember_etag": user["id"]}
+
+def summarize(latencies, statuses, elapsed):
+    samples = sorted(latencies)
+    pick = lambda q: samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+    return {
+        "requests": len(samples),
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "p50_ms": round(pick(0.50), 3),
+        "p95_ms": round(pick(0.95), 3),
+        "p99_ms": round(pick(0.99), 3),
+    }
+
+async def first_event(app, url, params, headers) -> int:
+    """GET a never-ending stream straight over ASGI until its first body chunk,
+    then disconnect; httpx's ASGI transport would wait for the whole body.
+    Returns the status code."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "server": ("bench", 80), "client": ("127.0.0.1", 0), "root_path": "",
+        "path": url, "raw_path": url.encode(), "query_string": urlencode(params).encode(),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+    }
+    requested, done = False, asyncio.Event()
+    status = None
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and (message.get("body") or not message.get("more_body")):
+            done.set()
+
+    task = asyncio.create_task(app(scope, receive, send))
+    waiter = asyncio.create_task(done.wait())
+    await asyncio.wait({task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+    done.set()
+    try:
+        await asyncio.wait_for(task, timeout=5)
+    except asyncio.TimeoutError:
+        pass
+    return status
+
+async def run_scenario(client, app, scenarios, build, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i):
+        async with semaphore:
+            # Built once a slot is free so conditional requests see earlier ETags
+            method, url, kwargs = build(i)
+            remember = kwargs.pop("remember_etag", None)
+            start = time.perf_counter()
+            if kwargs.pop("first_event", False):
+                status, headers = await first_event(app, url, kwargs["params"], kwargs["headers"]), {}
+            else:
+                response = await client.request(method, url, **kwargs)
+                await response.aread()
+                status, headers = response.status_code, response.headers
+            latencies.append((time.perf_counter() - start) * 1000)
+        statuses[status] = statuses.get(status, 0) + 1
+        if remember is not None and "etag" in headers:
+            scenarios.etags[remember] = headers["etag"]
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return summarize(latencies, statuses, time.perf_counter() - start)
+
+async def run_all(args, dataset):
+    import httpx
+    from app.main import app
+
+    scenarios = Scenarios(dataset)
+    selected = {name.strip() for name in args.routes.split(",") if name.strip()}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        for name, build in scenarios.all().items():
+            if selected and name not in selected:
+                continue
+            results[name] = await run_scenario(client, app, scenarios, build, args.requests, args.concurrency)
+            r = results[name]
+            print(f"{name:40s} {r['throughput_rps']:>9} req/s  p50 {r['p50_ms']:>8.2f}  p95 {r['p95_ms']:>8.2f}  "
+                  f"p99 {r['p99_ms']:>8.2f} ms  errors {r['errors']}", file=sys.stderr)
+    return results
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("STUB_PISTON_DELAY", "0.01")
+    import stub_piston
+    stub = stub_piston.start()
+    os.environ["PISTON_URL"] = stub_piston.url(stub)
+    # Benchmark traffic comes from a handful of synthetic users
+    os.environ.setdefault("PISTON_MAX_PER_USER", str(args.concurrency))
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+    # Keep per-request log lines (app and client) out of the report
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("anctext").setLevel(logging.WARNING)
+
+    from app import migrations
+    from app.config import settings
+    from app.database import engine
+    migrations.run_migrations()
+
+    start = time.perf_counter()
+    dataset = Dataset(args).generate()
+    generate_seconds = time.perf_counter() - start
+    print(f"Generated {len(dataset.users)} users / {dataset.note_count()} notes in {generate_seconds:.2f}s", file=sys.stderr)
+
+    results = asyncio.run(run_all(args, dataset))
+    stub.shutdown()
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "dialect": engine.dialect.name,
+            "async_db": settings.ASYNC_DB,
+            "users": args.users,
+            "depth": args.depth,
+            "fanout": args.fanout,
+            "note_size": args.note_size,
+            "notes": dataset.note_count(),
+            "requests_per_route": args.requests,
+            "concurrency": args.concurrency,
+            "generate_seconds": round(generate_seconds, 3),
+        },
+        "routes": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
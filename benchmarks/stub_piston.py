@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal local stand-in for the Piston execute API.
+# Run it and point PISTON_URL at http://127.0.0.1:2000/api/v2/piston/execute
+# to exercise /notes/execute without leaving the machine.
+
+DELAY = float(os.environ.get("STUB_PISTON_DELAY", "0.2"))  # seconds per execution
+# Anything else is refused with a 400, as Piston does for unknown runtimes
+RUNTIMES = {"python", "javascript", "typescript", "bash", "c", "c++", "java", "go", "rust"}
+
+class StubPistonHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    requests_served = 0  # across every stub server
+
+    def setup(self):
+        super().setup()
+        # One handler per TCP connection: counts how well clients reuse them
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        payload = json.loads(body or b"{}")
+        StubPistonHandler.requests_served += 1
+        self.server.requests_served += 1
+        if payload.get("language") not in RUNTIMES:
+            self.send_json(400, {"message": f"{payload.get('language')}-{payload.get('version', '*')} runtime is unknown"})
+            return
+        time.sleep(self.server.delay)
+        source = "".join(f.get("content", "") for f in payload.get("files", []))
+        result = {
+            "language": payload.get("language"),
+            "version": payload.get("version", "*"),
+            "run": {
+                "stdout": f"ran {len(source)} bytes\n" + payload.get("stdin", ""),
+                "stderr": "",
+                "code": 0,
+                "signal": None,
+                "output": f"ran {len(source)} bytes\n",
+            },
+        }
+        self.send_json(200, result)
+
+    def send_json(self, status: int, result: dict):
+        data = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+def start(port: int = 0, delay: float = DELAY) -> ThreadingHTTPServer:
+    """Start the stub in a background thread; port 0 picks a free port"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubPistonHandler)
+    server.daemon_threads = True
+    server.delay = delay
+    server.requests_served = 0
+    server.connections = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def url(server: ThreadingHTTPServer) -> str:
+    return f"http://127.0.0.1:{server.server_address[1]}/api/v2/piston/execute"
+
+if __name__ == "__main__":
+    server = start(int(os.environ.get("STUB_PISTON_PORT", "2000")))
+    print(f"Stub Piston listening on {url(server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
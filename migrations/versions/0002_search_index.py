@@ -0,0 +1,56 @@
+"""Full-text search index (FTS5 on SQLite, tsvector/GIN on Postgres)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    bind = op.get_bind()
+    name = bind.dialect.name
+    # Idempotent: databases from before migrations existed are stamped at 0001
+    # and may already have an index
+    if name == "sqlite":
+        exists = bind.execute(sa.text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+        )).first()
+        if exists:
+            return
+        op.execute(
+            "CREATE VIRTUAL TABLE notes_fts USING fts5("
+            "title, content, owner_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "INSERT INTO notes_fts (rowid, title, content, owner_id) "
+            "SELECT id, title, coalesce(content, ''), owner_id FROM notes"
+        )
+    elif name == "postgresql":
+        op.execute(
+            "CREATE TABLE IF NOT EXISTS note_search ("
+            "note_id INTEGER PRIMARY KEY REFERENCES notes(id) ON DELETE CASCADE, "
+            "owner_id INTEGER, "
+            "document TSVECTOR NOT NULL)"
+        )
+        op.execute("CREATE INDEX IF NOT EXISTS ix_note_search_document ON note_search USING GIN (document)")
+        op.execute("CREATE INDEX IF NOT EXISTS ix_note_search_owner_id ON note_search (owner_id)")
+        op.execute(
+            "INSERT INTO note_search (note_id, owner_id, document) "
+            "SELECT id, owner_id, "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B') "
+            "FROM notes ON CONFLICT (note_id) DO NOTHING"
+        )
+
+def downgrade():
+    name = op.get_bind().dialect.name
+    if name == "sqlite":
+        op.execute("DROP TABLE IF EXISTS notes_fts")
+    elif name == "postgresql":
+        op.execute("DROP TABLE IF EXISTS note_search")
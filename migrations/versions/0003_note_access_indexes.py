@@ -0,0 +1,41 @@
+"""Composite indexes for the owner/parent access pattern
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    # Keyset pagination sorts on updated_at, which used to stay NULL until
+    # the first edit
+    op.execute("UPDATE notes SET updated_at = created_at WHERE updated_at IS NULL")
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.alter_column(
+            "updated_at",
+            existing_type=sa.DateTime(timezone=True),
+            server_default=sa.func.now()
+        )
+    # Folder listings and the recursive tree walk: owner + parent, in page order
+    op.create_index("ix_notes_owner_parent_updated", "notes", ["owner_id", "parent_id", "updated_at"])
+    # Workspace-wide "recently updated" scans
+    op.create_index("ix_notes_owner_updated", "notes", ["owner_id", "updated_at"])
+    # Foreign key checks when parents are deleted
+    op.create_index("ix_notes_parent_id", "notes", ["parent_id"])
+
+def downgrade():
+    op.drop_index("ix_notes_parent_id", table_name="notes")
+    op.drop_index("ix_notes_owner_updated", table_name="notes")
+    op.drop_index("ix_notes_owner_parent_updated", table_name="notes")
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.alter_column(
+            "updated_at",
+            existing_type=sa.DateTime(timezone=True),
+            server_default=None
+        )
@@ -0,0 +1,44 @@
+"""Change log for incremental client sync
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "note_changes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("note_id", sa.Integer(), nullable=False),
+        sa.Column("deleted", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sqlite_autoincrement=True,
+    )
+    # Feed reads: one owner's changes after a cursor
+    op.create_index("ix_note_changes_owner_id_id", "note_changes", ["owner_id", "id"])
+    # Replacing a note's previous entry on every write
+    op.create_index("ix_note_changes_note_id", "note_changes", ["note_id"])
+    op.create_table(
+        "note_change_horizons",
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("pruned_through", sa.Integer(), nullable=False),
+    )
+    # Existing notes enter the log once, so a sync from cursor 0 sees everything
+    op.execute(
+        "INSERT INTO note_changes (owner_id, note_id, deleted) "
+        "SELECT owner_id, id, false FROM notes WHERE owner_id IS NOT NULL ORDER BY id"
+    )
+
+def downgrade():
+    op.drop_table("note_change_horizons")
+    op.drop_index("ix_note_changes_note_id", table_name="note_changes")
+    op.drop_index("ix_note_changes_owner_id_id", table_name="note_changes")
+    op.drop_table("note_changes")
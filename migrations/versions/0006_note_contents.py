@@ -0,0 +1,115 @@
+"""Move note bodies into a deduplicated, compressed note_contents table
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+import hashlib
+import zlib
+from datetime import datetime, timezone
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+# Frozen copies of the app's defaults at this revision: bodies of 512 bytes
+# or more are zlib-compressed (the app may pick zstd for later writes; the
+# codec is recorded per row)
+COMPRESS_MIN_BYTES = 512
+ZLIB_LEVEL = 6
+
+def encode(text):
+    raw = text.encode("utf-8")
+    encoding, data = "raw", raw
+    if len(raw) >= COMPRESS_MIN_BYTES:
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+        if len(packed) < len(raw):
+            encoding, data = "zlib", packed
+    return {"hash": hashlib.sha256(raw).hexdigest(), "encoding": encoding, "size": len(raw), "data": data}
+
+def decode(encoding, data):
+    if data is None:
+        return ""
+    if encoding == "zstd":
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+def upgrade():
+    op.create_table(
+        "note_contents",
+        sa.Column("hash", sa.String(64), primary_key=True),
+        sa.Column("encoding", sa.String(8), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=False),
+        sa.Column("data", sa.LargeBinary(), nullable=False),
+        sa.Column("last_used_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.add_column(sa.Column("content_hash", sa.String(64), nullable=True))
+
+    # Compress and hash in Python, one batch of notes at a time; a body
+    # already stored by an earlier batch is not inserted again
+    bind = op.get_bind()
+    now = datetime.now(timezone.utc)
+    stored = set()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT id, content FROM notes WHERE id > :last_id ORDER BY id LIMIT :batch"
+        ), {"last_id": last_id, "batch": BATCH_SIZE}).all()
+        if not rows:
+            break
+        bodies, updates = [], []
+        for row in rows:
+            if not row.content:
+                continue
+            body = encode(row.content)
+            updates.append({"id": row.id, "content_hash": body["hash"]})
+            if body["hash"] not in stored:
+                stored.add(body["hash"])
+                bodies.append(dict(body, last_used_at=now))
+        if bodies:
+            bind.execute(sa.text(
+                "INSERT INTO note_contents (hash, encoding, size, data, last_used_at) "
+                "VALUES (:hash, :encoding, :size, :data, :last_used_at)"
+            ), bodies)
+        if updates:
+            bind.execute(sa.text("UPDATE notes SET content_hash = :content_hash WHERE id = :id"), updates)
+        last_id = rows[-1].id
+
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.create_foreign_key("fk_notes_content_hash", "note_contents", ["content_hash"], ["hash"])
+        batch_op.drop_column("content")
+    # Garbage collection looks bodies up by hash
+    op.create_index("ix_notes_content_hash", "notes", ["content_hash"])
+
+def downgrade():
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.add_column(sa.Column("content", sa.Text(), nullable=True))
+
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT n.id, c.encoding, c.data FROM notes n "
+            "LEFT JOIN note_contents c ON c.hash = n.content_hash "
+            "WHERE n.id > :last_id ORDER BY n.id LIMIT :batch"
+        ), {"last_id": last_id, "batch": BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(sa.text("UPDATE notes SET content = :content WHERE id = :id"), [
+            {"id": row.id, "content": decode(row.encoding, row.data)} for row in rows
+        ])
+        last_id = rows[-1].id
+
+    op.drop_index("ix_notes_content_hash", table_name="notes")
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.drop_constraint("fk_notes_content_hash", type_="foreignkey")
+        batch_op.drop_column("content_hash")
+    op.drop_table("note_contents")
@@ -0,0 +1,73 @@
+"""Materialized note paths for ancestor and subtree lookups
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from collections import defaultdict
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+def upgrade():
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.add_column(sa.Column("path", sa.String(512), nullable=True))
+
+    # Walk the tree from the roots in Python (only ids are loaded) and write
+    # the paths back in batches
+    bind = op.get_bind()
+    children = defaultdict(list)
+    parent_of = {}
+    for note_id, parent_id in bind.execute(sa.text("SELECT id, parent_id FROM notes")):
+        children[parent_id].append(note_id)
+        parent_of[note_id] = parent_id
+    paths = {}
+
+    def walk(level):
+        while level:
+            next_level = []
+            for note_id, path in level:
+                paths[note_id] = path
+                next_level.extend((child_id, f"{path}{note_id}/") for child_id in children.pop(note_id, []))
+            level = next_level
+
+    walk([(note_id, "/") for note_id in children.pop(None, [])])
+    # Notes not reached hang below a missing parent or a cycle (moves were
+    # not checked before this revision). Follow one up to the note whose
+    # parent is missing or that closes the cycle, make that a root note and
+    # walk on from it.
+    detached = []
+    while children:
+        note_id = next(iter(children.values()))[0]
+        seen = set()
+        while parent_of.get(note_id) in parent_of and note_id not in seen:
+            seen.add(note_id)
+            note_id = parent_of[note_id]
+        children[parent_of[note_id]].remove(note_id)
+        if not children[parent_of[note_id]]:
+            del children[parent_of[note_id]]
+        detached.append(note_id)
+        walk([(note_id, "/")])
+    for start in range(0, len(detached), BATCH_SIZE):
+        bind.execute(sa.text("UPDATE notes SET parent_id = NULL WHERE id = :id"),
+                     [{"id": note_id} for note_id in detached[start:start + BATCH_SIZE]])
+
+    updates = [{"id": note_id, "path": path} for note_id, path in paths.items()]
+    for start in range(0, len(updates), BATCH_SIZE):
+        bind.execute(sa.text("UPDATE notes SET path = :path WHERE id = :id"), updates[start:start + BATCH_SIZE])
+
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.alter_column("path", existing_type=sa.String(512), nullable=False)
+    op.create_index("ix_notes_owner_path", "notes", ["owner_id", "path"],
+                    postgresql_ops={"path": "text_pattern_ops"})
+
+def downgrade():
+    op.drop_index("ix_notes_owner_path", table_name="notes")
+    with op.batch_alter_table("notes") as batch_op:
+        batch_op.drop_column("path")
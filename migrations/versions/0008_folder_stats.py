@@ -0,0 +1,70 @@
+"""Per-folder aggregates: child and descendant counts, body bytes, last modified
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+def compute(bind) -> dict:
+    """Stats row of every folder, from one scan of the notes"""
+    rows = bind.execute(sa.text(
+        "SELECT n.id, n.owner_id, n.parent_id, n.path, n.is_folder, n.updated_at, "
+        "coalesce(c.size, 0) AS size FROM notes n LEFT JOIN note_contents c ON c.hash = n.content_hash"
+    ).columns(updated_at=sa.DateTime()))
+    stats = {}
+
+    def entry(folder_id):
+        return stats.setdefault(folder_id, {
+            "owner_id": None, "child_count": 0, "descendant_count": 0, "content_bytes": 0, "last_modified_at": None,
+        })
+
+    def touch(current, updated_at):
+        if updated_at is not None and (current["last_modified_at"] is None or updated_at > current["last_modified_at"]):
+            current["last_modified_at"] = updated_at
+
+    for row in rows:
+        if row.is_folder:
+            current = entry(row.id)
+            current["owner_id"] = row.owner_id
+            touch(current, row.updated_at)
+        for part in (row.path or "").strip("/").split("/"):
+            if not part:
+                continue
+            current = entry(int(part))
+            current["descendant_count"] += 1
+            current["content_bytes"] += row.size
+            touch(current, row.updated_at)
+        if row.parent_id is not None:
+            entry(row.parent_id)["child_count"] += 1
+    # Ancestors that are not folders get no row
+    return {folder_id: values for folder_id, values in stats.items() if values["owner_id"] is not None}
+
+def upgrade():
+    folder_stats = op.create_table(
+        "folder_stats",
+        sa.Column("folder_id", sa.Integer(), sa.ForeignKey("notes.id"), primary_key=True),
+        sa.Column("owner_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("child_count", sa.Integer(), nullable=False),
+        sa.Column("descendant_count", sa.Integer(), nullable=False),
+        sa.Column("content_bytes", sa.BigInteger(), nullable=False),
+        sa.Column("last_modified_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_folder_stats_owner_id", "folder_stats", ["owner_id"])
+
+    # One scan of the notes computes every folder's row
+    rows = [dict(values, folder_id=folder_id) for folder_id, values in compute(op.get_bind()).items()]
+    for start in range(0, len(rows), BATCH_SIZE):
+        op.bulk_insert(folder_stats, rows[start:start + BATCH_SIZE])
+
+def downgrade():
+    op.drop_index("ix_folder_stats_owner_id", table_name="folder_stats")
+    op.drop_table("folder_stats")
@@ -0,0 +1,73 @@
+"""Contentless FTS5 search index on SQLite, without a copy of every body
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+
+Deleting from a contentless FTS5 table needs SQLite 3.43 (contentless_delete);
+on older versions, and on other backends, this revision changes nothing.
+Once SQLite has been upgraded, downgrade to 0008 and upgrade again to
+switch over.
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+CONTENTLESS_MIN_VERSION = (3, 43, 0)
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+
+def decode(encoding, data):
+    if data is None:
+        return ""
+    if encoding == "zstd":
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+def sqlite_version(bind) -> tuple:
+    return tuple(int(part) for part in bind.execute(sa.text("SELECT sqlite_version()")).scalar().split("."))
+
+def is_contentless(bind) -> bool:
+    sql = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).scalar()
+    return "content=''" in (sql or "").replace(" ", "")
+
+def rebuild(bind, options: str):
+    bind.execute(sa.text("DROP TABLE IF EXISTS notes_fts"))
+    bind.execute(sa.text(f"CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, owner_id UNINDEXED, {options})"))
+    # Bodies are compressed: decode them in Python, one batch at a time
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT n.id, n.title, n.owner_id, c.encoding, c.data FROM notes n "
+            "LEFT JOIN note_contents c ON c.hash = n.content_hash "
+            "WHERE n.id > :last_id ORDER BY n.id LIMIT :batch"
+        ), {"last_id": last_id, "batch": BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(sa.text(
+            "INSERT INTO notes_fts (rowid, title, content, owner_id) VALUES (:id, :title, :content, :owner_id)"
+        ), [
+            {"id": row.id, "title": row.title or "", "content": decode(row.encoding, row.data), "owner_id": row.owner_id}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite" or sqlite_version(bind) < CONTENTLESS_MIN_VERSION or is_contentless(bind):
+        return
+    rebuild(bind, f"content='', contentless_delete=1, {TOKENIZE}")
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite" or not is_contentless(bind):
+        return
+    rebuild(bind, TOKENIZE)
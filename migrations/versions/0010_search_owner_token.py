@@ -0,0 +1,74 @@
+"""Index the owner in the SQLite search index so matches are narrowed per user
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17
+
+The owner was an UNINDEXED column, filtered only after FTS5 had matched and
+ranked every user's notes. It becomes an indexed `owner` column holding the
+token u<owner_id>, which queries AND with their terms. The table keeps
+whatever content mode 0009 left it in. Other backends are not touched.
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+TOKENIZE = "tokenize = 'unicode61 remove_diacritics 2'"
+
+def decode(encoding, data):
+    if data is None:
+        return ""
+    if encoding == "zstd":
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+def options(bind) -> str:
+    sql = bind.execute(sa.text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'")).scalar()
+    if "content=''" in (sql or "").replace(" ", ""):
+        return f"content='', contentless_delete=1, {TOKENIZE}"
+    return TOKENIZE
+
+def rebuild(bind, owner_column: str, owner_value):
+    table_options = options(bind)
+    bind.execute(sa.text("DROP TABLE IF EXISTS notes_fts"))
+    bind.execute(sa.text(f"CREATE VIRTUAL TABLE notes_fts USING fts5(title, content, {owner_column}, {table_options})"))
+    column = owner_column.split()[0]
+    # Bodies are compressed: decode them in Python, one batch at a time
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT n.id, n.title, n.owner_id, c.encoding, c.data FROM notes n "
+            "LEFT JOIN note_contents c ON c.hash = n.content_hash "
+            "WHERE n.id > :last_id ORDER BY n.id LIMIT :batch"
+        ), {"last_id": last_id, "batch": BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(sa.text(
+            f"INSERT INTO notes_fts (rowid, title, content, {column}) VALUES (:id, :title, :content, :owner)"
+        ), [
+            {"id": row.id, "title": row.title or "", "content": decode(row.encoding, row.data),
+             "owner": owner_value(row.owner_id)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    rebuild(bind, "owner", lambda owner_id: f"u{owner_id}")
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    rebuild(bind, "owner_id UNINDEXED", lambda owner_id: owner_id)
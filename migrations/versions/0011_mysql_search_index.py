@@ -0,0 +1,69 @@
+"""FULLTEXT search index on MySQL, so search no longer decodes every body
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-17
+
+Bodies are compressed in note_contents, so MySQL's search had to decode
+every note of the owner in Python. note_search keeps a plain copy of each
+title and body under an InnoDB FULLTEXT index instead, as the FTS5 and
+tsvector side tables do on the other backends. Other backends are not
+touched.
+"""
+import zlib
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+def decode(encoding, data):
+    if data is None:
+        return ""
+    if encoding == "zstd":
+        import zstandard
+        data = zstandard.ZstdDecompressor().decompress(data)
+    elif encoding == "zlib":
+        data = zlib.decompress(data)
+    return bytes(data).decode("utf-8")
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "mysql":
+        return
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS note_search ("
+        "note_id INTEGER NOT NULL PRIMARY KEY, "
+        "owner_id INTEGER, "
+        "title VARCHAR(255) NOT NULL, "
+        "body MEDIUMTEXT NOT NULL, "
+        "KEY ix_note_search_owner_id (owner_id), "
+        "FULLTEXT KEY ix_note_search_text (title, body), "
+        "CONSTRAINT fk_note_search_note FOREIGN KEY (note_id) REFERENCES notes (id) ON DELETE CASCADE"
+        ") ENGINE=InnoDB DEFAULT CHARSET=utf8mb4"
+    )
+    # Bodies are compressed: decode them in Python, one batch at a time
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.text(
+            "SELECT n.id, n.title, n.owner_id, c.encoding, c.data FROM notes n "
+            "LEFT JOIN note_contents c ON c.hash = n.content_hash "
+            "WHERE n.id > :last_id ORDER BY n.id LIMIT :batch"
+        ), {"last_id": last_id, "batch": BATCH_SIZE}).all()
+        if not rows:
+            break
+        bind.execute(sa.text(
+            "INSERT IGNORE INTO note_search (note_id, owner_id, title, body) VALUES (:id, :owner_id, :title, :body)"
+        ), [
+            {"id": row.id, "owner_id": row.owner_id, "title": row.title or "", "body": decode(row.encoding, row.data)}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+def downgrade():
+    if op.get_bind().dialect.name == "mysql":
+        op.execute("DROP TABLE IF EXISTS note_search")
@@ -6,7 +6,7 @@ sys.path.append(os.getcwd())
 
 from sqlalchemy.orm import Session
 from app.database import SessionLocal, engine
-from app import models
+from app import models, search, folder_stats
 from app.auth import get_password_hash
 
 # Initialize Database Session
@@ -305,6 +305,9 @@ class User(Base):
         )
         db.add(note)
     
+    db.flush()
+    search.reindex_user_notes(db, user.id)
+    folder_stats.rebuild(db, user.id)
     db.commit()
 
     print("✨ Seeding Completed Successfully! The cosmos is populated.")
@@ -0,0 +1,33 @@
+import os
+import sys
+import tempfile
+import uuid
+
+# The app reads its settings at import time: point it at a scratch SQLite
+# file and turn off what needs other processes before importing it
+_tmpdir = tempfile.mkdtemp(prefix="anctext-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_tmpdir}/notes.db"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+os.environ["PASSWORD_HASH_WORKERS"] = "0"
+os.environ["BCRYPT_ROUNDS"] = "4"
+# ASYNC_DB / SQLITE_WRITE_QUEUE from the environment pick the mode under test;
+# a sync run also runs the suite once more on AsyncSession (test_async_mode.py)
+os.environ.setdefault("ASYNC_DB", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from app.main import app
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def headers(client):
+    """Auth headers of a fresh user, so tests never see each other's notes"""
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    client.post("/auth/signup", json={"email": email, "password": "pw"})
+    token = client.post("/auth/login", data={"username": email, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
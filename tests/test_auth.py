@@ -0,0 +1,78 @@
+import asyncio
+from app import auth, cache, models
+from app.config import settings
+from app.database import SessionLocal
+
+def deactivate(email: str):
+    # Through the ORM, as an admin change would be, so the cache hears of it
+    db = SessionLocal()
+    try:
+        db.query(models.User).filter(models.User.email == email).one().is_active = False
+        db.commit()
+    finally:
+        db.close()
+
+def test_deactivated_user_is_refused(client, headers):
+    me = client.get("/auth/me", headers=headers)
+    assert me.status_code == 200
+    deactivate(me.json()["email"])
+    response = client.get("/auth/me", headers=headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Inactive user"
+
+def test_inactive_cached_user_is_refused(client, headers):
+    email = client.get("/auth/me", headers=headers).json()["email"]
+    cached = auth.user_cache.get(email)
+    auth.user_cache.set(email, dict(cached, is_active=False))
+    assert client.get("/notes/", headers=headers).status_code == 403
+
+def test_inactive_user_cannot_log_in(client, headers):
+    email = client.get("/auth/me", headers=headers).json()["email"]
+    deactivate(email)
+    response = client.post("/auth/login", data={"username": email, "password": "pw"})
+    assert response.status_code == 403
+
+def test_local_cache_ttl_is_capped_with_several_workers(monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_TTL", 60)
+    monkeypatch.setattr(settings, "USER_CACHE_LOCAL_TTL", 5)
+    monkeypatch.setattr(settings, "USER_CACHE_REDIS_URL", "")
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 1)
+    assert auth.user_cache_ttl() == 60
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 4)
+    assert auth.user_cache_ttl() == 5
+    monkeypatch.setattr(settings, "USER_CACHE_REDIS_URL", "redis://cache:6379/0")
+    assert auth.user_cache_ttl() == 60
+
+class RecordingCache(cache.TTLCache):
+    """A cache marked blocking that notes whether each call ran on the event loop"""
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__("recording-users", maxsize=100, ttl=60)
+        cache.caches.pop(self.name)
+        self.on_loop = []
+
+    def _record(self):
+        try:
+            asyncio.get_running_loop()
+            self.on_loop.append(True)
+        except RuntimeError:
+            self.on_loop.append(False)
+
+    def get(self, key):
+        self._record()
+        return super().get(key)
+
+    def set(self, key, value):
+        self._record()
+        super().set(key, value)
+
+def test_blocking_user_cache_stays_off_the_event_loop(client, headers, monkeypatch):
+    recording = RecordingCache()
+    monkeypatch.setattr(auth, "user_cache", recording)
+    # A miss and a set, then a hit
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert client.get("/auth/me", headers=headers).status_code == 200
+    assert recording.hits == 1
+    assert recording.on_loop and not any(recording.on_loop)
@@ -0,0 +1,44 @@
+import asyncio
+from app import changes
+from app.config import settings
+
+def collect(owner_id: int, events: int, on_event=None) -> list:
+    async def run():
+        stream = changes.stream_changes(owner_id, 0, include_content=False)
+        received = []
+        try:
+            async for event in stream:
+                received.append(event)
+                if on_event is not None:
+                    on_event(len(received))
+                if len(received) >= events:
+                    break
+        finally:
+            await stream.aclose()
+            await changes.broker.stop()
+        return received
+    return asyncio.run(run())
+
+def test_idle_stream_keepalives_do_not_query(client, headers, monkeypatch):
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    reads = []
+    read = changes._read
+    monkeypatch.setattr(changes, "_read", lambda fn, *args, **kwargs: (reads.append(fn), read(fn, *args, **kwargs))[1])
+    monkeypatch.setattr(settings, "CHANGE_KEEPALIVE_SECONDS", 0.01)
+    received = collect(owner_id, events=6)
+    assert received[0].startswith(b"retry:")
+    assert received[1:] == [b": keepalive\n\n"] * 5
+    assert reads.count(changes.changes_since) == 1
+
+def test_wakeup_reads_new_changes(client, headers, monkeypatch):
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    monkeypatch.setattr(settings, "CHANGE_KEEPALIVE_SECONDS", 0.01)
+
+    def write_after_first_keepalive(count: int):
+        if count == 2:
+            client.post("/notes/", json={"title": "First"}, headers=headers)
+            changes.broker.notify(owner_id)
+
+    received = collect(owner_id, events=3, on_event=write_after_first_keepalive)
+    assert received[1] == b": keepalive\n\n"
+    assert received[2].startswith(b"id: ") and b'"title":"First"' in received[2]
@@ -0,0 +1,45 @@
+from app import responses
+from app.config import settings
+
+GZIP = {"Accept-Encoding": "gzip"}
+
+def note_of_size(client, headers, size: int) -> dict:
+    return client.post("/notes/", json={"title": "Sized", "content": "x" * size}, headers=headers).json()
+
+def test_bodies_are_compact_json(client, headers):
+    response = client.get("/auth/me", headers={**headers, "Accept-Encoding": "identity"})
+    assert response.headers["content-type"] == "application/json"
+    assert response.content.startswith(b'{"') and b'": ' not in response.content and b", " not in response.content
+
+def test_orjson_and_the_fallback_encode_alike(monkeypatch):
+    content = {1: "one", "text": "ünïcode", "items": [1.5, None, True]}
+    fast = responses.FastJSONResponse(content).body
+    monkeypatch.setattr(responses, "orjson", None)
+    assert responses.FastJSONResponse(content).body == fast
+    assert fast == '{"1":"one","text":"ünïcode","items":[1.5,null,true]}'.encode()
+
+def test_large_bodies_are_gzipped_with_a_weak_tag(client, headers):
+    note = note_of_size(client, headers, settings.COMPRESSION_MIN_SIZE * 4)
+    response = client.get(f"/notes/{note['id']}", headers={**headers, **GZIP})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < settings.COMPRESSION_MIN_SIZE
+    assert response.json()["content"] == note["content"]
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    # The weak tag still revalidates, compressed or not
+    for encoding in (GZIP, {"Accept-Encoding": "identity"}):
+        assert client.get(f"/notes/{note['id']}", headers={**headers, **encoding, "If-None-Match": etag}).status_code == 304
+
+def test_small_bodies_are_sent_as_is_with_a_strong_tag(client, headers):
+    note = note_of_size(client, headers, 10)
+    response = client.get(f"/notes/{note['id']}", headers={**headers, **GZIP})
+    assert len(response.content) < settings.COMPRESSION_MIN_SIZE
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"].startswith('"')
+
+def test_uncompressed_large_bodies_keep_a_strong_tag(client, headers):
+    note = note_of_size(client, headers, settings.COMPRESSION_MIN_SIZE * 4)
+    response = client.get(f"/notes/{note['id']}", headers={**headers, "Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.headers["etag"].startswith('"')
@@ -0,0 +1,40 @@
+from sqlalchemy import select
+from app import contents, models
+from app.database import SessionLocal
+
+def stored(*texts) -> list:
+    db = SessionLocal()
+    try:
+        hashes = [contents.content_hash(text) for text in texts]
+        found = set(db.execute(select(models.NoteContent.hash).where(models.NoteContent.hash.in_(hashes))).scalars())
+        return [digest in found for digest in hashes]
+    finally:
+        db.close()
+
+def test_overwrite_drops_the_old_body(client, headers):
+    note = client.post("/notes/", json={"title": "N", "content": "overwrite me 1"}, headers=headers).json()
+    client.put(f"/notes/{note['id']}", json={"content": "overwrite me 2"}, headers=headers)
+    assert stored("overwrite me 1", "overwrite me 2") == [False, True]
+
+def test_shared_body_survives_an_overwrite(client, headers):
+    first = client.post("/notes/", json={"title": "A", "content": "shared body"}, headers=headers).json()
+    client.post("/notes/", json={"title": "B", "content": "shared body"}, headers=headers)
+    client.put(f"/notes/{first['id']}", json={"content": "something else"}, headers=headers)
+    assert stored("shared body") == [True]
+
+def test_patch_drops_the_old_body(client, headers):
+    note = client.post("/notes/", json={"title": "N", "content": "patch me"}, headers=headers).json()
+    response = client.patch(f"/notes/{note['id']}", json={
+        "base_version": note["version"], "edits": [{"start": 0, "end": 5, "text": "patched"}]
+    }, headers=headers)
+    assert response.status_code == 200
+    assert stored("patch me", "patched me") == [False, True]
+
+def test_subtree_delete_drops_its_bodies(client, headers):
+    folder = client.post("/notes/", json={"title": "F", "is_folder": True, "content": "folder readme"},
+                         headers=headers).json()
+    client.post("/notes/", json={"title": "N", "content": "doomed body", "parent_id": folder["id"]}, headers=headers)
+    client.post("/notes/", json={"title": "Keep", "content": "kept body"}, headers=headers)
+    client.post("/notes/", json={"title": "N2", "content": "kept body", "parent_id": folder["id"]}, headers=headers)
+    assert client.delete(f"/notes/{folder['id']}", headers=headers).status_code == 200
+    assert stored("folder readme", "doomed body", "kept body") == [False, False, True]
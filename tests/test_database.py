@@ -0,0 +1,38 @@
+import pytest
+from app import database
+from app.config import settings
+
+@pytest.fixture
+def sizing(monkeypatch):
+    def configure(**values):
+        for key, value in values.items():
+            monkeypatch.setattr(settings, key, value)
+    configure(DB_POOL_SIZING="auto", DB_MAX_CONNECTIONS=100, DB_RESERVED_CONNECTIONS=5, WEB_CONCURRENCY=1,
+              SQLITE_POOL_CONNECTIONS=8)
+    return configure
+
+def test_auto_sizing_splits_the_server_budget(sizing):
+    assert database.pool_sizes(1) == (47, 48)
+    sizing(WEB_CONCURRENCY=4)
+    # 95 connections over 4 workers with 2 engines each
+    assert database.pool_sizes(2) == (5, 6)
+    sizing(DB_MAX_CONNECTIONS=6, WEB_CONCURRENCY=8)
+    assert database.pool_sizes(2) == (1, 0)
+
+def test_auto_sizing_on_sqlite_is_capped(sizing):
+    assert database.pool_sizes(1, sqlite=True) == (4, 4)
+    sizing(WEB_CONCURRENCY=4, SQLITE_POOL_CONNECTIONS=1)
+    assert database.pool_sizes(2, sqlite=True) == (1, 0)
+
+def test_fixed_sizing_is_taken_as_given(sizing):
+    sizing(DB_POOL_SIZING="fixed", DB_POOL_SIZE=3, DB_MAX_OVERFLOW=7)
+    assert database.pool_sizes(2) == database.pool_sizes(2, sqlite=True) == (3, 7)
+
+def test_pool_options_follow_the_url(sizing):
+    options = database.pool_options("sqlite:///./notes.db", 1, database.metrics.InstrumentedQueuePool)
+    assert (options["pool_size"], options["max_overflow"]) == (4, 4)
+    options = database.pool_options("sqlite+aiosqlite:///./notes.db", 1, database.metrics.InstrumentedQueuePool)
+    assert (options["pool_size"], options["max_overflow"]) == (4, 4)
+    options = database.pool_options("postgresql://db/notes", 1, database.metrics.InstrumentedQueuePool)
+    assert (options["pool_size"], options["max_overflow"]) == (47, 48)
+    assert database.pool_options("sqlite:///:memory:", 1, database.metrics.InstrumentedQueuePool) == {}
@@ -0,0 +1,50 @@
+def create(client, headers, content: str) -> dict:
+    return client.post("/notes/", json={"title": "Doc", "content": content}, headers=headers).json()
+
+def patch(client, headers, note: dict, edits: list, base_version=None):
+    version = note["version"] if base_version is None else base_version
+    return client.patch(f"/notes/{note['id']}", json={"base_version": version, "edits": edits}, headers=headers)
+
+def content_of(client, headers, note: dict) -> str:
+    return client.get(f"/notes/{note['id']}", headers=headers).json()["content"]
+
+def test_edits_apply_against_the_same_base(client, headers):
+    note = create(client, headers, "hello world, hello moon")
+    response = patch(client, headers, note, [
+        # Out of order, and of different lengths: offsets are all into the base text
+        {"start": 13, "end": 18, "text": "goodbye"},
+        {"start": 0, "end": 5, "text": "hi"},
+        {"start": 11, "end": 11, "text": "!"},
+    ])
+    assert response.status_code == 200
+    assert response.json()["version"] == note["version"] + 1
+    assert content_of(client, headers, note) == "hi world!, goodbye moon"
+
+def test_stale_base_version_conflicts(client, headers):
+    note = create(client, headers, "abc")
+    assert patch(client, headers, note, [{"start": 0, "end": 1, "text": "x"}]).status_code == 200
+    response = patch(client, headers, note, [{"start": 1, "end": 2, "text": "y"}])
+    assert response.status_code == 409
+    assert response.json()["detail"]["version"] == note["version"] + 1
+    assert content_of(client, headers, note) == "xbc"
+
+def test_overlapping_edits_are_rejected(client, headers):
+    note = create(client, headers, "abcdef")
+    response = patch(client, headers, note, [{"start": 0, "end": 3, "text": "x"}, {"start": 2, "end": 4, "text": "y"}])
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Edits overlap"
+    assert content_of(client, headers, note) == "abcdef"
+
+def test_offsets_are_utf16_units(client, headers):
+    # The emoji is two UTF-16 code units
+    note = create(client, headers, "a😀b")
+    response = patch(client, headers, note, [{"start": 3, "end": 4, "text": "c"}])
+    assert response.status_code == 200
+    assert content_of(client, headers, note) == "a😀c"
+
+def test_splitting_a_surrogate_pair_is_rejected(client, headers):
+    note = create(client, headers, "a😀b")
+    response = patch(client, headers, note, [{"start": 2, "end": 2, "text": "x"}])
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Edit splits a surrogate pair"
+    assert content_of(client, headers, note) == "a😀b"
@@ -0,0 +1,71 @@
+from app import etags
+
+# Identity encoding: compressed responses carry weakened tags (see test_compression)
+IDENTITY = {"Accept-Encoding": "identity"}
+
+def make_folder(client, headers) -> tuple:
+    """A folder holding a subfolder with one note, and a second root folder"""
+    folder = client.post("/notes/", json={"title": "Folder", "is_folder": True}, headers=headers).json()
+    sub = client.post("/notes/", json={"title": "Sub", "is_folder": True, "parent_id": folder["id"]},
+                      headers=headers).json()
+    note = client.post("/notes/", json={"title": "Deep", "content": "x", "parent_id": sub["id"]},
+                       headers=headers).json()
+    other = client.post("/notes/", json={"title": "Other", "is_folder": True}, headers=headers).json()
+    return folder, sub, note, other
+
+def fetch(client, headers, url: str, etag: str = None):
+    extra = {"If-None-Match": etag} if etag else {}
+    return client.get(url, headers={**headers, **IDENTITY, **extra})
+
+def test_unchanged_subtree_is_not_modified(client, headers):
+    folder, *_ = make_folder(client, headers)
+    for url in (f"/notes/{folder['id']}", f"/notes/{folder['id']}/children", "/notes/"):
+        first = fetch(client, headers, url)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        assert etag.startswith('"') and not etag.startswith("W/")
+        assert first.headers["Cache-Control"] == "private, no-cache"
+        again = fetch(client, headers, url, etag)
+        assert again.status_code == 304
+        assert again.content == b""
+        assert again.headers["ETag"] == etag
+        # Weak and listed forms of the same tag match too
+        assert fetch(client, headers, url, f'"nope", W/{etag}').status_code == 304
+
+def test_changes_below_a_folder_give_it_a_new_tag(client, headers):
+    folder, sub, note, other = make_folder(client, headers)
+    url = f"/notes/{folder['id']}"
+    tags = [fetch(client, headers, url).headers["ETag"]]
+
+    def assert_new_tag():
+        response = fetch(client, headers, url, tags[-1])
+        assert response.status_code == 200
+        assert response.headers["ETag"] != tags[-1]
+        tags.append(response.headers["ETag"])
+
+    # An edit two levels down
+    client.put(f"/notes/{note['id']}", json={"content": "edited"}, headers=headers)
+    assert_new_tag()
+    # A move out of the subtree, then back in
+    client.put(f"/notes/{note['id']}", json={"parent_id": other["id"]}, headers=headers)
+    assert_new_tag()
+    client.put(f"/notes/{note['id']}", json={"parent_id": sub["id"]}, headers=headers)
+    assert_new_tag()
+    # A delete
+    client.delete(f"/notes/{note['id']}", headers=headers)
+    assert_new_tag()
+
+def test_tags_differ_per_owner_and_variant(client, headers):
+    folder, *_ = make_folder(client, headers)
+    plain = fetch(client, headers, f"/notes/{folder['id']}").headers["ETag"]
+    shallow = fetch(client, headers, f"/notes/{folder['id']}?depth=0").headers["ETag"]
+    assert plain != shallow
+    assert etags.make_etag(1, "root") != etags.make_etag(2, "root")
+
+def test_matches_follows_weak_comparison():
+    tag = etags.make_etag("x")
+    assert etags.matches(tag, tag)
+    assert etags.matches(f"W/{tag}", tag)
+    assert etags.matches("*", tag)
+    assert not etags.matches(None, tag)
+    assert not etags.matches('"other"', tag)
@@ -0,0 +1,56 @@
+import json
+from app import folder_stats
+from app.database import SessionLocal
+
+def mismatches(client, headers) -> int:
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        return folder_stats.check(db, owner_id)["mismatches"]
+    finally:
+        db.close()
+
+def folders(client, headers, parent_id=None) -> dict:
+    params = {} if parent_id is None else {"parent_id": parent_id}
+    listed = client.get("/notes/folders", params=params, headers=headers).json()
+    return {folder["title"]: (folder["child_count"], folder["descendant_count"]) for folder in listed}
+
+def test_every_write_path_keeps_stats_exact(client, headers):
+    def post(**note):
+        return client.post("/notes/", json=note, headers=headers).json()
+
+    first = post(title="First", is_folder=True)
+    second = post(title="Second", is_folder=True)
+    sub = post(title="Sub", is_folder=True, parent_id=first["id"])
+    leaf = post(title="Leaf", content="hello", parent_id=sub["id"])
+    assert mismatches(client, headers) == 0
+    assert folders(client, headers)["First"] == (1, 2)
+
+    updated = client.put(f"/notes/{leaf['id']}", json={"content": "a longer body"}, headers=headers)
+    assert updated.status_code == 200
+    assert mismatches(client, headers) == 0
+    patched = client.patch(f"/notes/{leaf['id']}", json={"base_version": updated.json()["version"],
+                                                         "edits": [{"start": 0, "end": 1, "text": "the"}]},
+                           headers=headers)
+    assert patched.status_code == 200
+    assert mismatches(client, headers) == 0
+
+    # Out to the root level, then into a sibling
+    assert client.put(f"/notes/{sub['id']}", json={"parent_id": None}, headers=headers).status_code == 200
+    assert mismatches(client, headers) == 0
+    assert folders(client, headers)["First"] == (0, 0)
+    assert client.put(f"/notes/{sub['id']}", json={"parent_id": second["id"]}, headers=headers).status_code == 200
+    assert mismatches(client, headers) == 0
+    assert folders(client, headers)["Second"] == (1, 2)
+
+    assert client.delete(f"/notes/{second['id']}", headers=headers).status_code == 200
+    assert mismatches(client, headers) == 0
+
+    body = "\n".join(json.dumps(item) for item in [
+        {"id": 1, "title": "Imported", "is_folder": True},
+        {"id": 2, "parent_id": 1, "title": "Inside", "content": "imported body"},
+    ]).encode()
+    response = client.post("/notes/import", params={"parent_id": first["id"]}, content=body, headers=headers)
+    assert response.status_code == 200
+    assert mismatches(client, headers) == 0
+    assert folders(client, headers) == {"First": (1, 2)}
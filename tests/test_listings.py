@@ -0,0 +1,46 @@
+def make_tree(client, headers):
+    """Two root folders, each with a few notes carrying a sizeable body"""
+    for f in range(2):
+        folder = client.post("/notes/", json={"title": f"Folder {f}", "is_folder": True}, headers=headers).json()
+        for n in range(3):
+            client.post("/notes/", json={"title": f"Note {n}", "content": "body " * 200, "parent_id": folder["id"]},
+                        headers=headers)
+    return folder
+
+def test_root_page_leaves_out_bodies_and_subtrees(client, headers):
+    make_tree(client, headers)
+    response = client.get("/notes/", params={"limit": 1}, headers=headers)
+    assert response.status_code == 200
+    notes = response.json()
+    assert len(notes) == 1
+    assert notes[0]["children"] == []
+    assert not notes[0].get("content")
+    assert response.headers["X-Next-Cursor"]
+    # One bare note: nowhere near the bodies below it
+    assert len(response.content) < 500
+
+def test_page_defaults_match_explicit_params(client, headers):
+    make_tree(client, headers)
+    default = client.get("/notes/", params={"limit": 1}, headers=headers)
+    explicit = client.get("/notes/", params={"limit": 1, "depth": 0, "include_content": False}, headers=headers)
+    assert default.content == explicit.content
+
+def test_children_page_leaves_out_bodies(client, headers):
+    folder = make_tree(client, headers)
+    response = client.get(f"/notes/{folder['id']}/children", params={"limit": 2}, headers=headers)
+    assert response.status_code == 200
+    assert [note.get("content") for note in response.json()] == [None, None]
+    assert len(response.content) < 1000
+
+def test_page_can_ask_for_bodies(client, headers):
+    make_tree(client, headers)
+    response = client.get("/notes/", params={"limit": 1, "depth": 1, "include_content": True}, headers=headers)
+    children = response.json()[0]["children"]
+    assert len(children) == 3
+    assert children[0]["content"] == "body " * 200
+
+def test_full_tree_keeps_bodies(client, headers):
+    make_tree(client, headers)
+    notes = client.get("/notes/", headers=headers).json()
+    assert len(notes) == 2
+    assert notes[0]["children"][0]["content"] == "body " * 200
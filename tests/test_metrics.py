@@ -0,0 +1,65 @@
+import logging
+import re
+import pytest
+from app import metrics
+from app.config import settings
+
+# name{labels} value, as in the Prometheus text format
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_]+="[^"]*"(,[a-zA-Z_]+="[^"]*")*\})? (\+Inf|-?[0-9.e+-]+)$')
+
+@pytest.fixture
+def request_logs(caplog, monkeypatch):
+    """Request log fields, one dict per logged request"""
+    monkeypatch.setattr(settings, "LOG_FORMAT", "json")
+    caplog.set_level(logging.INFO, logger=metrics.logger.name)
+    return lambda: [record.fields for record in caplog.records if record.name == metrics.logger.name]
+
+def make_note(client, headers) -> dict:
+    return client.post("/notes/", json={"title": "Measured", "content": "x"}, headers=headers).json()
+
+def test_scrape_is_valid_exposition(client, headers):
+    note = make_note(client, headers)
+    client.get(f"/notes/{note['id']}", headers=headers)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "text/plain; version=0.0.4; charset=utf-8"
+    lines = response.text.splitlines()
+    for line in lines:
+        assert line.startswith("# HELP ") or line.startswith("# TYPE ") or SAMPLE_RE.match(line), line
+    text = response.text
+    assert "# TYPE http_request_duration_seconds histogram" in text
+    assert 'http_request_duration_seconds_count{method="GET",route="/notes/{note_id}",status="200"}' in text
+    assert 'http_request_sql_queries_bucket{route="/notes/{note_id}",le="+Inf"}' in text
+    assert 'db_query_duration_seconds_count{engine="' in text
+    assert "piston_executions_running " in text
+    assert re.search(r'^db_pool_size\{engine="sync"\} \d+$', text, re.M)
+
+def test_each_request_counts_its_own_statements(client, headers, request_logs):
+    note = make_note(client, headers)
+    client.get(f"/notes/{note['id']}", headers=headers)
+    logged = [fields for fields in request_logs() if fields["route"] == "/notes/{note_id}"]
+    assert len(logged) == 1
+    # The subtree fingerprint and the tree itself, at least
+    assert logged[0]["sql_queries"] >= 2
+    assert logged[0]["sql_ms"] > 0
+    assert logged[0]["status"] == 200
+
+def test_serialization_is_timed_for_json_bodies_only(client, headers):
+    note = make_note(client, headers)
+    route = "/notes/{note_id}"
+    before = metrics.SERIALIZE_DURATION.summary(route)["count"]
+    etag = client.get(f"/notes/{note['id']}", headers=headers).headers["etag"]
+    assert metrics.SERIALIZE_DURATION.summary(route)["count"] == before + 1
+    # A 304 encodes nothing
+    assert client.get(f"/notes/{note['id']}", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert metrics.SERIALIZE_DURATION.summary(route)["count"] == before + 1
+
+def test_request_logs_are_sampled_but_slow_requests_always_logged(client, headers, request_logs, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_SAMPLE_RATE", 0.0)
+    client.get("/auth/me", headers=headers)
+    assert request_logs() == []
+    monkeypatch.setattr(settings, "LOG_SLOW_REQUEST_MS", 0.001)
+    client.get("/auth/me", headers=headers)
+    (fields,) = request_logs()
+    assert fields["route"] == "/auth/me" and fields["duration_ms"] > 0
+    assert set(fields) >= {"sql_queries", "pool_wait_ms", "upstream_ms", "serialize_ms"}
@@ -0,0 +1,44 @@
+from alembic import command
+from sqlalchemy import create_engine, text
+from app import migrations
+
+def migrate(engine, revision: str, down: bool = False):
+    with engine.begin() as conn:
+        (command.downgrade if down else command.upgrade)(migrations.alembic_config(conn), revision)
+
+def test_note_contents_round_trip(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/migrate.db")
+    migrate(engine, "0005")
+    bodies = {1: "short", 2: "short", 3: "long body " * 200, 4: "", 5: None}
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'm@example.com', 'x')"))
+        conn.execute(text("INSERT INTO notes (id, title, content, is_folder, owner_id) VALUES (:id, 't', :content, 0, 1)"),
+                     [{"id": note_id, "content": content} for note_id, content in bodies.items()])
+
+    migrate(engine, "0006")
+    with engine.connect() as conn:
+        stored = dict(conn.execute(text("SELECT size, encoding FROM note_contents")).all())
+        hashes = dict(conn.execute(text("SELECT id, content_hash FROM notes")).all())
+    # Identical bodies are stored once, long ones compressed, empty ones not at all
+    assert stored == {len("short"): "raw", len("long body " * 200): "zlib"}
+    assert hashes[1] == hashes[2] and hashes[4] is None and hashes[5] is None
+
+    migrate(engine, "0005", down=True)
+    with engine.connect() as conn:
+        restored = dict(conn.execute(text("SELECT id, content FROM notes")).all())
+    assert restored == {1: "short", 2: "short", 3: "long body " * 200, 4: "", 5: ""}
+
+def test_upgrade_to_head(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path}/head.db")
+    migrate(engine, "0001")
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO users (id, email, hashed_password) VALUES (1, 'm@example.com', 'x')"))
+        conn.execute(text("INSERT INTO notes (id, title, content, is_folder, owner_id, parent_id) VALUES "
+                          "(1, 'Folder', '', 1, 1, NULL), (2, 'Note', 'needle in here', 0, 1, 1)"))
+    migrate(engine, "head")
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'owner : u1 AND needle'")).scalars().all() == [2]
+        assert conn.execute(text("SELECT path FROM notes WHERE id = 2")).scalar() == "/1/"
+        assert conn.execute(text(
+            "SELECT child_count, descendant_count, content_bytes FROM folder_stats WHERE folder_id = 1"
+        )).one() == (1, 1, len("needle in here"))
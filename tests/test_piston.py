@@ -0,0 +1,254 @@
+import asyncio
+import itertools
+import json
+import time
+import uuid
+import pytest
+from fastapi import HTTPException
+from app import cache, piston, schemas
+from app.config import settings
+from benchmarks import stub_piston
+
+def fake_upstream(monkeypatch) -> dict:
+    """Replace the Piston call with one that waits until released"""
+    state = {"calls": 0, "cancelled": 0, "release": None}
+
+    async def execute(payload: dict) -> dict:
+        state["calls"] += 1
+        try:
+            await state["release"].wait()
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return {"run": {"stdout": payload["stdin"], "signal": None}}
+
+    monkeypatch.setattr(piston, "execute", execute)
+    return state
+
+def make_request() -> schemas.ExecuteRequest:
+    return schemas.ExecuteRequest(language="python", files=[{"content": "print(input())"}], stdin=uuid.uuid4().hex)
+
+def test_waiters_survive_the_first_caller_being_cancelled(monkeypatch):
+    upstream = fake_upstream(monkeypatch)
+    request = make_request()
+
+    async def run():
+        upstream["release"] = asyncio.Event()
+        first = asyncio.create_task(piston.execute_cached(request, 1))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(piston.execute_cached(request, 2))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        upstream["release"].set()
+        return await second, first.cancelled()
+
+    (result, status), first_cancelled = asyncio.run(run())
+    assert first_cancelled
+    assert status == "HIT"
+    assert result["run"]["stdout"] == request.stdin
+    assert upstream == dict(upstream, calls=1, cancelled=0)
+    assert not piston._pending
+
+def test_upstream_call_stops_once_every_caller_is_gone(monkeypatch):
+    upstream = fake_upstream(monkeypatch)
+    request = make_request()
+
+    async def run():
+        upstream["release"] = asyncio.Event()
+        callers = [asyncio.create_task(piston.execute_cached(request, user_id)) for user_id in (1, 2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        # A later caller starts afresh instead of joining the cancelled call
+        upstream["release"].set()
+        return await piston.execute_cached(request, 1)
+
+    result, status = asyncio.run(run())
+    assert status == "MISS"
+    assert upstream == dict(upstream, calls=2, cancelled=1)
+    assert not piston._pending
+
+def test_one_users_limit_does_not_fail_the_others(monkeypatch):
+    upstream = fake_upstream(monkeypatch)
+    monkeypatch.setattr(piston, "limiter", piston.ExecutionLimiter(
+        max_concurrency=4, max_per_user=1, max_queue=10, queue_timeout=5))
+    busy, shared, fresh = make_request(), make_request(), make_request()
+
+    async def outcome(request, user_id):
+        try:
+            return await piston.execute_cached(request, user_id)
+        except HTTPException as e:
+            return e.status_code
+
+    async def run():
+        upstream["release"] = asyncio.Event()
+        # User 1 is at their limit of one execution
+        holding = asyncio.create_task(outcome(busy, 1))
+        started = asyncio.create_task(outcome(shared, 2))
+        await asyncio.sleep(0)
+        # Joining another user's call, and starting one, count against user 1 alone
+        joined = await outcome(shared, 1)
+        refused = await outcome(fresh, 1)
+        assert piston.execution_key(fresh) not in piston._pending
+        others = [asyncio.create_task(outcome(request, user_id)) for request, user_id in ((shared, 3), (fresh, 4))]
+        await asyncio.sleep(0)
+        upstream["release"].set()
+        return joined, refused, await holding, await started, *[await task for task in others]
+
+    joined, refused, holding, started, shared_hit, fresh_miss = asyncio.run(run())
+    assert (joined, refused) == (429, 429)
+    assert holding[1] == "MISS" and started[1] == "MISS"
+    assert shared_hit == (started[0], "HIT")
+    assert fresh_miss[1] == "MISS" and fresh_miss[0]["run"]["stdout"] == fresh.stdin
+    assert upstream["calls"] == 3
+    assert not piston._pending
+
+def test_blocking_result_cache_stays_off_the_event_loop(monkeypatch):
+    upstream = fake_upstream(monkeypatch)
+    calls = []
+
+    class RecordingCache(cache.TTLCache):
+        blocking = True
+
+        def get(self, key):
+            calls.append(running_loop())
+            return super().get(key)
+
+        def set(self, key, value):
+            calls.append(running_loop())
+            super().set(key, value)
+
+    recording = RecordingCache("recording-executions", maxsize=10, ttl=60)
+    cache.caches.pop(recording.name)
+    monkeypatch.setattr(piston, "result_cache", recording)
+    request = make_request()
+
+    async def run():
+        upstream["release"] = asyncio.Event()
+        upstream["release"].set()
+        return [(await piston.execute_cached(request, 1))[1] for _ in range(2)]
+
+    assert asyncio.run(run()) == ["MISS", "HIT"]
+    assert calls == [False, False, False]
+
+def running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+# Against the local stub Piston server
+
+@pytest.fixture
+def stubs(monkeypatch):
+    """Two stub upstreams, round-robined, behind a fresh pooled client and limiter"""
+    servers = [stub_piston.start(delay=0.2), stub_piston.start(delay=0.2)]
+    monkeypatch.setattr(piston, "_upstreams", itertools.cycle([stub_piston.url(server) for server in servers]))
+    monkeypatch.setattr(piston, "_client", None)
+    monkeypatch.setattr(piston, "limiter", piston.ExecutionLimiter(
+        max_concurrency=1, max_per_user=10, max_queue=1, queue_timeout=5))
+    yield servers
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def run_with_client(coroutine):
+    """Run a test body, closing the pooled client inside the same event loop"""
+    async def run():
+        try:
+            return await coroutine
+        finally:
+            await piston.close_client()
+    return asyncio.run(run())
+
+async def timed(request, user_id) -> tuple:
+    start = time.perf_counter()
+    try:
+        outcome = (await piston.execute_cached(request, user_id))[1]
+    except HTTPException as e:
+        outcome = e.status_code
+    return outcome, time.perf_counter() - start
+
+def test_upstreams_are_round_robined_over_pooled_connections(stubs):
+    for server in stubs:
+        server.delay = 0
+
+    async def run():
+        for _ in range(6):
+            await piston.execute(make_request().model_dump())
+
+    run_with_client(run())
+    assert [server.requests_served for server in stubs] == [3, 3]
+    # Keep-alive: one connection per upstream, reused for every call
+    assert [server.connections for server in stubs] == [1, 1]
+
+def test_full_queue_is_refused_without_waiting(stubs):
+    async def run():
+        tasks = [asyncio.create_task(timed(make_request(), user_id)) for user_id in (1, 2, 3)]
+        return await asyncio.gather(*tasks)
+
+    (first, _), (queued, queued_wait), (refused, refused_wait) = run_with_client(run())
+    # One runs, one waits for its slot, the third finds the queue full
+    assert (first, queued, refused) == ("MISS", "MISS", 429)
+    assert queued_wait >= 0.3
+    assert refused_wait < 0.1
+    assert sum(server.requests_served for server in stubs) == 2
+    assert piston.limiter.stats() == {"running": 0, "waiting": 0, "rejected": 1}
+
+def test_queue_timeout_applies_backpressure(stubs, monkeypatch):
+    monkeypatch.setattr(piston.limiter, "max_queue", 5)
+    monkeypatch.setattr(piston.limiter, "queue_timeout", 0.05)
+
+    async def run():
+        return await asyncio.gather(*[timed(make_request(), user_id) for user_id in (1, 2)])
+
+    (first, _), (timed_out, waited) = run_with_client(run())
+    assert (first, timed_out) == ("MISS", 429)
+    assert 0.05 <= waited < 0.2
+
+def test_user_over_their_limit_is_refused_at_once(stubs, monkeypatch):
+    monkeypatch.setattr(piston.limiter, "max_per_user", 1)
+
+    async def run():
+        return await asyncio.gather(*[timed(make_request(), 1) for _ in range(2)])
+
+    (first, _), (refused, waited) = run_with_client(run())
+    assert (first, refused) == ("MISS", 429)
+    assert waited < 0.1
+    assert sum(server.requests_served for server in stubs) == 1
+
+def test_batch_streams_each_item_as_it_completes(client, headers, stubs, monkeypatch):
+    monkeypatch.setattr(piston.limiter, "max_concurrency", 4)
+    cached, slow, other_slow = make_request(), make_request(), make_request()
+    unknown = schemas.ExecuteRequest(language="cobol", files=[{"content": "DISPLAY 'HI'."}])
+    try:
+        assert client.post("/notes/execute", json=cached.model_dump(), headers=headers).headers["X-Cache"] == "MISS"
+        batch = {"requests": [request.model_dump() for request in (slow, unknown, other_slow, cached)]}
+        with client.stream("POST", "/notes/execute/batch", json=batch, headers=headers) as response:
+            assert response.status_code == 200
+            assert response.headers["content-type"] == "application/x-ndjson"
+            lines = [json.loads(line) for line in response.iter_lines() if line]
+    finally:
+        client.portal.call(piston.close_client)
+
+    # Completion order: the cached hit, the refused runtime, then the two runs
+    assert [line["index"] for line in lines[:2]] == [3, 1]
+    assert sorted(line["index"] for line in lines[2:]) == [0, 2]
+    by_index = {line["index"]: line for line in lines}
+    assert by_index[3] == dict(by_index[3], status=200, cache="HIT")
+    assert by_index[1]["status"] == 502 and "runtime is unknown" in by_index[1]["error"]
+    for index, request in ((0, slow), (2, other_slow)):
+        assert by_index[index]["status"] == 200 and by_index[index]["cache"] == "MISS"
+        assert by_index[index]["result"]["run"]["stdout"].endswith(request.stdin)
+    assert sum(server.requests_served for server in stubs) == 4
+
+def test_batch_size_is_validated_before_running(client, headers, stubs):
+    too_many = [make_request().model_dump() for _ in range(settings.EXECUTE_BATCH_MAX_ITEMS + 1)]
+    for requests in (too_many, []):
+        response = client.post("/notes/execute/batch", json={"requests": requests}, headers=headers)
+        assert response.status_code == 422
+    assert sum(server.requests_served for server in stubs) == 0
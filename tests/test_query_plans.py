@@ -0,0 +1,72 @@
+import re
+import uuid
+import pytest
+from sqlalchemy import insert, select, text
+from app import folder_stats, models, pagination, tree
+from app.database import SessionLocal, engine
+
+# Query-plan regression test: every hot notes query must be answered from
+# an index, never by a full scan of notes.
+
+def hot_queries(owner_id: int, folder_id: int) -> dict:
+    dialect_name = engine.dialect.name
+    note = models.Note
+    listing = tree.subtree_cte(owner_id)
+    children = tree.subtree_cte(owner_id, children_of=folder_id, depth=1)
+    page = pagination.apply_keyset(
+        select(note.id).where(note.owner_id == owner_id, note.parent_id == folder_id),
+        dialect_name,
+        pagination.encode_cursor("2100-01-01 00:00:00", 10 ** 9)
+    ).limit(50)
+    return {
+        "get_owned_note": select(note).where(note.id == folder_id, note.owner_id == owner_id),
+        "root tree (recursive CTE)": select(listing),
+        "children tree (recursive CTE)": select(children),
+        "children keyset page": page,
+        "subtree ids for delete (path prefix)": select(note.id).where(
+            note.owner_id == owner_id, tree.path_startswith(dialect_name, tree.descendant_prefix("/", folder_id))
+        ),
+        "ancestors (path ids)": select(*tree.LISTING_COLUMNS).where(note.id.in_([1, folder_id])),
+        "folder listing (folder_stats join)": select(*tree.LISTING_COLUMNS, *folder_stats.STATS_COLUMNS)
+            .join(models.FolderStats, models.FolderStats.folder_id == note.id)
+            .where(note.owner_id == owner_id, note.parent_id == None, note.is_folder.is_(True)),
+    }
+
+def explain(conn, statement) -> list:
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    return [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), params).all()]
+
+@pytest.fixture(scope="module")
+def target():
+    # Several owners so the planner sees owner_id as selective, as in production
+    prefix = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        targets = []
+        for u in range(20):
+            user = models.User(email=f"plans-{prefix}-{u}@example.com", hashed_password="x")
+            db.add(user)
+            db.flush()
+            folder = models.Note(title="folder", is_folder=True, owner_id=user.id, path="/")
+            db.add(folder)
+            db.flush()
+            db.execute(insert(models.Note), [
+                {"title": f"note {i}", "is_folder": False, "owner_id": user.id, "parent_id": folder.id,
+                 "path": tree.child_path(folder.path, folder.id)}
+                for i in range(200)
+            ])
+            targets.append((user.id, folder.id))
+        db.commit()
+        db.execute(text("ANALYZE"))
+        db.commit()
+    finally:
+        db.close()
+    return targets[0]
+
+@pytest.mark.parametrize("name", list(hot_queries(1, 1)))
+def test_hot_query_uses_an_index(target, name):
+    with engine.connect() as conn:
+        details = explain(conn, hot_queries(*target)[name])
+    full_scans = [detail for detail in details if re.match(r"SCAN (notes|n)\b", detail)]
+    assert not full_scans, "\n".join(details)
@@ -0,0 +1,50 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from app import ratelimit
+
+class RecordingStore(ratelimit.MemoryStore):
+    """A store that must not run on the event loop, like the SQLite and Redis ones"""
+
+    name = "recording"
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def hit(self, key, now, cost, period):
+        self.threads.append(threading.get_ident())
+        return super().hit(key, now, cost, period)
+
+@pytest.fixture
+def limited(monkeypatch):
+    store = RecordingStore()
+    monkeypatch.setattr(ratelimit, "RULES", {"test": ratelimit.Rule("test", 2, 60)})
+    monkeypatch.setattr(ratelimit, "store", store)
+    return store
+
+def test_blocking_store_runs_off_the_event_loop(limited):
+    async def run():
+        await ratelimit.check("test", "user:1")
+        return threading.get_ident()
+    loop_thread = asyncio.run(run())
+    assert limited.threads and loop_thread not in limited.threads
+
+def test_empty_bucket_raises_429_with_retry_after(limited):
+    async def run():
+        await ratelimit.check("test", "user:1")
+        await ratelimit.check("test", "user:1")
+        with pytest.raises(HTTPException) as rejected:
+            await ratelimit.check("test", "user:1")
+        return rejected.value
+    rejected = asyncio.run(run())
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+def test_store_errors_fail_open(limited, monkeypatch):
+    def broken(*args):
+        raise OSError("database is locked")
+    monkeypatch.setattr(limited, "hit", broken)
+    assert asyncio.run(ratelimit.retry_after("test", "user:1")) == 0.0
@@ -0,0 +1,118 @@
+import time
+import uuid
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from app import database, replicas
+from app.config import settings
+
+# The app only wires replicas in when DATABASE_REPLICA_URLS is set at import
+# time, so these tests mount the replica dependency and the sticky-write
+# middleware on an app of their own. The primary is the test database; each
+# replica is another SQLite file, told apart by a marker row.
+
+def make_marker(url: str, source: str):
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS replica_marker (source TEXT)"))
+        conn.execute(text("DELETE FROM replica_marker"))
+        conn.execute(text("INSERT INTO replica_marker VALUES (:source)"), {"source": source})
+    engine.dispose()
+
+def read_source(db) -> str:
+    return db.execute(text("SELECT source FROM replica_marker")).scalar()
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(replicas.StickyWritesMiddleware)
+
+    @app.get("/source")
+    async def source(db=Depends(replicas._get_replica_session)):
+        return await database.run_db(db, read_source)
+
+    @app.post("/write")
+    async def write(fail: bool = False):
+        if fail:
+            raise HTTPException(status_code=400, detail="Refused")
+        return {}
+
+    return app
+
+@pytest.fixture
+def replica_set(tmp_path, monkeypatch):
+    """Two replica files behind a fresh ReplicaSet"""
+    make_marker(database.SQLALCHEMY_DATABASE_URL, "primary")
+    urls = [f"sqlite:///{tmp_path}/replica{i}.db" for i in (1, 2)]
+    for i, url in enumerate(urls, 1):
+        make_marker(url, f"replica{i}")
+    replica_set = replicas.ReplicaSet(urls)
+    monkeypatch.setattr(replicas, "replica_set", replica_set)
+    yield replica_set
+    for replica in replica_set.replicas:
+        database.extra_engines.pop(replica.name, None)
+        replica.sync_engine.dispose()
+
+@pytest.fixture
+def app_client():
+    with TestClient(build_app()) as client:
+        yield client
+
+def auth() -> dict:
+    return {"Authorization": f"Bearer {uuid.uuid4().hex}"}
+
+def sources(client, headers: dict, reads: int = 4) -> list:
+    return [client.get("/source", headers=headers).json() for _ in range(reads)]
+
+def test_reads_rotate_over_the_replicas(replica_set, app_client):
+    assert sources(app_client, auth()) == ["replica1", "replica2", "replica1", "replica2"]
+    assert replica_set.primary_reads == 0
+
+def test_a_writer_reads_its_own_writes_from_the_primary(replica_set, app_client):
+    headers = auth()
+    response = app_client.post("/write", headers=headers)
+    until = float(response.cookies[replicas.STICKY_COOKIE])
+    assert until == pytest.approx(time.time() + settings.REPLICA_STICKY_SECONDS, abs=1)
+    assert sources(app_client, headers, reads=2) == ["primary", "primary"]
+    # The cookie alone (another worker, which never saw the header) ...
+    app_client.cookies.set(replicas.STICKY_COOKIE, str(until))
+    assert sources(app_client, auth(), reads=1) == ["primary"]
+    # ... and the header alone (a client that drops cookies)
+    app_client.cookies.clear()
+    assert sources(app_client, headers, reads=1) == ["primary"]
+    assert sources(app_client, auth(), reads=1)[0].startswith("replica")
+    assert replica_set.primary_reads == 4
+
+def test_stickiness_ends_with_the_cookie(replica_set, app_client):
+    for value in (str(time.time() - 1), "garbage"):
+        app_client.cookies.set(replicas.STICKY_COOKIE, value)
+        assert sources(app_client, auth(), reads=1)[0].startswith("replica")
+    app_client.cookies.clear()
+    # Failed writes change nothing, so they do not stick
+    headers = auth()
+    response = app_client.post("/write", params={"fail": True}, headers=headers)
+    assert response.status_code == 400
+    assert replicas.STICKY_COOKIE not in response.cookies
+    assert sources(app_client, headers, reads=1)[0].startswith("replica")
+
+def test_unhealthy_replicas_are_skipped_until_they_answer_again(replica_set, app_client):
+    first, second = replica_set.replicas
+    first.mark_down(RuntimeError("gone"))
+    assert sources(app_client, auth()) == ["replica2"] * 4
+    second.mark_down(RuntimeError("gone"))
+    assert sources(app_client, auth(), reads=2) == ["primary", "primary"]
+    assert replica_set.primary_reads == 2
+    # A good ping brings a replica back
+    app_client.portal.call(first.ping)
+    assert first.healthy and not second.healthy
+    assert sources(app_client, auth(), reads=2) == ["replica1", "replica1"]
+    assert replica_set.stats()["replicas"] == {"replica1": {"healthy": True}, "replica2": {"healthy": False}}
+
+def test_a_failing_ping_marks_a_replica_down(replica_set, app_client, tmp_path):
+    broken = replicas.Replica("replica-broken", f"sqlite:///{tmp_path}/missing/dir/notes.db")
+    try:
+        app_client.portal.call(broken.ping)
+        assert not broken.healthy
+    finally:
+        database.extra_engines.pop(broken.name, None)
+        broken.sync_engine.dispose()
@@ -0,0 +1,90 @@
+from sqlalchemy import text
+from app import search
+from app.database import SessionLocal
+
+def find(client, headers, q: str) -> list:
+    response = client.get("/notes/search", params={"q": q}, headers=headers)
+    assert response.status_code == 200
+    return response.json()
+
+def login(client, email: str) -> str:
+    signup = client.post("/auth/signup", json={"email": email, "password": "pw"})
+    assert signup.status_code in (200, 400)
+    return client.post("/auth/login", data={"username": email, "password": "pw"}).json()["access_token"]
+
+def test_hits_are_highlighted(client, headers):
+    client.post("/notes/", json={"title": "Python generators", "content": "Notes on lazy generators and yield"},
+                headers=headers)
+    hits = find(client, headers, "generat")
+    assert len(hits) == 1
+    assert hits[0]["title_highlight"] == "Python <mark>generators</mark>"
+    assert "<mark>generators</mark>" in hits[0]["snippet"]
+    assert hits[0]["rank"] > 0
+
+def test_search_is_per_owner(client, headers):
+    client.post("/notes/", json={"title": "Private", "content": "zebracorn"}, headers=headers)
+    token = login(client, "other-search@example.com")
+    assert find(client, {"Authorization": f"Bearer {token}"}, "zebracorn") == []
+    assert len(find(client, headers, "zebracorn")) == 1
+
+def test_ranking_is_per_owner(client, headers):
+    other = {"Authorization": f"Bearer {login(client, 'other-ranking@example.com')}"}
+    # Another user's notes match the same word more strongly
+    for _ in range(3):
+        client.post("/notes/", json={"title": "Marmot", "content": "marmot marmot"}, headers=other)
+    in_body = client.post("/notes/", json={"title": "Rodents", "content": "a marmot"}, headers=headers).json()
+    in_title = client.post("/notes/", json={"title": "Marmot facts", "content": "burrows"}, headers=headers).json()
+    hits = find(client, headers, "marmot")
+    assert [hit["id"] for hit in hits] == [in_title["id"], in_body["id"]]
+    assert hits[0]["rank"] > hits[1]["rank"]
+    assert len(find(client, other, "marmot")) == 3
+    # The owner token is not searchable as a term
+    me = client.get("/auth/me", headers=headers).json()["id"]
+    assert find(client, headers, f"u{me}") == []
+
+def test_updates_and_deletes_reach_the_index(client, headers):
+    note = client.post("/notes/", json={"title": "T", "content": "quokka"}, headers=headers).json()
+    client.put(f"/notes/{note['id']}", json={"content": "wombat"}, headers=headers)
+    assert find(client, headers, "quokka") == []
+    assert [hit["id"] for hit in find(client, headers, "wombat")] == [note["id"]]
+    client.delete(f"/notes/{note['id']}", headers=headers)
+    assert find(client, headers, "wombat") == []
+
+def test_long_body_snippet_is_a_window(client, headers):
+    body = " ".join(["filler"] * 100 + ["needle"] + ["filler"] * 100)
+    client.post("/notes/", json={"title": "Long", "content": body}, headers=headers)
+    snippet = find(client, headers, "needle")[0]["snippet"]
+    assert "<mark>needle</mark>" in snippet
+    assert snippet.startswith("…") and snippet.endswith("…")
+    assert len(snippet) < 200
+
+def test_index_does_not_copy_bodies_where_sqlite_allows():
+    db = SessionLocal()
+    try:
+        version = tuple(int(part) for part in db.execute(text("SELECT sqlite_version()")).scalar().split("."))
+        assert search.fts_stores_text(db) == (version < (3, 43, 0))
+    finally:
+        db.close()
+
+def test_fallback_scan_matches_titles_in_sql_and_caps_the_body_scan(client, headers, monkeypatch):
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    old_title = client.post("/notes/", json={"title": "Old Capybara", "content": "x"}, headers=headers).json()
+    old_body = client.post("/notes/", json={"title": "Old", "content": "a capybara"}, headers=headers).json()
+    for _ in range(3):
+        client.post("/notes/", json={"title": "Filler", "content": "nothing"}, headers=headers)
+    new_body = client.post("/notes/", json={"title": "New", "content": "capybara herd"}, headers=headers).json()
+    monkeypatch.setattr(search, "SCAN_MAX_ROWS", 2)
+    db = SessionLocal()
+    try:
+        hits = search.scan_notes(db, owner_id, "CAPYBARA")
+        # Title matches come first whatever their age; bodies only among the newest notes
+        assert [hit["id"] for hit in hits] == [old_title["id"], new_body["id"]]
+        assert hits[1]["snippet"] == "capybara herd"
+        assert [hit["id"] for hit in search.scan_notes(db, owner_id, "capybara", limit=1, offset=1)] == [new_body["id"]]
+        monkeypatch.setattr(search, "SCAN_MAX_ROWS", 100)
+        assert old_body["id"] in [hit["id"] for hit in search.scan_notes(db, owner_id, "capybara")]
+    finally:
+        db.close()
+
+def test_boolean_query_requires_every_term():
+    assert search._boolean_query('lazy "gen-erators"') == "+lazy +gen +erators*"
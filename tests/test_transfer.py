@@ -0,0 +1,103 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from fastapi import HTTPException
+from app import database, folder_stats, transfer
+from app.config import settings
+from app.database import SessionLocal
+
+def ndjson(items) -> bytes:
+    return "\n".join(json.dumps(item) for item in items).encode()
+
+def stats_check(owner_id: int) -> dict:
+    db = SessionLocal()
+    try:
+        return folder_stats.check(db, owner_id)
+    finally:
+        db.close()
+
+def owner_of(client, headers) -> int:
+    return client.get("/auth/me", headers=headers).json()["id"]
+
+def test_import_remaps_ids_under_a_parent(client, headers):
+    target = client.post("/notes/", json={"title": "Target", "is_folder": True}, headers=headers).json()
+    body = ndjson([
+        {"id": 10, "title": "Folder", "is_folder": True},
+        {"id": 11, "parent_id": 10, "title": "Note", "content": "hello"},
+    ])
+    response = client.post("/notes/import", params={"parent_id": target["id"]}, content=body, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    children = client.get(f"/notes/{target['id']}", headers=headers).json()["children"]
+    assert [child["title"] for child in children] == ["Folder"]
+    assert children[0]["children"][0]["content"] == "hello"
+    assert stats_check(owner_of(client, headers))["mismatches"] == 0
+
+def test_failed_import_writes_nothing(client, headers):
+    target = client.post("/notes/", json={"title": "Target", "is_folder": True}, headers=headers).json()
+    # More than one chunk is fed before the bad line is reached
+    items = [{"id": 1, "title": "Folder", "is_folder": True}]
+    items += [{"id": i, "parent_id": 1, "title": f"Note {i}", "content": "x"}
+              for i in range(2, transfer.IMPORT_CHUNK_SIZE * 2 + 2)]
+    # Sent in two parts, so the first is spooled before the bad line arrives
+    parts = iter([ndjson(items) + b"\n", ndjson([{"id": 5, "title": "duplicate"}])])
+    response = client.post("/notes/import", params={"parent_id": target["id"]}, content=parts, headers=headers)
+    assert response.status_code == 422
+    assert client.get(f"/notes/{target['id']}", headers=headers).json()["children"] == []
+    assert stats_check(owner_of(client, headers))["mismatches"] == 0
+    folders = client.get("/notes/folders", headers=headers).json()
+    assert [(folder["title"], folder["descendant_count"]) for folder in folders] == [("Target", 0)]
+
+def test_import_rejects_children_of_a_note(client, headers):
+    body = ndjson([
+        {"id": 1, "title": "Plain note", "content": "x"},
+        {"id": 2, "parent_id": 1, "title": "Child"},
+    ])
+    response = client.post("/notes/import", content=body, headers=headers)
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Line 2: parent 1 is not a folder"
+    assert client.get("/notes/", headers=headers).json() == []
+
+def test_import_into_a_parent_deleted_meanwhile(client, headers):
+    target = client.post("/notes/", json={"title": "Target", "is_folder": True}, headers=headers).json()
+    importer = transfer.Importer(owner_of(client, headers), target["id"], 10)
+    try:
+        importer.feed([ndjson([{"id": 1, "title": "Note"}])])
+        # The parent goes between the request's check and the write
+        client.delete(f"/notes/{target['id']}", headers=headers)
+        db = SessionLocal()
+        try:
+            with pytest.raises(HTTPException) as raised:
+                importer.write(db)
+        finally:
+            db.close()
+    finally:
+        importer.close()
+    assert raised.value.status_code == 404
+    assert client.get("/notes/", headers=headers).json() == []
+
+def test_writes_proceed_alongside_a_large_import(client, headers):
+    items = [{"id": 1, "title": "Bulk", "is_folder": True}]
+    items += [{"id": i, "parent_id": 1, "title": f"Note {i}", "content": f"body {i}"}
+              for i in range(2, transfer.IMPORT_CHUNK_SIZE * 3)]
+    queued_before = database.write_queue.writes if database.write_queue else 0
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        imported = pool.submit(client.post, "/notes/import", content=ndjson(items), headers=headers)
+        created = [pool.submit(client.post, "/notes/", json={"title": f"Concurrent {i}"}, headers=headers)
+                   for i in range(20)]
+        assert imported.result().json()["imported"] == len(items)
+        assert [response.result().status_code for response in created] == [200] * 20
+    if database.write_queue:
+        # The import ran on its own connection, not in a group commit
+        assert database.write_queue.writes - queued_before == 20
+    titles = [note["title"] for note in client.get("/notes/", params={"depth": 0}, headers=headers).json()]
+    assert sorted(titles) == sorted(["Bulk"] + [f"Concurrent {i}" for i in range(20)])
+    assert stats_check(owner_of(client, headers))["mismatches"] == 0
+
+def test_busy_timeout_covers_the_longest_import(monkeypatch):
+    monkeypatch.setattr(settings, "SQLITE_BUSY_TIMEOUT_MS", 5000)
+    monkeypatch.setattr(settings, "IMPORT_NOTES_PER_SECOND", 10000)
+    monkeypatch.setattr(settings, "IMPORT_MAX_NOTES", 20000)
+    assert settings.sqlite_busy_timeout_ms == 5000
+    monkeypatch.setattr(settings, "IMPORT_MAX_NOTES", 200000)
+    assert settings.sqlite_busy_timeout_ms == 40000
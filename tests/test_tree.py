@@ -0,0 +1,156 @@
+from datetime import datetime
+from sqlalchemy import select, text, update
+from app import contents, folder_stats, models, tree
+from app.database import SessionLocal
+
+def test_moving_a_folder_leaves_descendants_untouched(client, headers):
+    source = client.post("/notes/", json={"title": "Source", "is_folder": True}, headers=headers).json()
+    target = client.post("/notes/", json={"title": "Target", "is_folder": True}, headers=headers).json()
+    sub = client.post("/notes/", json={"title": "Sub", "is_folder": True, "parent_id": source["id"]},
+                      headers=headers).json()
+    leaf = client.post("/notes/", json={"title": "Leaf", "content": "x", "parent_id": sub["id"]}, headers=headers).json()
+
+    # Backdate the descendants so a bump to now() would show
+    db = SessionLocal()
+    try:
+        db.execute(update(models.Note).where(models.Note.id.in_([sub["id"], leaf["id"]]))
+                   .values(updated_at=datetime(2020, 1, 1)))
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.put(f"/notes/{source['id']}", json={"parent_id": target["id"]}, headers=headers)
+    assert response.status_code == 200
+
+    db = SessionLocal()
+    try:
+        rows = db.execute(select(models.Note.id, models.Note.path, models.Note.updated_at, models.Note.version)
+                          .where(models.Note.id.in_([sub["id"], leaf["id"]]))).all()
+    finally:
+        db.close()
+    by_id = {row.id: row for row in rows}
+    assert by_id[leaf["id"]].path == f"/{target['id']}/{source['id']}/{sub['id']}/"
+    assert [by_id[note_id].updated_at.year for note_id in (sub["id"], leaf["id"])] == [2020, 2020]
+    assert by_id[leaf["id"]].version == leaf["version"]
+
+def test_breadcrumb_follows_a_move(client, headers):
+    source = client.post("/notes/", json={"title": "Source", "is_folder": True}, headers=headers).json()
+    target = client.post("/notes/", json={"title": "Target", "is_folder": True}, headers=headers).json()
+    leaf = client.post("/notes/", json={"title": "Leaf", "parent_id": source["id"]}, headers=headers).json()
+    client.put(f"/notes/{source['id']}", json={"parent_id": target["id"]}, headers=headers)
+    trail = client.get(f"/notes/{leaf['id']}/breadcrumb", headers=headers).json()
+    assert [crumb["title"] for crumb in trail] == ["Target", "Source", "Leaf"]
+
+def make_nested(client, headers) -> dict:
+    """a/b/c plus a/d, and a second root folder e"""
+    ids = {}
+    def add(name, parent=None, **fields):
+        note = client.post("/notes/", json={"title": name, "parent_id": parent and ids[parent], **fields},
+                           headers=headers).json()
+        ids[name] = note["id"]
+    add("a", is_folder=True)
+    add("b", "a", is_folder=True)
+    add("c", "b", content="deep body")
+    add("d", "a", content="shallow body")
+    add("e", is_folder=True)
+    return ids
+
+def titles(notes: list) -> list:
+    """Nested titles: [(title, [children...]), ...]"""
+    return [(note["title"], titles(note["children"])) for note in notes]
+
+def test_load_tree_nests_the_whole_subtree(client, headers):
+    ids = make_nested(client, headers)
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        assert titles(tree.load_tree(db, owner_id)) == [
+            ("a", [("b", [("c", [])]), ("d", [])]), ("e", [])
+        ]
+        (a,) = tree.load_tree(db, owner_id, root_id=ids["a"])
+        assert a["children"][0]["children"][0]["content"] == "deep body"
+        assert titles(tree.load_tree(db, owner_id, children_of=ids["a"])) == [("b", [("c", [])]), ("d", [])]
+        assert titles(tree.load_tree(db, owner_id, root_ids=[ids["b"], ids["e"]])) == [("b", [("c", [])]), ("e", [])]
+        listing = tree.load_tree(db, owner_id, root_id=ids["a"], include_content=False)
+        assert "content" not in listing[0]["children"][1]
+    finally:
+        db.close()
+
+def test_load_tree_stops_at_depth(client, headers):
+    ids = make_nested(client, headers)
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        assert titles(tree.load_tree(db, owner_id, depth=0)) == [("a", []), ("e", [])]
+        assert titles(tree.load_tree(db, owner_id, depth=1)) == [("a", [("b", []), ("d", [])]), ("e", [])]
+        assert titles(tree.load_tree(db, owner_id, root_id=ids["a"], depth=2)) == [("a", [("b", [("c", [])]), ("d", [])])]
+        rows = db.execute(select(tree.subtree_cte(owner_id, root_id=ids["a"], depth=1))).mappings().all()
+        assert sorted((row["title"], row["level"]) for row in rows) == [("a", 0), ("b", 1), ("d", 1)]
+    finally:
+        db.close()
+
+def test_load_tree_only_follows_the_owners_notes(client, headers):
+    ids = make_nested(client, headers)
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    db = SessionLocal()
+    try:
+        # Another user's note hanging off this owner's folder, as a stray
+        # write could leave it
+        stranger = models.User(email=f"stranger-{ids['a']}@example.com", hashed_password="x")
+        db.add(stranger)
+        db.flush()
+        db.add(models.Note(title="Stray", owner_id=stranger.id, parent_id=ids["b"], path=f"/{ids['a']}/{ids['b']}/"))
+        db.commit()
+        assert titles(tree.load_tree(db, owner_id, root_id=ids["b"])) == [("b", [("c", [])])]
+        assert tree.load_tree(db, stranger.id, root_id=ids["a"]) == []
+        assert titles(tree.load_tree(db, stranger.id, children_of=ids["b"])) == [("Stray", [])]
+    finally:
+        db.close()
+
+def test_deleting_a_deep_subtree_cleans_up_everything_below_it(client, headers, monkeypatch):
+    # Several chunks, deepest level first
+    monkeypatch.setattr(tree, "DELETE_CHUNK_SIZE", 2)
+    owner_id = client.get("/auth/me", headers=headers).json()["id"]
+    ids = {}
+    def add(name, parent=None, **fields):
+        note = client.post("/notes/", json={"title": name, "parent_id": parent and ids[parent], **fields},
+                           headers=headers).json()
+        ids[name] = note["id"]
+    add("top", is_folder=True)
+    add("kept", "top", content="shared body")
+    add("doomed", "top", is_folder=True)
+    add("sub", "doomed", is_folder=True)
+    add("only", "sub", content="body nobody else has")
+    add("same", "sub", content="shared body")
+    add("sub2", "doomed", is_folder=True)
+    add("deeper", "sub2", is_folder=True)
+    add("leaf", "deeper", content="leaf body")
+    doomed = [ids[name] for name in ("doomed", "sub", "only", "same", "sub2", "deeper", "leaf")]
+    hashes = {name: contents.content_hash(body) for name, body in
+              (("only", "body nobody else has"), ("same", "shared body"), ("leaf", "leaf body"))}
+
+    assert client.delete(f"/notes/{ids['doomed']}", headers=headers).status_code == 200
+
+    db = SessionLocal()
+    try:
+        remaining = db.execute(select(models.Note.id).where(models.Note.owner_id == owner_id)).scalars().all()
+        assert sorted(remaining) == [ids["top"], ids["kept"]]
+        indexed = db.execute(text("SELECT rowid FROM notes_fts WHERE rowid IN ({})".format(
+            ", ".join(str(note_id) for note_id in doomed)))).scalars().all()
+        assert indexed == []
+        # Bodies only the subtree used are gone, shared ones stay
+        stored = set(db.execute(select(models.NoteContent.hash).where(
+            models.NoteContent.hash.in_(hashes.values()))).scalars())
+        assert stored == {hashes["same"]}
+        stats = {row.folder_id: row for row in db.execute(select(models.FolderStats).where(
+            models.FolderStats.owner_id == owner_id)).scalars()}
+        assert set(stats) == {ids["top"]}
+        assert (stats[ids["top"]].child_count, stats[ids["top"]].descendant_count) == (1, 1)
+        assert stats[ids["top"]].content_bytes == len("shared body")
+        assert folder_stats.check(db, owner_id)["mismatches"] == 0
+        tombstones = db.execute(select(models.NoteChange.note_id).where(
+            models.NoteChange.owner_id == owner_id, models.NoteChange.deleted.is_(True))).scalars().all()
+        assert sorted(tombstones) == sorted(doomed)
+    finally:
+        db.close()
+    assert client.get(f"/notes/{ids['sub']}", headers=headers).status_code == 404
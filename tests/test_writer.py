@@ -0,0 +1,66 @@
+import asyncio
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.orm import sessionmaker
+from app import database, writer
+
+pytestmark = pytest.mark.skipif(database.write_queue is None, reason="SQLite write queue disabled")
+
+@pytest.fixture
+def queue():
+    """A queue on the real writer connection with a window wide enough to batch a burst"""
+    with database.writer_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE writer_test (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)"))
+    queue = writer.WriteQueue(
+        sessionmaker(bind=database.writer_engine, class_=writer.GroupCommitSession, autoflush=False),
+        batch_max=10,
+        batch_window=0.2
+    )
+    yield queue
+    queue.stop()
+    with database.writer_engine.begin() as conn:
+        conn.execute(text("DROP TABLE writer_test"))
+
+def insert(db, name: str) -> str:
+    db.execute(text("INSERT INTO writer_test (name) VALUES (:name)"), {"name": name})
+    db.commit()  # only flushes inside a group
+    return name
+
+def insert_then_fail(db, name: str):
+    insert(db, name)
+    raise ValueError(name)
+
+def names() -> list:
+    with database.engine.connect() as conn:
+        return conn.execute(text("SELECT name FROM writer_test ORDER BY id")).scalars().all()
+
+def run(queue, *writes) -> list:
+    async def submit():
+        return await asyncio.gather(*[queue.submit(fn, name) for fn, name in writes], return_exceptions=True)
+    return asyncio.run(submit())
+
+def test_a_burst_of_writes_shares_one_commit(queue):
+    assert run(queue, *[(insert, f"n{i}") for i in range(5)]) == [f"n{i}" for i in range(5)]
+    assert names() == [f"n{i}" for i in range(5)]
+    assert queue.stats() == dict(queue.stats(), writes=5, commits=1, failed=0, writes_per_commit=5.0)
+
+def test_a_failing_write_is_rolled_back_alone(queue):
+    results = run(queue, (insert, "a"), (insert_then_fail, "b"), (insert, "c"), (insert, "a"), (insert, "d"))
+    assert results[0] == "a" and results[2] == "c" and results[4] == "d"
+    # The raising write's own insert is undone, as is the duplicate
+    assert isinstance(results[1], ValueError)
+    assert isinstance(results[3], exc.IntegrityError)
+    assert names() == ["a", "c", "d"]
+    assert queue.stats() == dict(queue.stats(), writes=5, commits=1, failed=2)
+
+@pytest.mark.skipif(database.ReadSessionLocal is None, reason="SQLite read pool disabled")
+def test_read_pool_sees_commits_and_refuses_writes(queue):
+    run(queue, (insert, "visible"))
+    db = database.ReadSessionLocal()
+    try:
+        assert db.execute(text("SELECT name FROM writer_test")).scalars().all() == ["visible"]
+        with pytest.raises(exc.OperationalError):
+            db.execute(text("INSERT INTO writer_test (name) VALUES ('sneaky')"))
+    finally:
+        db.close()
+    assert names() == ["visible"]